@@ -59,7 +59,7 @@ Topic :: System :: Archiving :: Backup
         'argcomplete>=1.9.4,<2',
         'sparsebitfield>=0.2.2,<1',
         'cerberus>=1.2,<2',
-        'pycryptodome>=3.6.1,<4',
+        'pycryptodome>=3.9.0,<4',
         'pyparsing>=2.3.0,<3',
         'semantic_version>=2.8.1,<3',
         'dateparser>=0.7.0,<1',
@@ -69,8 +69,11 @@ Topic :: System :: Archiving :: Backup
     ],
     extras_require={
         's3': ['boto3>=1.7.28'],
+        's3aio': ['aiobotocore>=1.0.0'],
         'b2': ['b2>=1.3.2,<=1.3.8'],
-        'compression': ['zstandard>=0.9.0'],
+        'lmdb': ['lmdb>=0.98'],
+        'compression': ['zstandard>=0.9.0', 'lz4>=2.1.0'],
+        'hashing': ['blake3>=0.2.0', 'xxhash>=2.0.0'],
         # For RBD support the packages supplied by the Linux distribution or the Ceph team should be used,
         # possible packages names include: python-rados, python-rbd or python3-rados, python3-rbd
         #'rbd': ['rados', 'rbd'],
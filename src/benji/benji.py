@@ -3,14 +3,17 @@
 import datetime
 import errno
 import hashlib
+import heapq
+import itertools
 import os
 import random
 import time
 from collections import defaultdict
-from concurrent.futures import CancelledError, TimeoutError
-from io import StringIO, BytesIO
+from concurrent.futures import CancelledError, TimeoutError, ThreadPoolExecutor
+from functools import partial
+from io import StringIO
 from typing import List, Tuple, TextIO, Optional, Set, Dict, cast, Union, \
-    Sequence, Any, Iterator
+    Sequence, Any, Iterator, Callable
 
 from diskcache import Cache
 
@@ -19,11 +22,14 @@ from benji.config import Config
 from benji.database import DatabaseBackend, VersionUid, Version, Block, \
     BlockUid, DereferencedBlock, VersionStatus
 from benji.exception import InputDataError, InternalError, AlreadyLocked, UsageError, ScrubbingError, ConfigurationError
-from benji.factory import IOFactory, StorageFactory
+from benji.factory import IOFactory, StorageFactory, TransformFactory
+from benji.jobexecutor import JobExecutor
 from benji.logging import logger
 from benji.repr import ReprMixIn
 from benji.retentionfilter import RetentionFilter
-from benji.storage.base import InvalidBlockException, BlockNotFoundError
+from benji.storage.base import InvalidBlockException, BlockNotFoundError, StorageBase
+from benji.storage.readcache import ReadCacheMode
+from benji.transform.base import TransformBase, BytesLike
 from benji.utils import notify, BlockHash, PrettyPrint, random_string, InputValidation
 
 
@@ -32,6 +38,11 @@ class Benji(ReprMixIn):
     # This is in number of blocks (i.e. database rows in the blocks table)
     _BLOCKS_CREATE_WORK_PACKAGE = 10000
     _BLOCKS_READ_WORK_PACKAGE = 10000
+    # Number of orphaned blocks deleted in one go by storage_reconcile()
+    _RECONCILE_DELETE_BATCH_SIZE = 250
+
+    _HASH_BENCHMARK_DEFAULTS = ('pycryptodome:BLAKE2b,digest_bits=256', 'hashlib:blake2b,digest_size=32',
+                                'pycryptodome:SHA256', 'hashlib:sha256', 'blake3:blake3', 'xxhash:xxh3_128')
 
     def __init__(self,
                  config: Config,
@@ -215,7 +226,8 @@ class Benji(ReprMixIn):
                        version: Version,
                        history: BlockUidHistory = None,
                        block_percentage: int,
-                       deep_scrub: bool) -> int:
+                       deep_scrub: bool,
+                       storage_verified: bool = False) -> int:
         storage = StorageFactory.get_by_name(version.storage.name)
         read_jobs = 0
         blocks_iter = self._database_backend.get_blocks_by_version(version, yield_per=self._BLOCKS_READ_WORK_PACKAGE)
@@ -237,7 +249,13 @@ class Benji(ReprMixIn):
                 logger.debug('{} of block {} (UID {}) skipped (percentile is {}).'.format(
                     'Deep-scrub' if deep_scrub else 'Scrub', block.idx, block.uid, block_percentage))
             else:
-                storage.read_block_async(block, metadata_only=(not deep_scrub))
+                if storage_verified:
+                    storage.verify_block_async(block)
+                else:
+                    # Scrubs need to check the storage itself and shouldn't evict the working set from the read cache
+                    storage.read_block_async(block,
+                                             metadata_only=(not deep_scrub),
+                                             read_cache_mode=ReadCacheMode.bypass)
                 read_jobs += 1
         return read_jobs
 
@@ -253,7 +271,11 @@ class Benji(ReprMixIn):
             logger.info('{} {}/{} blocks ({:.1f}%)'.format('Deep-scrubbed' if deep_scrub else 'Scrubbed',
                                                            done_read_jobs, read_jobs, done_read_jobs / read_jobs * 100))
 
-    def scrub(self, version_uid: VersionUid, block_percentage: int = 100, history: BlockUidHistory = None) -> None:
+    def scrub(self,
+              version_uid: VersionUid,
+              block_percentage: int = 100,
+              history: BlockUidHistory = None,
+              storage_verified: bool = False) -> None:
         self._locking.lock_version(version_uid, reason='Scrubbing version')
         try:
             version = self._database_backend.get_version(version_uid)
@@ -272,7 +294,8 @@ class Benji(ReprMixIn):
             read_jobs = self._scrub_prepare(version=version,
                                             history=history,
                                             block_percentage=block_percentage,
-                                            deep_scrub=False)
+                                            deep_scrub=False,
+                                            storage_verified=storage_verified)
 
             done_read_jobs = 0
             for entry in storage.read_get_completed():
@@ -357,7 +380,6 @@ class Benji(ReprMixIn):
         affected_version_uids = []
         try:
             storage = StorageFactory.get_by_name(version.storage.name)
-            old_use_read_cache = storage.use_read_cache(False)
             read_jobs = self._scrub_prepare(version=version,
                                             history=history,
                                             block_percentage=block_percentage,
@@ -426,8 +448,6 @@ class Benji(ReprMixIn):
         finally:
             if source:
                 io.close()
-            # Restore old read cache setting
-            storage.use_read_cache(old_use_read_cache)
             notify(self._process_name)
 
         if read_jobs != done_read_jobs:
@@ -459,7 +479,8 @@ class Benji(ReprMixIn):
             raise ScrubbingError('Deep-scrub of version {} failed.'.format(version_uid))
 
     def _batch_scrub(self, method: str, filter_expression: Optional[str], version_percentage: int,
-                     block_percentage: int, group_label: Optional[str]) -> Tuple[List[Version], List[Version]]:
+                     block_percentage: int, group_label: Optional[str],
+                     **kwargs) -> Tuple[List[Version], List[Version]]:
         history = BlockUidHistory()
         versions = set(self._database_backend.get_versions_with_filter(filter_expression))
         errors = []
@@ -487,7 +508,7 @@ class Benji(ReprMixIn):
                 logger.info('{} {}% of version {} (volume {}).'.format(
                     'Scrubbing' if method == 'scrub' else 'Deep-scrubbing', block_percentage, version.uid,
                     version.volume))
-                getattr(self, method)(version.uid, block_percentage=block_percentage, history=history)
+                getattr(self, method)(version.uid, block_percentage=block_percentage, history=history, **kwargs)
             except ScrubbingError as exception:
                 logger.error(exception)
                 errors.append(version)
@@ -500,8 +521,14 @@ class Benji(ReprMixIn):
                     filter_expression: Optional[str],
                     version_percentage: int,
                     block_percentage: int,
-                    group_label: Optional[str] = None) -> Tuple[List[Version], List[Version]]:
-        return self._batch_scrub('scrub', filter_expression, version_percentage, block_percentage, group_label)
+                    group_label: Optional[str] = None,
+                    storage_verified: bool = False) -> Tuple[List[Version], List[Version]]:
+        return self._batch_scrub('scrub',
+                                 filter_expression,
+                                 version_percentage,
+                                 block_percentage,
+                                 group_label,
+                                 storage_verified=storage_verified)
 
     def batch_deep_scrub(self,
                          filter_expression: Optional[str],
@@ -543,7 +570,7 @@ class Benji(ReprMixIn):
                                                                        yield_per=self._BLOCKS_READ_WORK_PACKAGE)
             for block in blocks_iter:
                 if block.uid:
-                    storage.read_block_async(block)
+                    storage.read_block_async(block, read_cache_mode=ReadCacheMode.read_through)
                     read_jobs += 1
                     logger.debug('Queued read for block {} successfully ({} bytes).'.format(block.idx, block.size))
                 elif not sparse:
@@ -728,14 +755,17 @@ class Benji(ReprMixIn):
             num_blocks = self._database_backend.rm_version(version_uid)
 
             if not keep_metadata_backup:
+                storage = StorageFactory.get_by_name(version.storage.name)
                 try:
-                    storage = StorageFactory.get_by_name(version.storage.name)
                     storage.rm_version(version_uid)
                     logger.info('Removed version {} metadata backup from storage.'.format(version_uid))
                 except FileNotFoundError:
                     logger.warning(
                         'Unable to remove version {} metadata backup from storage, the object wasn\'t found.'.format(version_uid))
                     pass
+                finally:
+                    self._update_storage_usage(storage)
+                    self._database_backend.commit()
 
             logger.info('Removed backup version {} with {} blocks.'.format(version_uid, num_blocks))
 
@@ -789,6 +819,7 @@ class Benji(ReprMixIn):
             'bytes_written': 0,
             'bytes_deduplicated': 0,
             'bytes_sparse': 0,
+            'bytes_stored': 0,
             'start_time': time.time(),
         }
         io = IOFactory.get(source, self._block_size)
@@ -862,8 +893,12 @@ class Benji(ReprMixIn):
                     raise InputDataError('Source changed in regions outside of ones indicated by the hints.')
             logger.info('Finished sanity check. Checked {} blocks.'.format(read_jobs))
 
+        storage = StorageFactory.get_by_name(version.storage.name)
+        # Attribute any earlier storage usage changes to the database now, so that we can determine the usage
+        # caused by this backup afterwards.
+        self._update_storage_usage(storage)
+        transforms_stats_start = storage.transforms_stats()
         try:
-            storage = StorageFactory.get_by_name(version.storage.name)
             read_jobs = 0
             blocks_iter = self._database_backend.get_blocks_by_version(version,
                                                                        yield_per=self._BLOCKS_READ_WORK_PACKAGE)
@@ -994,6 +1029,7 @@ class Benji(ReprMixIn):
         finally:
             # This will also cancel any outstanding read jobs
             io.close()
+            _, stats['bytes_stored'] = self._update_storage_usage(storage)
             self._database_backend.commit()
 
         if read_jobs != done_read_jobs:
@@ -1012,6 +1048,16 @@ class Benji(ReprMixIn):
         notify(self._process_name, 'Backing up metadata of version {}'.format(version.uid))
         self.metadata_backup([version.uid], overwrite=True, locking=False)
 
+        for transform_name, transform_stats in storage.transforms_stats().items():
+            transform_stats_start = transforms_stats_start.get(transform_name, {})
+            transform_stats = {
+                key: value - transform_stats_start.get(key, 0) for key, value in transform_stats.items()
+            }
+            if transform_stats:
+                logger.info('Transform {} statistics: {}.'.format(
+                    transform_name, ', '.join('{} {}'.format(key, value) for key, value in transform_stats.items())))
+                stats.setdefault('transforms', {})[transform_name] = transform_stats
+
         logger.debug('Stats: {}'.format(stats))
         self._database_backend.set_version_stats(
             version_uid=version.uid,
@@ -1019,6 +1065,7 @@ class Benji(ReprMixIn):
             bytes_written=stats['bytes_written'],
             bytes_deduplicated=stats['bytes_deduplicated'],
             bytes_sparse=stats['bytes_sparse'],
+            bytes_stored=stats['bytes_stored'],
             duration=int(time.time() - stats['start_time']),
         )
 
@@ -1052,6 +1099,9 @@ class Benji(ReprMixIn):
                     if no_del_uids:
                         logger.info('Unable to delete these UIDs from storage {}: {}'.format(
                             storage_name, ', '.join([str(uid) for uid in no_del_uids])))
+
+                    # This is committed together with the removal of the delete candidates
+                    self._update_storage_usage(storage)
             notify(self._process_name)
 
     def add_label(self, version_uid: VersionUid, key: str, value: str) -> None:
@@ -1093,7 +1143,11 @@ class Benji(ReprMixIn):
                 with StringIO() as metadata_export:
                     self._database_backend.export([version.uid], metadata_export)
                     storage = StorageFactory.get_by_name(version.storage.name)
-                    storage.write_version(version.uid, metadata_export.getvalue(), overwrite=overwrite)
+                    try:
+                        storage.write_version(version.uid, metadata_export.getvalue(), overwrite=overwrite)
+                    finally:
+                        self._update_storage_usage(storage)
+                        self._database_backend.commit()
                 logger.info('Backed up metadata of version {}.'.format(version.uid))
         finally:
             for version_uid in locked_version_uids:
@@ -1190,12 +1244,467 @@ class Benji(ReprMixIn):
 
         return sorted(dismissed_versions)
 
-    def storage_stats(self, storage_name: str = None) -> Tuple[int, int]:
+    def _update_storage_usage(self, storage: StorageBase) -> Tuple[int, int]:
+        # The caller is responsible for committing the changes
+        objects_count, objects_size = storage.pop_usage()
+        if objects_count != 0 or objects_size != 0:
+            self._database_backend.update_storage_usage(storage.name,
+                                                        objects_count=objects_count,
+                                                        objects_size=objects_size)
+        return objects_count, objects_size
+
+    def storage_stats(self, storage_name: str = None, reconcile: bool = False) -> Tuple[int, int]:
+        if storage_name is not None:
+            storage = StorageFactory.get_by_name(storage_name)
+        else:
+            storage = StorageFactory.get_by_name(self._default_storage_name)
+
+        self._update_storage_usage(storage)
+        self._database_backend.commit()
+        storage_db = self._database_backend.get_storage_by_name(storage.name)
+        if not reconcile and storage_db.objects_count is not None and storage_db.objects_size is not None:
+            return storage_db.objects_count, storage_db.objects_size
+
+        logger.info('Reconciling usage statistics of storage {}, this requires listing all objects.'.format(
+            storage.name))
+        objects_count, objects_size = storage.storage_stats()
+        self._database_backend.set_storage_usage(storage.name, objects_count=objects_count, objects_size=objects_size)
+        return objects_count, objects_size
+
+    def _storage_copy_version(self, version: Version, target_storage: StorageBase, target_storage_id: int,
+                              copied_uids: BlockUidHistory, workers: int) -> Dict[str, int]:
+        source_storage = StorageFactory.get_by_name(version.storage.name)
+        # Objects are copied verbatim when both storages encapsulate them in the same way
+        raw_copy = source_storage.active_transforms == target_storage.active_transforms
+        results = {'blocks_copied': 0, 'blocks_copied_raw': 0, 'blocks_present': 0}
+
+        def copy_block(block: DereferencedBlock) -> str:
+            if target_storage.block_exists(block.uid):
+                return 'blocks_present'
+            if raw_copy:
+                data, transforms_metadata = source_storage.read_block_raw(block)
+                if target_storage.transforms_compatible(transforms_metadata):
+                    target_storage.write_block_raw(block, data, transforms_metadata)
+                    return 'blocks_copied_raw'
+            data = source_storage.read_block(block, read_cache_mode=ReadCacheMode.bypass)
+            if self._block_hash.data_hexdigest(data) != block.checksum:
+                raise InvalidBlockException(
+                    'Checksum mismatch during copy of block {} (UID {}).'.format(block.idx, block.uid), block)
+            target_storage.write_block(block, data)
+            return 'blocks_copied'
+
+        def handle_result(result: Union[str, BaseException]) -> None:
+            if isinstance(result, BaseException):
+                raise result
+            results[result] += 1
+
+        executor = JobExecutor(name='Storage-Copy', workers=workers, blocking_submit=True)
+        try:
+            for block in self._database_backend.get_blocks_by_version(version):
+                if not block.uid or copied_uids.seen(target_storage_id, block.uid):
+                    continue
+                copied_uids.add(target_storage_id, block.uid)
+                block_deref = block.deref()
+                executor.submit(partial(copy_block, block_deref))
+
+                try:
+                    for result in executor.get_completed(timeout=0):
+                        handle_result(result)
+                except (TimeoutError, CancelledError):
+                    pass
+
+            for result in executor.get_completed():
+                handle_result(result)
+        finally:
+            executor.shutdown()
+
+        return results
+
+    def storage_copy(self,
+                     filter_expression: Optional[str],
+                     target_storage_name: str,
+                     workers: int = 16,
+                     override_lock: bool = False) -> List[Version]:
+        target_storage = StorageFactory.get_by_name(target_storage_name)
+        target_storage_id = self._database_backend.get_storage_by_name(target_storage_name).id
+
+        copied_versions = []
+        # Cleanup must not remove any blocks of the target storage which we deem present
+        with self._locking.with_lock(lock_name='cleanup',
+                                     reason='Storage copy',
+                                     locked_msg='Another cleanup is already running.',
+                                     override_lock=override_lock):
+            copied_uids = BlockUidHistory()
+            for version in self._database_backend.get_versions_with_filter(filter_expression):
+                if version.storage_id == target_storage_id:
+                    logger.info('Version {} is already located on storage {}, skipping it.'.format(
+                        version.uid, target_storage_name))
+                    continue
+                if version.status != VersionStatus.valid:
+                    logger.warning('Version {} has status {}, skipping it.'.format(version.uid, version.status.name))
+                    continue
+
+                self._locking.lock_version(version.uid, reason='Copying version to storage {}'.format(
+                    target_storage_name))
+                try:
+                    source_storage_name = version.storage.name
+                    notify(self._process_name, 'Copying version {} to storage {}'.format(
+                        version.uid, target_storage_name))
+                    logger.info('Copying version {} from storage {} to storage {}.'.format(
+                        version.uid, source_storage_name, target_storage_name))
+                    try:
+                        results = self._storage_copy_version(version, target_storage, target_storage_id, copied_uids,
+                                                             workers)
+                    finally:
+                        self._update_storage_usage(target_storage)
+                        self._database_backend.commit()
+
+                    self._database_backend.move_version_to_storage(version.uid, target_storage_id)
+                    logger.info('Copied version {}: {} blocks copied, {} blocks copied without decapsulation, '
+                                '{} blocks already present.'.format(version.uid, results['blocks_copied'],
+                                                                     results['blocks_copied_raw'],
+                                                                     results['blocks_present']))
+
+                    self.metadata_backup([version.uid], overwrite=True, locking=False)
+                    source_storage = StorageFactory.get_by_name(source_storage_name)
+                    try:
+                        source_storage.rm_version(version.uid)
+                    except FileNotFoundError:
+                        pass
+                    finally:
+                        self._update_storage_usage(source_storage)
+                        self._database_backend.commit()
+                finally:
+                    self._locking.unlock_version(version.uid)
+                    notify(self._process_name)
+
+                copied_versions.append(version)
+
+        return copied_versions
+
+    def storage_reconcile(self,
+                          storage_name: str = None,
+                          delete_orphans: bool = False,
+                          override_lock: bool = False) -> Dict[str, int]:
+        if storage_name is not None:
+            storage = StorageFactory.get_by_name(storage_name)
+        else:
+            storage = StorageFactory.get_by_name(self._default_storage_name)
+
+        # Same lock as cleanup so that both don't delete objects concurrently
+        with self._locking.with_lock(lock_name='cleanup',
+                                     reason='Storage reconciliation',
+                                     locked_msg='Another cleanup is already running.',
+                                     override_lock=override_lock):
+            notify(self._process_name, 'Reconciling storage {}'.format(storage.name))
+            storage_id = self._database_backend.get_storage_by_name(storage.name).id
+
+            # Blocks belonging to versions which are still being written or which didn't exist when we started are
+            # excluded as their database entries and objects might not be in sync yet. The left part of the block
+            # UID is the id of the version which wrote the block.
+            versions = self._database_backend.get_versions()
+            max_version_id = max([version.id for version in versions], default=0)
+            incomplete_version_ids = {
+                version.id
+                for version in versions
+                if version.status == VersionStatus.incomplete and version.storage_id == storage_id
+            }
+            del versions
+
+            def in_flux(uid: BlockUid) -> bool:
+                return uid.left > max_version_id or uid.left in incomplete_version_ids
+
+            logger.info('Listing all objects of storage {}, this might take a while.'.format(storage.name))
+            stored_uids = storage.list_blocks_sorted()
+            logger.info('Listing of storage {} finished, comparing with database.'.format(storage.name))
+
+            # Merge join of the three sorted streams, the second tuple element tags the stream the entry came from.
+            STORED, REFERENCED, DELETED = 0, 1, 2
+            entries = heapq.merge(
+                ((uid, STORED, data_present and metadata_present)
+                 for uid, data_present, metadata_present in stored_uids),
+                ((uid, REFERENCED, None) for uid in self._database_backend.get_block_uids_by_storage(storage_id)),
+                ((uid, DELETED, None)
+                 for uid in self._database_backend.get_block_uids_by_storage(storage_id, deleted=True)),
+                key=lambda entry: (entry[0].left, entry[0].right, entry[1]))
+
+            results = {
+                'blocks_referenced': 0,
+                'blocks_missing': 0,
+                'blocks_incomplete': 0,
+                'blocks_orphaned': 0,
+                'blocks_pending_deletion': 0,
+                'blocks_deleted': 0,
+            }
+            orphaned_uids: List[BlockUid] = []
+
+            def delete_orphaned_uids() -> None:
+                for uid in orphaned_uids:
+                    storage.rm_block_async(uid)
+                for entry in storage.rm_get_completed():
+                    if isinstance(entry, BlockNotFoundError):
+                        # Orphans consisting only of a metadata object end up here, too. The metadata object has
+                        # been removed nevertheless.
+                        logger.debug('Data object of orphaned block {} was already gone.'.format(entry.uid))
+                    elif isinstance(entry, Exception):
+                        raise entry
+                    results['blocks_deleted'] += 1
+                orphaned_uids.clear()
+                self._update_storage_usage(storage)
+                self._database_backend.commit()
+
+            for uid, group in itertools.groupby(entries, key=lambda entry: entry[0]):
+                stored, complete, referenced, deleted = False, False, False, False
+                for _, kind, value in group:
+                    if kind == STORED:
+                        stored, complete = True, value
+                    elif kind == REFERENCED:
+                        referenced = True
+                    else:
+                        deleted = True
+
+                if referenced:
+                    results['blocks_referenced'] += 1
+                    if not stored and not in_flux(uid):
+                        logger.error('Block {} is referenced but missing from storage {}.'.format(uid, storage.name))
+                        results['blocks_missing'] += 1
+                    elif stored and not complete:
+                        logger.error('Block {} is referenced but incomplete (data or metadata object missing) on '
+                                     'storage {}.'.format(uid, storage.name))
+                        results['blocks_incomplete'] += 1
+                elif stored:
+                    if deleted:
+                        results['blocks_pending_deletion'] += 1
+                    elif not in_flux(uid):
+                        logger.warning('Block {} is orphaned on storage {}.'.format(uid, storage.name))
+                        results['blocks_orphaned'] += 1
+                        if delete_orphans:
+                            orphaned_uids.append(uid)
+                            if len(orphaned_uids) >= self._RECONCILE_DELETE_BATCH_SIZE:
+                                delete_orphaned_uids()
+
+            if orphaned_uids:
+                delete_orphaned_uids()
+
+            logger.info('Reconciliation of storage {} finished: {} referenced, {} missing, {} incomplete, {} orphaned '
+                        '({} deleted), {} pending deletion.'.format(storage.name, results['blocks_referenced'],
+                                                                    results['blocks_missing'],
+                                                                    results['blocks_incomplete'],
+                                                                    results['blocks_orphaned'],
+                                                                    results['blocks_deleted'],
+                                                                    results['blocks_pending_deletion']))
+            notify(self._process_name)
+
+        return results
+
+    def storage_read_cache_stats(self, storage_name: str = None) -> Dict[str, Dict[str, int]]:
         if storage_name is not None:
             storage = StorageFactory.get_by_name(storage_name)
         else:
             storage = StorageFactory.get_by_name(self._default_storage_name)
-        return storage.storage_stats()
+
+        return storage.read_cache_stats()
+
+    # Returns the data of up to samples distinct blocks chosen randomly from the matching versions
+    def _sample_blocks(self, filter_expression: Optional[str], samples: int) -> List[bytes]:
+        # Reservoir sampling of the distinct blocks of all matching versions
+        sampled_blocks: List[Tuple[str, DereferencedBlock]] = []
+        seen_uids: Set[BlockUid] = set()
+        for version in self._database_backend.get_versions_with_filter(filter_expression):
+            if version.status != VersionStatus.valid:
+                logger.warning('Version {} has status {}, skipping it.'.format(version.uid, version.status.name))
+                continue
+            storage_name = version.storage.name
+            for block in self._database_backend.get_blocks_by_version(version):
+                # Each block is only offered to the reservoir once, regardless of whether it was selected
+                # or how many versions reference it
+                if not block.uid or block.uid in seen_uids:
+                    continue
+                seen_uids.add(block.uid)
+                if len(sampled_blocks) < samples:
+                    sampled_blocks.append((storage_name, block.deref()))
+                else:
+                    index = random.randrange(len(seen_uids))
+                    if index < samples:
+                        sampled_blocks[index] = (storage_name, block.deref())
+
+        if not sampled_blocks:
+            raise UsageError('No blocks found to sample.')
+
+        data_samples = []
+        for i, (storage_name, block) in enumerate(sampled_blocks):
+            notify(self._process_name, 'Reading sampled blocks ({:.1f}%)'.format((i + 1) / len(sampled_blocks) * 100))
+            storage = StorageFactory.get_by_name(storage_name)
+            data_samples.append(storage.read_block(block, read_cache_mode=ReadCacheMode.bypass))
+        notify(self._process_name)
+
+        return data_samples
+
+    def transform_train_dict(self, filter_expression: Optional[str], transform_name: str, dict_size: int,
+                             samples: int) -> Tuple[bytes, Dict[str, Any]]:
+        transform = TransformFactory.get_by_name(transform_name)
+        if transform.module != 'zstd':
+            raise UsageError('Transform {} is not a zstd transform.'.format(transform_name))
+
+        data_samples = self._sample_blocks(filter_expression, samples)
+
+        # Every fourth block is held back to evaluate the dictionary on data it hasn't been trained with
+        evaluation_samples = data_samples[::4]
+        training_samples = [data for i, data in enumerate(data_samples) if i % 4 != 0] or data_samples
+
+        logger.info('Training dictionary of {} bytes with {} blocks.'.format(dict_size, len(training_samples)))
+        dict_data = transform.train_dictionary(training_samples, dict_size)
+        logger.info('Trained dictionary has ID {}.'.format(dict_data.dict_id()))
+
+        report = {
+            'dict_id': dict_data.dict_id(),
+            'dict_size': len(dict_data.as_bytes()),
+            'blocks_training': len(training_samples),
+            'blocks_evaluation': len(evaluation_samples),
+            'current': transform.benchmark(evaluation_samples, transform.dict_data),
+            'trained': transform.benchmark(evaluation_samples, dict_data),
+        }
+        return dict_data.as_bytes(), report
+
+    # Returns blocks of which roughly the given fraction is compressible text and the rest random data
+    def _synthetic_blocks(self, samples: int, compressibility: float) -> List[bytes]:
+        words = [random_string(random.randint(3, 10)).encode('ascii') for _ in range(1024)]
+        corpus = b' '.join(random.choice(words) for _ in range(256 * 1024))
+        chunk_size = 4096
+        data_samples = []
+        for _ in range(samples):
+            chunks = []
+            for _ in range(self._block_size // chunk_size):
+                if random.random() < compressibility:
+                    offset = random.randrange(len(corpus) - chunk_size)
+                    chunks.append(corpus[offset:offset + chunk_size])
+                else:
+                    chunks.append(os.urandom(chunk_size))
+            chunks.append(os.urandom(self._block_size % chunk_size))
+            data_samples.append(b''.join(chunks))
+        return data_samples
+
+    # Runs function for all items with the given number of threads and returns the results, the elapsed
+    # time and the CPU time used by all threads of the process
+    @staticmethod
+    def _benchmark_run(function: Callable[[Any], Any], items: Sequence[Any],
+                       threads: int) -> Tuple[List[Any], float, float]:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            t1, c1 = time.perf_counter(), time.process_time()
+            results = list(executor.map(function, items))
+            t2, c2 = time.perf_counter(), time.process_time()
+        return results, max(t2 - t1, 1e-9), max(c2 - c1, 1e-9)
+
+    @classmethod
+    def _benchmark_transform(cls, transform: TransformBase, data_samples: Sequence[bytes],
+                             threads: Sequence[int]) -> Dict[str, Any]:
+        samples_size = sum(len(data) for data in data_samples)
+        encapsulated_samples = [transform.encapsulate(data=data) for data in data_samples]
+        encapsulated_size = sum(
+            len(data_encapsulated) if data_encapsulated is not None else len(data)
+            for data, (data_encapsulated, _) in zip(data_samples, encapsulated_samples))
+        # Blocks which the transform leaves unchanged are never decapsulated
+        decapsulate_samples = [(data_encapsulated, materials)
+                               for data_encapsulated, materials in encapsulated_samples
+                               if data_encapsulated is not None]
+        decapsulate_size = sum(
+            len(data) for data, (data_encapsulated, _) in zip(data_samples, encapsulated_samples)
+            if data_encapsulated is not None)
+
+        result: Dict[str, Any] = {
+            'ratio': encapsulated_size / samples_size,
+            'threads': [],
+        }
+        for thread_count in threads:
+            _, encapsulate_time, encapsulate_cpu_time = cls._benchmark_run(
+                lambda data: transform.encapsulate(data=data), data_samples, thread_count)
+            if decapsulate_samples:
+                _, decapsulate_time, decapsulate_cpu_time = cls._benchmark_run(
+                    lambda sample: transform.decapsulate(data=sample[0], materials=sample[1]), decapsulate_samples,
+                    thread_count)
+                decapsulate_speed: Optional[float] = decapsulate_size / decapsulate_time
+                decapsulate_cpu_speed: Optional[float] = decapsulate_size / decapsulate_cpu_time
+            else:
+                decapsulate_speed, decapsulate_cpu_speed = None, None
+            result['threads'].append({
+                'threads': thread_count,
+                'encapsulate_speed': samples_size / encapsulate_time,
+                'decapsulate_speed': decapsulate_speed,
+                'encapsulate_cpu_speed': samples_size / encapsulate_cpu_time,
+                'decapsulate_cpu_speed': decapsulate_cpu_speed,
+            })
+        return result
+
+    # Compares the given transforms (all configured transforms by default) on blocks sampled from the matching
+    # versions or on synthetic data
+    def transform_benchmark(self,
+                            transform_names: Optional[Sequence[str]],
+                            filter_expression: Optional[str],
+                            samples: int,
+                            threads: Sequence[int] = (1,),
+                            synthetic_compressibility: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        if not transform_names:
+            transform_names = list(TransformFactory.get_modules().keys())
+            if not transform_names:
+                raise UsageError('No transforms are configured.')
+        transforms = [TransformFactory.get_by_name(transform_name) for transform_name in transform_names]
+
+        if synthetic_compressibility is not None:
+            if filter_expression is not None:
+                raise UsageError('A filter expression can\'t be used together with synthetic data.')
+            data_samples = self._synthetic_blocks(samples, synthetic_compressibility)
+        else:
+            data_samples = self._sample_blocks(filter_expression, samples)
+
+        results = {}
+        for transform in transforms:
+            notify(self._process_name, 'Benchmarking transform {}'.format(transform.name))
+            logger.info('Benchmarking transform {} with {} blocks.'.format(transform.name, len(data_samples)))
+            results[transform.name] = self._benchmark_transform(transform, data_samples, threads)
+        notify(self._process_name)
+
+        return results
+
+    # Compares the given hash functions (the configured one and a selection of alternatives by default) on random data
+    def hash_benchmark(self, hash_functions: Optional[Sequence[str]], samples: int,
+                       threads: Sequence[int] = (1,)) -> Dict[str, Dict[str, Any]]:
+        block_hashes = {}
+        if hash_functions:
+            for hash_function in hash_functions:
+                block_hashes[hash_function] = BlockHash(hash_function)
+        else:
+            block_hashes[self.config.get('hashFunction', types=str)] = self._block_hash
+            for hash_function in self._HASH_BENCHMARK_DEFAULTS:
+                try:
+                    block_hashes[hash_function] = BlockHash(hash_function)
+                except ConfigurationError as exception:
+                    logger.info('Skipping block hash {}: {}'.format(hash_function, exception))
+
+        data_samples = [os.urandom(self._block_size) for _ in range(samples)]
+        checksum = self._block_hash.data_hexdigest(data_samples[0])
+        samples_size = samples * self._block_size
+
+        results = {}
+        for hash_function, block_hash in block_hashes.items():
+            notify(self._process_name, 'Benchmarking block hash {}'.format(hash_function))
+            logger.info('Benchmarking block hash {} with {} blocks.'.format(hash_function, samples))
+            result: Dict[str, Any] = {
+                'backend': block_hash.backend,
+                # Checksums are only interchangeable when the same digest is produced
+                'compatible': block_hash.data_hexdigest(data_samples[0]) == checksum,
+                'threads': [],
+            }
+            for thread_count in threads:
+                _, hash_time, hash_cpu_time = self._benchmark_run(block_hash.data_hexdigest, data_samples, thread_count)
+                result['threads'].append({
+                    'threads': thread_count,
+                    'speed': samples_size / hash_time,
+                    'cpu_speed': samples_size / hash_cpu_time,
+                })
+            results[hash_function] = result
+        notify(self._process_name)
+
+        return results
 
     @staticmethod
     def list_storages() -> List[str]:
@@ -1284,11 +1793,28 @@ class BenjiStore(ReprMixIn):
 
         os.makedirs(cow_store_directory, exist_ok=True)
         self._cow_store = _BlockStore(cow_store_directory)
+        self._zero_block_data = b''
+
+        self._read_ahead_maximum_blocks = self._benji_obj.config.get('nbd.readAhead.maximumBlocks', types=int)
+        # Contains version_uid: (index of last accessed block, current window, index of last block submitted)
+        self._read_ahead: Dict[VersionUid, Tuple[int, int, int]] = {}
+        # Contains storage name: set() of block UIDs (as strings) with outstanding read ahead jobs
+        self._read_ahead_pending: Dict[str, Set[str]] = defaultdict(set)
+        # Contains storage name: number of read ahead jobs whose results haven't been collected yet
+        self._read_ahead_outstanding: Dict[str, int] = defaultdict(int)
 
     def open(self, version) -> None:
         self._benji_obj._locking.lock_version(version.uid, reason='NBD')
 
     def close(self, version) -> None:
+        storage = StorageFactory.get_by_name(version.storage.name)
+        if self._read_ahead_outstanding[storage.name]:
+            # Wait for all outstanding read ahead jobs so that they aren't cancelled noisily on shutdown
+            for _ in storage.read_get_completed():
+                pass
+            self._read_ahead_outstanding[storage.name] = 0
+            self._read_ahead_pending[storage.name].clear()
+        self._read_ahead.pop(version.uid, None)
         self._benji_obj._locking.unlock_version(version.uid)
 
     def get_versions(self, version_uid: VersionUid = None) -> List[Version]:
@@ -1324,20 +1850,93 @@ class BenjiStore(ReprMixIn):
 
         return chunks
 
-    def read(self, version: Version, cow_version: Optional[Version], offset: int, length: int) -> bytes:
+    def _read_ahead_collect(self, storage: StorageBase, wait_for: str = None) -> Optional[bytes]:
+        # Moves the data of completed read ahead jobs into the block cache. If wait_for is set, this waits until
+        # the block with this UID has been read and returns its data.
+        if not self._read_ahead_outstanding[storage.name]:
+            return None
+
+        pending = self._read_ahead_pending[storage.name]
+        try:
+            for entry in storage.read_get_completed(timeout=None if wait_for else 0):
+                self._read_ahead_outstanding[storage.name] -= 1
+                if isinstance(entry, Exception):
+                    # The block will be read again on demand, so that any error is reported to the client
+                    logger.debug('Read ahead failed: {}'.format(entry))
+                    if isinstance(entry, InvalidBlockException):
+                        pending.discard(str(entry.block.uid))
+                    else:
+                        # Other exceptions don't tell which block failed. Forget about all pending blocks so that
+                        # demand reads don't wait for a job which has already failed. Results of the jobs which are
+                        # still running are collected into the block cache nevertheless.
+                        pending.clear()
+                    if wait_for is not None and wait_for not in pending:
+                        return None
+                    continue
+
+                block, data, _ = cast(Tuple[DereferencedBlock, bytes, Dict], entry)
+                block_uid = str(block.uid)
+                pending.discard(block_uid)
+                self._block_cache[block_uid] = data
+                if block_uid == wait_for:
+                    return data
+        except TimeoutError:
+            pass
+
+        if wait_for is not None:
+            pending.discard(wait_for)
+        return None
+
+    def _read_ahead_submit(self, version: Version, cow: Optional[Dict[int, DereferencedBlock]], storage: StorageBase,
+                           block_idx: int) -> None:
+        if self._read_ahead_maximum_blocks == 0:
+            return
+
+        self._read_ahead_collect(storage)
+
+        last_block_idx, window, last_submitted_idx = self._read_ahead.get(version.uid, (-2, 0, -1))
+        # Most NBD requests are smaller than a block, only look at the first access to each block.
+        if block_idx == last_block_idx:
+            return
+        # The window starts with one block, doubles with each sequential access and is reset by any random access.
+        if block_idx == last_block_idx + 1:
+            window = min(max(2 * window, 1), self._read_ahead_maximum_blocks)
+        else:
+            window = 0
+            last_submitted_idx = block_idx
+
+        pending = self._read_ahead_pending[storage.name]
+        end_idx = min(block_idx + window, version.blocks_count - 1)
+        for idx in range(max(last_submitted_idx, block_idx) + 1, end_idx + 1):
+            if cow is not None and idx in cow:
+                continue
+            block = self._benji_obj._database_backend.get_block_by_idx(version, idx)
+            if block is None or not block.uid:
+                continue
+            block_uid = str(block.uid)
+            if block_uid in pending or block_uid in self._block_cache:
+                continue
+            logger.debug('Reading ahead block {}/{}.'.format(version.uid, idx))
+            storage.read_block_async(block, read_cache_mode=ReadCacheMode.read_through)
+            pending.add(block_uid)
+            self._read_ahead_outstanding[storage.name] += 1
+
+        self._read_ahead[version.uid] = (block_idx, window, max(last_submitted_idx, end_idx))
+
+    def read(self, version: Version, cow_version: Optional[Version], offset: int, length: int) -> BytesLike:
         if cow_version:
             cow: Optional[Dict[int, DereferencedBlock]] = self._cow[cow_version.uid]
         else:
             cow = None
         read_list = self._block_list(version, offset, length)
-        data_chunks: List[bytes] = []
+        data_chunks: List[BytesLike] = []
         block: Optional[Union[Block, DereferencedBlock]]
         for block, offset_in_block, length_in_block in read_list:
             # Access lies beyond end of version
             if block is None:
                 logger.warning('Tried to read data beyond device (version {}, size {}, offset {}).'.format(
                     version.uid, version.size, offset_in_block))
-                data_chunks.append(b'\0' * length_in_block)
+                data_chunks.append(self._zero_block(length_in_block))
                 continue
 
             if cow is not None and block.idx in cow:
@@ -1355,9 +1954,12 @@ class BenjiStore(ReprMixIn):
                 logger.debug('Reading {}block {}/{} {}:{}.'.format('sparse ' if not block.uid else '', version.uid,
                                                                    block.idx, offset_in_block, length_in_block))
 
+                storage = StorageFactory.get_by_name(version.storage.name)
+                self._read_ahead_submit(version, cow, storage, block.idx)
+
                 # Block is sparse
                 if not block.uid:
-                    data_chunks.append(b'\0' * length_in_block)
+                    data_chunks.append(self._zero_block(length_in_block))
                     continue
 
                 block_f = self._block_cache.get(str(block.uid), read=True)
@@ -1369,13 +1971,24 @@ class BenjiStore(ReprMixIn):
                     finally:
                         block_f.close()
                 else:
-                    storage = StorageFactory.get_by_name(version.storage.name)
-                    data = storage.read_block(block)
-                    self._block_cache[str(block.uid)] = data
-                    data_chunks.append(data[offset_in_block:offset_in_block + length_in_block])
-
+                    data = None
+                    if str(block.uid) in self._read_ahead_pending[storage.name]:
+                        data = self._read_ahead_collect(storage, wait_for=str(block.uid))
+                    if data is None:
+                        data = storage.read_block(block, read_cache_mode=ReadCacheMode.read_through)
+                        self._block_cache[str(block.uid)] = data
+                    data_chunks.append(memoryview(data)[offset_in_block:offset_in_block + length_in_block])
+
+        # Most requests are contained in a single block, its data can be returned without copying it
+        if len(data_chunks) == 1:
+            return data_chunks[0]
         return b''.join(data_chunks)
 
+    def _zero_block(self, length: int) -> memoryview:
+        if len(self._zero_block_data) < length:
+            self._zero_block_data = bytes(length)
+        return memoryview(self._zero_block_data)[:length]
+
     def get_cow_version(self, base_version: Version) -> Version:
         cow_version = self._benji_obj._prepare_version(
             version_uid=VersionUid('{}-{}'.format(f'nbd-cow-{base_version.uid}' [:248], random_string(6))),
@@ -1387,9 +2000,10 @@ class BenjiStore(ReprMixIn):
         self._cow[cow_version.uid] = {}  # contains version_uid: dict() of block id -> uid
         return cow_version
 
-    def write(self, cow_version: Version, offset: int, data: bytes) -> None:
+    def write(self, cow_version: Version, offset: int, data: BytesLike) -> None:
         """ Copy on write backup writer """
         cow = self._cow[cow_version.uid]
+        data = memoryview(data)
         write_list = self._block_list(cow_version, offset, len(data))
         position_in_data = 0
         for block, offset_in_block, length_in_block in write_list:
@@ -1408,21 +2022,21 @@ class BenjiStore(ReprMixIn):
                 # Read the block from the original
                 if block.uid:
                     storage = StorageFactory.get_by_name(cow_version.storage.name)
-                    write_data = BytesIO(storage.read_block(block))
+                    # The block is copied to the COW cache, so there is no need to store it in the read cache
+                    write_data = bytearray(storage.read_block(block, read_cache_mode=ReadCacheMode.read_only))
                 # Was a sparse block
                 else:
-                    write_data = BytesIO(b'\0' * cow_version.block_size)
+                    write_data = bytearray(cow_version.block_size)
 
                 # Update the block
-                write_data.seek(offset_in_block)
-                write_data.write(data[position_in_data:position_in_data + length_in_block])
-                write_data.seek(0)
+                write_data[offset_in_block:offset_in_block + length_in_block] = \
+                    data[position_in_data:position_in_data + length_in_block]
 
                 # Save a copy of the changed data and record the changed block UID
                 new_block = block.deref()
                 new_block.uid = BlockUid(cow_version.id, block.idx + 1)
                 new_block.checksum = None
-                self._cow_store.write(new_block.uid, write_data.read())
+                self._cow_store.write(new_block.uid, write_data)
                 cow[block.idx] = new_block
                 logger.debug('COW: Wrote block {}/{} {}:{} into {}.'.format(cow_version.uid, block.idx, offset_in_block,
                                                                             length_in_block, new_block.uid))
@@ -1466,6 +2080,7 @@ class BenjiStore(ReprMixIn):
                 if block.uid:
                     storage.rm_block(block.uid)
 
+        self._benji_obj._update_storage_usage(storage)
         self._benji_obj._database_backend.commit()
         self._benji_obj._database_backend.set_version(cow_version.uid, status=VersionStatus.valid, protected=True)
         self._benji_obj.metadata_backup([cow_version.uid], overwrite=True, locking=False)
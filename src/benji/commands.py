@@ -127,12 +127,12 @@ class Commands:
             if benji_obj:
                 benji_obj.close()
 
-    def scrub(self, version_uid: str, block_percentage: int) -> None:
+    def scrub(self, version_uid: str, block_percentage: int, storage_verified: bool) -> None:
         version_uid_obj = VersionUid(version_uid)
         benji_obj = None
         try:
             benji_obj = Benji(self.config)
-            benji_obj.scrub(version_uid_obj, block_percentage=block_percentage)
+            benji_obj.scrub(version_uid_obj, block_percentage=block_percentage, storage_verified=storage_verified)
         except benji.exception.ScrubbingError:
             assert benji_obj is not None
             if self.machine_output:
@@ -186,12 +186,12 @@ class Commands:
                 benji_obj.close()
 
     def _batch_scrub(self, method: str, filter_expression: Optional[str], version_percentage: int,
-                     block_percentage: int, group_label: Optional[str]) -> None:
+                     block_percentage: int, group_label: Optional[str], **kwargs) -> None:
         benji_obj = None
         try:
             benji_obj = Benji(self.config)
             versions, errors = getattr(benji_obj, method)(filter_expression, version_percentage, block_percentage,
-                                                          group_label)
+                                                          group_label, **kwargs)
             if errors:
                 if self.machine_output:
                     benji_obj.export_any({
@@ -215,8 +215,13 @@ class Commands:
                 benji_obj.close()
 
     def batch_scrub(self, filter_expression: Optional[str], version_percentage: int, block_percentage: int,
-                    group_label: Optional[str]) -> None:
-        self._batch_scrub('batch_scrub', filter_expression, version_percentage, block_percentage, group_label)
+                    group_label: Optional[str], storage_verified: bool) -> None:
+        self._batch_scrub('batch_scrub',
+                          filter_expression,
+                          version_percentage,
+                          block_percentage,
+                          group_label,
+                          storage_verified=storage_verified)
 
     def batch_deep_scrub(self, filter_expression: Optional[str], version_percentage: int, block_percentage: int,
                          group_label: Optional[str]) -> None:
@@ -228,7 +233,7 @@ class Commands:
 
         field_names = ['date', 'uid', 'volume', 'snapshot', 'size', 'block_size', 'status', 'protected', 'storage']
         if include_stats:
-            field_names.extend(['read', 'written', 'deduplicated', 'sparse', 'duration'])
+            field_names.extend(['read', 'written', 'stored', 'deduplicated', 'sparse', 'duration'])
         if include_labels:
             field_names.append('labels')
         tbl.field_names = field_names
@@ -242,6 +247,7 @@ class Commands:
 
         tbl.align['read'] = 'r'
         tbl.align['written'] = 'r'
+        tbl.align['stored'] = 'r'
         tbl.align['deduplicated'] = 'r'
         tbl.align['sparse'] = 'r'
         tbl.align['duration'] = 'r'
@@ -265,6 +271,7 @@ class Commands:
                 row.extend([
                     PrettyPrint.bytes(version.bytes_read) if version.bytes_read is not None else '',
                     PrettyPrint.bytes(version.bytes_written) if version.bytes_written is not None else '',
+                    PrettyPrint.bytes(version.bytes_stored) if version.bytes_stored is not None else '',
                     PrettyPrint.bytes(version.bytes_deduplicated) if version.bytes_deduplicated is not None else '',
                     PrettyPrint.bytes(version.bytes_sparse) if version.bytes_sparse is not None else '',
                     PrettyPrint.duration(version.duration) if version.duration is not None else '',
@@ -481,11 +488,11 @@ class Commands:
         tbl.add_row(row)
         print(tbl)
 
-    def storage_stats(self, storage_name: str = None) -> None:
+    def storage_stats(self, storage_name: str = None, reconcile: bool = False) -> None:
         benji_obj = None
         try:
             benji_obj = Benji(self.config)
-            objects_count, objects_size = benji_obj.storage_stats(storage_name)
+            objects_count, objects_size = benji_obj.storage_stats(storage_name, reconcile=reconcile)
 
             if self.machine_output:
                 result = {
@@ -499,6 +506,160 @@ class Commands:
             if benji_obj:
                 benji_obj.close()
 
+    def storage_copy(self, filter_expression: Optional[str], target_storage_name: str, workers: int,
+                     override_lock: bool) -> None:
+        benji_obj = None
+        try:
+            benji_obj = Benji(self.config)
+            copied_versions = benji_obj.storage_copy(filter_expression,
+                                                     target_storage_name,
+                                                     workers=workers,
+                                                     override_lock=override_lock)
+            if self.machine_output:
+                benji_obj.export_any({
+                    'versions': copied_versions,
+                },
+                                     sys.stdout,
+                                     ignore_relationships=[((Version,), ('blocks',))])
+        finally:
+            if benji_obj:
+                benji_obj.close()
+
+    def storage_reconcile(self, storage_name: str = None, delete_orphans: bool = False,
+                          override_lock: bool = False) -> None:
+        benji_obj = None
+        try:
+            benji_obj = Benji(self.config)
+            result = benji_obj.storage_reconcile(storage_name,
+                                                 delete_orphans=delete_orphans,
+                                                 override_lock=override_lock)
+
+            if self.machine_output:
+                print(json.dumps(result, indent=4))
+            else:
+                tbl = PrettyTable()
+                tbl.field_names = list(result.keys())
+                for field_name in tbl.field_names:
+                    tbl.align[field_name] = 'r'
+                tbl.add_row(list(result.values()))
+                print(tbl)
+
+            if result['blocks_missing'] > 0 or result['blocks_incomplete'] > 0:
+                raise benji.exception.ScrubbingError('Storage reconciliation found missing or incomplete blocks.')
+        finally:
+            if benji_obj:
+                benji_obj.close()
+
+    def hash_benchmark(self, hash_functions: Optional[List[str]], samples: int, threads: Optional[List[int]]) -> None:
+        benji_obj = None
+        try:
+            benji_obj = Benji(self.config)
+            results = benji_obj.hash_benchmark(hash_functions, samples=samples, threads=threads or [1])
+
+            if self.machine_output:
+                print(json.dumps(results, indent=4))
+            else:
+                tbl = PrettyTable()
+                tbl.field_names = ['hash function', 'backend', 'compatible', 'threads', 'MB/s', 'MB/CPU-s']
+                for field_name in tbl.field_names[:3]:
+                    tbl.align[field_name] = 'l'
+                for field_name in tbl.field_names[3:]:
+                    tbl.align[field_name] = 'r'
+                for hash_function, result in results.items():
+                    for thread_result in result['threads']:
+                        tbl.add_row([
+                            hash_function,
+                            result['backend'],
+                            'yes' if result['compatible'] else 'no',
+                            thread_result['threads'],
+                            '{:.1f}'.format(thread_result['speed'] / 1024 / 1024),
+                            '{:.1f}'.format(thread_result['cpu_speed'] / 1024 / 1024),
+                        ])
+                print(tbl)
+        finally:
+            if benji_obj:
+                benji_obj.close()
+
+    def transform_benchmark(self, transform_names: Optional[List[str]], filter_expression: Optional[str], samples: int,
+                            threads: Optional[List[int]], synthetic_compressibility: Optional[int]) -> None:
+        benji_obj = None
+        try:
+            benji_obj = Benji(self.config)
+            results = benji_obj.transform_benchmark(
+                transform_names,
+                filter_expression,
+                samples=samples,
+                threads=threads or [1],
+                synthetic_compressibility=(synthetic_compressibility / 100
+                                           if synthetic_compressibility is not None else None))
+
+            if self.machine_output:
+                print(json.dumps(results, indent=4))
+            else:
+                tbl = PrettyTable()
+                tbl.field_names = [
+                    'transform', 'ratio', 'threads', 'encapsulate MB/s', 'decapsulate MB/s', 'encapsulate MB/CPU-s',
+                    'decapsulate MB/CPU-s'
+                ]
+                tbl.align['transform'] = 'l'
+                for field_name in tbl.field_names[1:]:
+                    tbl.align[field_name] = 'r'
+
+                # Speeds are None when no block was decapsulated because the transform left all of them unchanged
+                def format_speed(speed: Optional[float]) -> str:
+                    return '{:.1f}'.format(speed / 1024 / 1024) if speed is not None else 'n/a'
+
+                for transform_name, result in results.items():
+                    for thread_result in result['threads']:
+                        tbl.add_row([
+                            transform_name,
+                            '{:.3f}'.format(result['ratio']),
+                            thread_result['threads'],
+                            format_speed(thread_result['encapsulate_speed']),
+                            format_speed(thread_result['decapsulate_speed']),
+                            format_speed(thread_result['encapsulate_cpu_speed']),
+                            format_speed(thread_result['decapsulate_cpu_speed']),
+                        ])
+                print(tbl)
+        finally:
+            if benji_obj:
+                benji_obj.close()
+
+    def transform_train_dict(self, transform_name: str, filter_expression: Optional[str], output_file: str,
+                             dict_size: int, samples: int, force: bool) -> None:
+        if os.path.exists(output_file) and not force:
+            raise FileExistsError('The output file already exists.')
+
+        benji_obj = None
+        try:
+            benji_obj = Benji(self.config)
+            dict_data, report = benji_obj.transform_train_dict(filter_expression,
+                                                               transform_name,
+                                                               dict_size=dict_size,
+                                                               samples=samples)
+            with open(output_file, 'wb') as f:
+                f.write(dict_data)
+
+            if self.machine_output:
+                print(json.dumps(report, indent=4))
+            else:
+                tbl = PrettyTable()
+                tbl.field_names = ['dictionary', 'ratio', 'compression MB/s', 'decompression MB/s']
+                for field_name in tbl.field_names[1:]:
+                    tbl.align[field_name] = 'r'
+                for dictionary, results in (('current', report['current']), ('trained', report['trained'])):
+                    tbl.add_row([
+                        dictionary,
+                        '{:.3f}'.format(results['ratio']),
+                        '{:.1f}'.format(results['compression_speed'] / 1024 / 1024),
+                        '{:.1f}'.format(results['decompression_speed'] / 1024 / 1024),
+                    ])
+                print(tbl)
+                print('Dictionary with ID {} written to {}.'.format(report['dict_id'], output_file))
+        finally:
+            if benji_obj:
+                benji_obj.close()
+
     def rest_api(self, bind_address: str, bind_port: int) -> None:
         from benji.restapi import RestAPI
         api = RestAPI(self.config)
@@ -14,7 +14,7 @@ import time
 import uuid
 from abc import abstractmethod
 from binascii import hexlify, unhexlify
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 from contextlib import contextmanager
 from functools import total_ordering
 from typing import Union, List, Tuple, TextIO, Dict, cast, Iterator, Set, Any, Optional, Sequence, Callable
@@ -46,7 +46,9 @@ class BenjiDateTime(sqlalchemy.types.TypeDecorator):
     impl = sqlalchemy.DateTime
 
     def process_bind_param(self, value: Optional[Union[datetime.datetime, str]], dialect) -> Optional[datetime.datetime]:
-        if isinstance(value, datetime.datetime):
+        if value is None:
+            return None
+        elif isinstance(value, datetime.datetime):
             if value.tzinfo is None:
                 return value
             else:
@@ -300,6 +302,7 @@ class Version(Base):
     bytes_written = sqlalchemy.Column(sqlalchemy.BigInteger)
     bytes_deduplicated = sqlalchemy.Column(sqlalchemy.BigInteger)
     bytes_sparse = sqlalchemy.Column(sqlalchemy.BigInteger)
+    bytes_stored = sqlalchemy.Column(sqlalchemy.BigInteger)
     duration = sqlalchemy.Column(sqlalchemy.BigInteger)
 
     labels = sqlalchemy.orm.relationship('Label',
@@ -474,6 +477,11 @@ class Storage(Base):
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, autoincrement=True, nullable=False)
     name = sqlalchemy.Column(sqlalchemy.String(255), nullable=False, unique=True)
 
+    # Statistics, NULL means that they are unknown and need to be reconciled
+    objects_count = sqlalchemy.Column(sqlalchemy.BigInteger, nullable=True)
+    objects_size = sqlalchemy.Column(sqlalchemy.BigInteger, nullable=True)
+    stats_reconciled = sqlalchemy.Column(BenjiDateTime, nullable=True)
+
 
 class DatabaseBackend(ReprMixIn):
     _METADATA_VERSION_KEY = 'metadata_version'
@@ -620,14 +628,22 @@ class DatabaseBackend(ReprMixIn):
 
         return version
 
-    def set_version_stats(self, *, version_uid: VersionUid, bytes_read: int, bytes_written: int,
-                          bytes_deduplicated: int, bytes_sparse: int, duration: int) -> None:
+    def set_version_stats(self,
+                          *,
+                          version_uid: VersionUid,
+                          bytes_read: int,
+                          bytes_written: int,
+                          bytes_deduplicated: int,
+                          bytes_sparse: int,
+                          duration: int,
+                          bytes_stored: int = None) -> None:
         try:
             version = self.get_version(version_uid)
             version.bytes_read = bytes_read
             version.bytes_written = bytes_written
             version.bytes_deduplicated = bytes_deduplicated
             version.bytes_sparse = bytes_sparse
+            version.bytes_stored = bytes_stored
             version.duration = duration
             self._session.commit()
         except:
@@ -844,6 +860,37 @@ class DatabaseBackend(ReprMixIn):
         assert yield_per > 0
         yield from self._yield_blocks(version, yield_per)
 
+    # Returns the distinct UIDs of all blocks referenced by versions on the given storage (or of all blocks awaiting
+    # deletion if deleted is True) in ascending order. Keyset pagination is used to keep the memory usage bounded.
+    def get_block_uids_by_storage(self, storage_id: int, deleted: bool = False,
+                                  yield_per: int = 10000) -> Iterator[BlockUid]:
+        assert yield_per > 0
+        if deleted:
+            table = DeletedBlock
+            query = self._session.query(DeletedBlock.uid_left,
+                                        DeletedBlock.uid_right).filter(DeletedBlock.storage_id == storage_id)
+        else:
+            table = Block
+            query = self._session.query(Block.uid_left, Block.uid_right).join(Version).filter(
+                Version.storage_id == storage_id, Block.uid_left.isnot(None))
+        query = query.distinct().order_by(table.uid_left, table.uid_right)
+
+        last_uid = None
+        while True:
+            if last_uid is not None:
+                page_query = query.filter(
+                    sqlalchemy.or_(
+                        table.uid_left > last_uid.left,
+                        sqlalchemy.and_(table.uid_left == last_uid.left, table.uid_right > last_uid.right)))
+            else:
+                page_query = query
+            rows = page_query.limit(yield_per).all()
+            for uid_left, uid_right in rows:
+                last_uid = BlockUid(uid_left, uid_right)
+                yield last_uid
+            if len(rows) < yield_per:
+                break
+
     def rm_version(self, version_uid: VersionUid) -> int:
         try:
             version = self._session.query(Version).filter(Version.uid == version_uid).one_or_none()
@@ -867,6 +914,25 @@ class DatabaseBackend(ReprMixIn):
 
         return num_blocks
 
+    def move_version_to_storage(self, version_uid: VersionUid, storage_id: int) -> None:
+        # All blocks on the old storage become delete candidates, cleanup takes care of those still referenced
+        # by other versions. Both changes are committed together.
+        try:
+            version = self._session.query(Version).filter(Version.uid == version_uid).one()
+            deleted_blocks = self._session.query(
+                sqlalchemy.literal(version.storage_id), Block.uid_left, Block.uid_right,
+                sqlalchemy.literal(datetime.datetime.utcnow(), BenjiDateTime)).filter(
+                    Block.version_id == version.id, Block.uid_left.isnot(None)).distinct()
+            self._session.execute(
+                sqlalchemy.insert(DeletedBlock).from_select(
+                    [DeletedBlock.storage_id, DeletedBlock.uid_left, DeletedBlock.uid_right, DeletedBlock.date],
+                    deleted_blocks))
+            version.storage_id = storage_id
+            self._session.commit()
+        except:
+            self._session.rollback()
+            raise
+
     def get_delete_candidates(self, dt: int = 3600) -> Iterator[Dict[str, Set[BlockUid]]]:
         rounds = 0
         false_positives_count = 0
@@ -881,8 +947,9 @@ class DatabaseBackend(ReprMixIn):
             if not delete_candidates:
                 break
 
-            false_positives = set()
+            false_positives: Dict[int, Set[BlockUid]] = defaultdict(set)
             hit_list: Dict[str, Set[BlockUid]] = {}
+            hit_list_storage_ids: Dict[str, int] = {}
             for candidate in delete_candidates:
                 rounds += 1
                 if rounds % 1000 == 0:
@@ -891,28 +958,34 @@ class DatabaseBackend(ReprMixIn):
                         hit_list_count,
                     ))
 
+                # Blocks with the same UID can exist on more than one storage after a version has been copied
                 block = self._session.query(Block)\
-                    .filter(Block.uid == candidate.uid)\
+                    .join(Version)\
+                    .filter(Block.uid == candidate.uid, Version.storage_id == candidate.storage_id)\
                     .limit(1)\
                     .scalar()
                 if block:
-                    false_positives.add(candidate.uid)
+                    false_positives[candidate.storage_id].add(candidate.uid)
                     false_positives_count += 1
                 else:
                     if candidate.storage.name not in hit_list:
                         hit_list[candidate.storage.name] = set()
+                        hit_list_storage_ids[candidate.storage.name] = candidate.storage_id
                     hit_list[candidate.storage.name].add(candidate.uid)
                     hit_list_count += 1
 
-            if false_positives:
-                logger.debug("Cleanup: Removing {} false positive from delete candidates.".format(len(false_positives)))
+            for storage_id, uids in false_positives.items():
+                logger.debug("Cleanup: Removing {} false positive from delete candidates.".format(len(uids)))
                 self._session.query(DeletedBlock)\
-                    .filter(DeletedBlock.uid.in_(false_positives))\
+                    .filter(DeletedBlock.storage_id == storage_id, DeletedBlock.uid.in_(uids))\
                     .delete(synchronize_session=False)
 
             if hit_list:
-                for uids in hit_list.values():
-                    self._session.query(DeletedBlock).filter(DeletedBlock.uid.in_(uids)).delete(synchronize_session=False)
+                for storage_name, uids in hit_list.items():
+                    self._session.query(DeletedBlock)\
+                        .filter(DeletedBlock.storage_id == hit_list_storage_ids[storage_name],
+                                DeletedBlock.uid.in_(uids))\
+                        .delete(synchronize_session=False)
                 yield hit_list
                 # We expect that the caller has handled all the blocks returned so far, so we can call commit after
                 # the yield to keep the transaction small.
@@ -944,6 +1017,31 @@ class DatabaseBackend(ReprMixIn):
             self._session.rollback()
             raise
 
+    def update_storage_usage(self, storage_name: str, *, objects_count: int, objects_size: int) -> None:
+        # The changes are committed together with the rest of the current transaction. Unknown (NULL) statistics
+        # stay unknown until they are reconciled.
+        try:
+            self._session.query(Storage).filter(Storage.name == storage_name).update(
+                {
+                    Storage.objects_count: Storage.objects_count + objects_count,
+                    Storage.objects_size: Storage.objects_size + objects_size,
+                },
+                synchronize_session=False)
+        except:
+            self._session.rollback()
+            raise
+
+    def set_storage_usage(self, storage_name: str, *, objects_count: int, objects_size: int) -> None:
+        try:
+            storage = self.get_storage_by_name(storage_name)
+            storage.objects_count = objects_count
+            storage.objects_size = objects_size
+            storage.stats_reconciled = datetime.datetime.utcnow()
+            self._session.commit()
+        except:
+            self._session.rollback()
+            raise
+
     def get_storage_by_name(self, storage_name: str) -> Storage:
         return self._session.query(Storage).filter(Storage.name == storage_name).one_or_none()
 
@@ -1248,6 +1346,7 @@ class DatabaseBackend(ReprMixIn):
                 bytes_written=version_dict['bytes_written'],
                 bytes_deduplicated=version_dict['bytes_deduplicated'],
                 bytes_sparse=version_dict['bytes_sparse'],
+                bytes_stored=version_dict.get('bytes_stored', None),
                 duration=version_dict['duration'],
             )
             self._session.add(version)
@@ -179,6 +179,10 @@ class TransformFactory(ReprMixIn):
 
         return cls._instances[name]
 
+    @classmethod
+    def get_modules(cls) -> Dict[str, _TransformFactoryModule]:
+        return cls._modules
+
 
 class IOFactory(ReprMixIn):
 
@@ -9,6 +9,7 @@ logger = logging.getLogger()
 command_registry = CollectorRegistry()
 backup_registry = CollectorRegistry()
 version_status_registry = CollectorRegistry()
+storage_stats_registry = CollectorRegistry()
 
 
 def push(registry: CollectorRegistry):
@@ -37,4 +38,7 @@ backup_status_failed = Gauge('benji_backup_status_failed', labelnames=['volume']
 
 invalid_versions = Gauge('benji_invalid_versions', documentation='Number of invalid backup versions', registry=version_status_registry)
 older_incomplete_versions = Gauge('benji_older_incomplete_versions', documentation='Number of older incomplete versions', registry=version_status_registry)
+
+storage_objects_count = Gauge('benji_storage_objects_count', labelnames=['storage'], documentation='Number of objects in storage', registry=storage_stats_registry)
+storage_objects_size_bytes = Gauge('benji_storage_objects_size_bytes', labelnames=['storage'], documentation='Total size of all objects in storage (bytes)', registry=storage_stats_registry)
 # yapf: enable
@@ -1,7 +1,8 @@
+import asyncio
 import concurrent
 from concurrent.futures import ThreadPoolExecutor, Future
 from threading import BoundedSemaphore
-from typing import List, Callable, Iterator, Any
+from typing import List, Callable, Iterator, Any, Awaitable
 
 from benji.logging import logger
 
@@ -17,12 +18,15 @@ class JobExecutor:
     # at once and so use up all available memory.
     def __init__(self, *, workers: int, blocking_submit: bool, name: str) -> None:
         self._name = name
-        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
         self._futures: List[Future] = []
         self._blocking_submit = blocking_submit
         # Set the queue limit to two times the number of workers plus one to ensure that there are always
         # enough jobs available even when all futures finish at the same time.
         self._semaphore = BoundedSemaphore(2 * workers + 1)
+        self._start_executor(workers)
+
+    def _start_executor(self, workers: int) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=self._name)
 
     def submit(self, function: Callable) -> None:
         if self._blocking_submit:
@@ -51,7 +55,7 @@ class JobExecutor:
         for future in concurrent.futures.as_completed(self._futures, timeout=timeout):
             self._futures.remove(future)
             if not self._blocking_submit and not future.cancelled():
-                self._semaphore.release()
+                self._release_result()
             try:
                 result = future.result()
             except Exception as exception:
@@ -59,6 +63,9 @@ class JobExecutor:
             del future
             yield result
 
+    def _release_result(self) -> None:
+        self._semaphore.release()
+
     def shutdown(self) -> None:
         if len(self._futures) > 0:
             logger.warning('Job executor "{}" is being shutdown with {} outstanding jobs, cancelling them.'.format(
@@ -71,7 +78,55 @@ class JobExecutor:
                 for _ in self.get_completed():
                     pass
                 logger.debug('Job executor "{}" read results for all outstanding jobs.'.format(self._name))
+        self._shutdown_executor()
+
+    def _shutdown_executor(self) -> None:
         self._executor.shutdown()
 
     def wait_for_all(self) -> None:
         concurrent.futures.wait(self._futures)
+
+
+class AsyncJobExecutor(JobExecutor):
+
+    # This variant runs coroutines on an asyncio event loop which is driven by another thread. No thread is tied up
+    # while a job is waiting for I/O, so the number of workers can be much higher than with the thread based
+    # executor. The semantics of blocking_submit and the results returned by get_completed() are the same.
+    def __init__(self, *, workers: int, blocking_submit: bool, name: str, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        super().__init__(workers=workers, blocking_submit=blocking_submit, name=name)
+
+    def _start_executor(self, workers: int) -> None:
+        # asyncio primitives need to be created inside of the event loop they are used with.
+        async def create_semaphores():
+            return asyncio.Semaphore(workers), asyncio.BoundedSemaphore(2 * workers + 1)
+
+        self._workers_semaphore, self._results_semaphore = asyncio.run_coroutine_threadsafe(
+            create_semaphores(), self._loop).result()
+
+    def submit(self, function: Callable[[], Awaitable]) -> None:
+        if self._blocking_submit:
+            self._semaphore.acquire()
+
+            async def execute_with_release():
+                try:
+                    async with self._workers_semaphore:
+                        return await function()
+                finally:
+                    self._semaphore.release()
+
+            self._futures.append(asyncio.run_coroutine_threadsafe(execute_with_release(), self._loop))
+        else:
+
+            async def execute_with_acquire():
+                await self._results_semaphore.acquire()
+                async with self._workers_semaphore:
+                    return await function()
+
+            self._futures.append(asyncio.run_coroutine_threadsafe(execute_with_acquire(), self._loop))
+
+    def _release_result(self) -> None:
+        self._loop.call_soon_threadsafe(self._results_semaphore.release)
+
+    def _shutdown_executor(self) -> None:
+        pass
@@ -41,6 +41,7 @@ from typing import Generator, Optional, Any, Tuple
 from benji.benji import BenjiStore
 from benji.database import VersionUid, Version
 from benji.repr import ReprMixIn
+from benji.transform.base import BytesLike
 
 
 class _NbdServerAbortedNegotiationError(IOError):
@@ -153,7 +154,7 @@ class NbdServer(ReprMixIn):
 
     @asyncio.coroutine
     def nbd_response(self, writer: StreamWriter, handle: int, error: int = 0,
-                     data: bytes = None) -> Generator[Any, None, None]:
+                     data: BytesLike = None) -> Generator[Any, None, None]:
         writer.write(struct.pack('>LLQ', self.NBD_REPLY_MAGIC, error, handle))
         if data:
             writer.write(data)
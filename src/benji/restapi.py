@@ -222,13 +222,14 @@ class RestAPI:
                 benji_obj.close()
 
     @route('/api/v1/versions/<version_uid>/scrub', method='POST')
-    def scrub(self, version_uid: str, block_percentage: fields.Int(missing=100)) -> StringIO:
+    def scrub(self, version_uid: str, block_percentage: fields.Int(missing=100),
+              storage_verified: fields.Bool(missing=False)) -> StringIO:
         version_uid_obj = VersionUid(version_uid)
         result = StringIO()
         benji_obj = None
         try:
             benji_obj = Benji(self._config)
-            benji_obj.scrub(version_uid_obj, block_percentage=block_percentage)
+            benji_obj.scrub(version_uid_obj, block_percentage=block_percentage, storage_verified=storage_verified)
         except benji.exception.ScrubbingError:
             assert benji_obj is not None
             benji_obj.export_any(
@@ -283,12 +284,12 @@ class RestAPI:
         return result
 
     def _batch_scrub(self, method: str, filter_expression: Optional[str], version_percentage: int,
-                     block_percentage: int, group_label: Optional[str]) -> StringIO:
+                     block_percentage: int, group_label: Optional[str], **kwargs) -> StringIO:
         benji_obj = None
         try:
             benji_obj = Benji(self._config)
             versions, errors = getattr(benji_obj, method)(filter_expression, version_percentage, block_percentage,
-                                                          group_label)
+                                                          group_label, **kwargs)
 
             result = StringIO()
             benji_obj.export_any({
@@ -305,8 +306,14 @@ class RestAPI:
 
     @route('/api/v1/versions/scrub', method='POST')
     def batch_scrub(self, filter_expression: fields.Str(missing=None), version_percentage: fields.Int(missing=100),
-                    block_percentage: fields.Int(missing=100), group_label: fields.Str(missing=None)) -> StringIO:
-        return self._batch_scrub('batch_scrub', filter_expression, version_percentage, block_percentage, group_label)
+                    block_percentage: fields.Int(missing=100), group_label: fields.Str(missing=None),
+                    storage_verified: fields.Bool(missing=False)) -> StringIO:
+        return self._batch_scrub('batch_scrub',
+                                 filter_expression,
+                                 version_percentage,
+                                 block_percentage,
+                                 group_label,
+                                 storage_verified=storage_verified)
 
     @route('/api/v1/versions/deep-scrub', method='POST')
     def batch_deep_scrub(self, filter_expression: fields.Str(missing=None), version_percentage: fields.Int(missing=100),
@@ -443,11 +450,11 @@ class RestAPI:
         return result
 
     @route('/api/v1/storages/<storage_name>/stats', method='GET')
-    def _storage_stats(self, storage_name: str) -> Dict:
+    def _storage_stats(self, storage_name: str, reconcile: fields.Bool(missing=False)) -> Dict:
         benji_obj = None
         try:
             benji_obj = Benji(self._config)
-            objects_count, objects_size = benji_obj.storage_stats(storage_name)
+            objects_count, objects_size = benji_obj.storage_stats(storage_name, reconcile=reconcile)
 
             result = {
                 'objects_count': objects_count,
@@ -458,3 +465,43 @@ class RestAPI:
         finally:
             if benji_obj:
                 benji_obj.close()
+
+    @route('/api/v1/storages/<storage_name>/copy', method='POST')
+    def _storage_copy(self, storage_name: str, filter_expression: fields.Str(missing=None),
+                      workers: fields.Int(missing=16), override_lock: fields.Bool(missing=False)) -> StringIO:
+        benji_obj = None
+        try:
+            benji_obj = Benji(self._config)
+            copied_versions = benji_obj.storage_copy(filter_expression,
+                                                     storage_name,
+                                                     workers=workers,
+                                                     override_lock=override_lock)
+            result = StringIO()
+            benji_obj.export_any({'versions': copied_versions},
+                                 result,
+                                 ignore_relationships=[((Version,), ('blocks',))])
+            return result
+        finally:
+            if benji_obj:
+                benji_obj.close()
+
+    @route('/api/v1/storages/<storage_name>/reconcile', method='POST')
+    def _storage_reconcile(self, storage_name: str, delete_orphans: fields.Bool(missing=False),
+                           override_lock: fields.Bool(missing=False)) -> Dict:
+        benji_obj = None
+        try:
+            benji_obj = Benji(self._config)
+            return benji_obj.storage_reconcile(storage_name, delete_orphans=delete_orphans, override_lock=override_lock)
+        finally:
+            if benji_obj:
+                benji_obj.close()
+
+    @route('/api/v1/storages/<storage_name>/read-cache-stats', method='GET')
+    def _storage_read_cache_stats(self, storage_name: str) -> Dict:
+        benji_obj = None
+        try:
+            benji_obj = Benji(self._config)
+            return benji_obj.storage_read_cache_stats(storage_name)
+        finally:
+            if benji_obj:
+                benji_obj.close()
@@ -121,6 +121,10 @@ def main():
                    default=100,
                    help='Check only a certain percentage of versions')
     p.add_argument('-g', '--group_label', default=None, help='Label to find related versions')
+    p.add_argument('-s',
+                   '--storage-verified',
+                   action='store_true',
+                   help='Also compare the object checksums reported by the storage')
     p.add_argument('filter_expression', nargs='?', default=None, help='Version filter expression')
     p.set_defaults(func='batch_scrub')
 
@@ -165,6 +169,30 @@ def main():
     p.add_argument('filter_expression', nargs='?', default=None, help='Version filter expression')
     p.set_defaults(func='enforce_retention_policy')
 
+    # HASH-BENCHMARK
+    p = subparsers_root.add_parser('hash-benchmark',
+                                   help='Compare block hash functions',
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('-H',
+                   '--hash-function',
+                   dest='hash_functions',
+                   action='append',
+                   default=None,
+                   help='Hash function in the same format as hashFunction (can be repeated, the configured hash '
+                   'function and a selection of alternatives by default)')
+    p.add_argument('-n',
+                   '--samples',
+                   type=partial(integer_range, 1, 100000),
+                   default=64,
+                   help='Number of random blocks to hash')
+    p.add_argument('-j',
+                   '--threads',
+                   type=partial(integer_range, 1, 256),
+                   action='append',
+                   default=None,
+                   help='Number of threads (can be repeated, 1 by default)')
+    p.set_defaults(func='hash_benchmark')
+
     # LABEL
     p = subparsers_root.add_parser('label', help='Add labels to a version')
     p.add_argument('version_uid')
@@ -250,14 +278,95 @@ def main():
                    type=partial(integer_range, 1, 100),
                    default=100,
                    help='Check only a certain percentage of blocks')
+    p.add_argument('-s',
+                   '--storage-verified',
+                   action='store_true',
+                   help='Also compare the object checksums reported by the storage')
     p.add_argument('version_uid', help='Version UID')
     p.set_defaults(func='scrub')
 
+    # STORAGE-COPY
+    p = subparsers_root.add_parser('storage-copy',
+                                   help='Copy versions to another storage and switch them over',
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('--to', dest='target_storage_name', required=True, help='Target storage')
+    p.add_argument('-w',
+                   '--workers',
+                   type=partial(integer_range, 1, 1024),
+                   default=16,
+                   help='Number of blocks copied in parallel')
+    p.add_argument('--override-lock', action='store_true', help='Override and release any held lock (dangerous)')
+    p.add_argument('filter_expression', nargs='?', default=None, help='Version filter expression')
+    p.set_defaults(func='storage_copy')
+
+    # STORAGE-RECONCILE
+    p = subparsers_root.add_parser('storage-reconcile',
+                                   help='Compare the objects on a storage with the database and report differences')
+    p.add_argument('storage_name', nargs='?', default=None, help='Storage')
+    p.add_argument('--delete-orphans', action='store_true', help='Delete objects not referenced by the database')
+    p.add_argument('--override-lock', action='store_true', help='Override and release any held lock (dangerous)')
+    p.set_defaults(func='storage_reconcile')
+
     # STORAGE-STATS
     p = subparsers_root.add_parser('storage-stats', help='Show storage statistics')
     p.add_argument('storage_name', nargs='?', default=None, help='Storage')
+    p.add_argument('--reconcile',
+                   action='store_true',
+                   help='Recompute the statistics by listing all objects and update the database')
     p.set_defaults(func='storage_stats')
 
+    # TRANSFORM-BENCHMARK
+    p = subparsers_root.add_parser('transform-benchmark',
+                                   help='Compare transforms on blocks sampled from one or more versions',
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('-t',
+                   '--transform',
+                   dest='transform_names',
+                   action='append',
+                   default=None,
+                   help='Transform (can be repeated, all configured transforms by default)')
+    p.add_argument('-n',
+                   '--samples',
+                   type=partial(integer_range, 1, 100000),
+                   default=64,
+                   help='Number of blocks to sample or generate')
+    p.add_argument('-j',
+                   '--threads',
+                   type=partial(integer_range, 1, 256),
+                   action='append',
+                   default=None,
+                   help='Number of threads (can be repeated, 1 by default)')
+    p.add_argument('-s',
+                   '--synthetic',
+                   dest='synthetic_compressibility',
+                   metavar='COMPRESSIBILITY',
+                   type=partial(integer_range, 0, 100),
+                   default=None,
+                   help='Use synthetic data with this percentage of compressible content instead of sampled blocks')
+    p.add_argument('filter_expression', nargs='?', default=None, help='Version filter expression')
+    p.set_defaults(func='transform_benchmark')
+
+    # TRANSFORM-TRAIN-DICT
+    p = subparsers_root.add_parser('transform-train-dict',
+                                   help='Train a zstd dictionary with blocks sampled from one or more versions',
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('-o', '--output-file', required=True, help='Dictionary file')
+    p.add_argument('-f', '--force', action='store_true', help='Overwrite an existing dictionary file')
+    p.add_argument('-s',
+                   '--size',
+                   dest='dict_size',
+                   type=partial(integer_range, 1024, 16 * 1024 * 1024),
+                   default=112640,
+                   help='Size of the dictionary in bytes')
+    p.add_argument('-n',
+                   '--samples',
+                   type=partial(integer_range, 1, 100000),
+                   default=64,
+                   help='Number of blocks to sample')
+    p.add_argument('transform_name', help='Transform')
+    p.add_argument('filter_expression', nargs='?', default=None, help='Version filter expression')
+    p.set_defaults(func='transform_train_dict')
+
     # UNPROTECT
     p = subparsers_root.add_parser('unprotect', help='Unprotect one or more versions')
     p.add_argument('version_uids', metavar='version_uid', nargs='+', help='Version UID')
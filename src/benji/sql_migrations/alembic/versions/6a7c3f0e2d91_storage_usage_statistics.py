@@ -0,0 +1,35 @@
+"""Storage usage statistics
+
+Revision ID: 6a7c3f0e2d91
+Revises: 3d014d45493f
+Create Date: 2020-01-20 10:12:44.418913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '6a7c3f0e2d91'
+down_revision = '3d014d45493f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('storages', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('objects_count', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('objects_size', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('stats_reconciled', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('versions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('bytes_stored', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('versions', schema=None) as batch_op:
+        batch_op.drop_column('bytes_stored')
+
+    with op.batch_alter_table('storages', schema=None) as batch_op:
+        batch_op.drop_column('stats_reconciled')
+        batch_op.drop_column('objects_size')
+        batch_op.drop_column('objects_count')
@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 # -*- encoding: utf-8 -*-
+import hashlib
+import itertools
 import logging
 import random
+import sqlite3
+import threading
 import time
-from typing import Any, Union, Iterable, Tuple
+from typing import Any, Union, Iterable, Tuple, Optional, List
 
 import b2
 import b2.api
@@ -19,8 +23,57 @@ from benji.logging import logger
 from benji.storage.base import ReadCacheStorageBase
 
 
+class _FileIdIndex:
+
+    # Maps object names to the B2 file ID and size of their latest known version. The index is filled by uploads
+    # and listings and is either kept in memory or in an SQLite database which can be shared between runs. It is
+    # only used to resolve file IDs for deletions, entries might be stale.
+    def __init__(self, filename: Optional[str]) -> None:
+        self._connection = sqlite3.connect(filename if filename is not None else ':memory:',
+                                           timeout=60,
+                                           check_same_thread=False,
+                                           isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            if filename is not None:
+                self._connection.execute('PRAGMA journal_mode=WAL')
+                self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, id TEXT NOT NULL, size INTEGER NOT NULL)')
+
+    def get(self, name: str) -> Optional[Tuple[str, int]]:
+        with self._lock:
+            return self._connection.execute('SELECT id, size FROM files WHERE name = ?', (name,)).fetchone()
+
+    def set_many(self, entries: List[Tuple[str, str, int]]) -> None:
+        with self._lock:
+            self._connection.execute('BEGIN')
+            try:
+                self._connection.executemany('INSERT OR REPLACE INTO files (name, id, size) VALUES (?, ?, ?)', entries)
+            except:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+
+    def set(self, name: str, id_: str, size: int) -> None:
+        self.set_many([(name, id_, size)])
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            self._connection.execute('DELETE FROM files WHERE name = ?', (name,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
 class Storage(ReadCacheStorageBase):
 
+    _OBJECT_CHECKSUM_ALGORITHM = 'sha1'
+
+    # Number of listed objects which are added to the file ID index in one transaction
+    _FILE_ID_INDEX_BATCH_SIZE = 1000
+
     WRITE_QUEUE_LENGTH = 20
     READ_QUEUE_LENGTH = 20
 
@@ -52,6 +105,9 @@ class Storage(ReadCacheStorageBase):
 
         self._read_object_attempts = Config.get_from_dict(module_configuration, 'readObjectAttempts', types=int)
 
+        file_id_index_file = Config.get_from_dict(module_configuration, 'fileIdIndexFile', None, types=str)
+        self._file_id_index = _FileIdIndex(file_id_index_file)
+
         self.service = b2.api.B2Api(account_info)
         if account_info_file is not None:
             try:
@@ -68,9 +124,22 @@ class Storage(ReadCacheStorageBase):
         self.bucket = self.service.get_bucket_by_name(bucket_name)
 
     def _write_object(self, key: str, data: bytes) -> None:
+        self._upload_object(key, data)
+
+    def _write_object_checksummed(self, key: str, data: bytes, checksum: Optional[str] = None) -> bool:
+        # The b2 library sends the SHA1 checksum of the data along with the upload and the server verifies it. The
+        # checksum recorded by the server is compared to the local one to be sure.
+        file_version_info = self._upload_object(key, data)
+        content_sha1 = checksum if checksum is not None else hashlib.sha1(data).hexdigest()
+        if file_version_info.content_sha1 != content_sha1:
+            raise ValueError('Checksum mismatch for object {}. Expected: {}, got: {}.'.format(
+                key, content_sha1, file_version_info.content_sha1))
+        return True
+
+    def _upload_object(self, key: str, data: bytes) -> Any:
         for i in range(self._write_object_attempts):
             try:
-                self.bucket.upload_bytes(data, key)
+                file_version_info = self.bucket.upload_bytes(data, key)
             except (B2Error, B2ConnectionError):
                 if i + 1 < self._write_object_attempts:
                     sleep_time = (2**(i + 1)) + (random.randint(0, 1000) / 1000)
@@ -81,8 +150,11 @@ class Storage(ReadCacheStorageBase):
                     continue
                 raise
             else:
+                self._file_id_index.set(key, file_version_info.id_, file_version_info.size)
                 break
 
+        return file_version_info
+
     def _read_object(self, key: str) -> bytes:
         for i in range(self._read_object_attempts):
             data_io = DownloadDestBytes()
@@ -90,6 +162,7 @@ class Storage(ReadCacheStorageBase):
                 self.bucket.download_file_by_name(key, data_io)
             except (B2Error, B2ConnectionError) as exception:
                 if isinstance(exception, FileNotPresent):
+                    self._file_id_index.delete(key)
                     raise FileNotFoundError('Object {} not found.'.format(key)) from None
                 else:
                     if i + 1 < self._read_object_attempts:
@@ -110,11 +183,27 @@ class Storage(ReadCacheStorageBase):
         for entry in r['files']:
             file_version_info = b2.file_version.FileVersionInfoFactory.from_api_response(entry)
             if file_version_info.file_name == key:
+                self._file_id_index.set(key, file_version_info.id_, file_version_info.size)
                 return file_version_info
 
+        self._file_id_index.delete(key)
         raise FileNotFoundError('Object {} not found.'.format(key))
 
     def _read_object_length(self, key: str) -> int:
+        # The file ID index isn't consulted here as this is used to check that the object still exists
+        return self._read_file_info(key).size
+
+    def _read_object_length_and_checksum(self, key: str) -> Tuple[int, Optional[str]]:
+        file_version_info = self._read_file_info(key)
+        # Large files uploaded in parts don't have a checksum, their checksum is reported as "none"
+        content_sha1 = file_version_info.content_sha1
+        if content_sha1 is None or content_sha1 == 'none':
+            return file_version_info.size, None
+        elif content_sha1.startswith('unverified:'):
+            content_sha1 = content_sha1[len('unverified:'):]
+        return file_version_info.size, content_sha1
+
+    def _read_file_info(self, key: str) -> Any:
         for i in range(self._read_object_attempts):
             try:
                 file_version_info = self._file_info(key)
@@ -124,18 +213,31 @@ class Storage(ReadCacheStorageBase):
                 else:
                     if i + 1 < self._read_object_attempts:
                         sleep_time = (2**(i + 1)) + (random.randint(0, 1000) / 1000)
-                        logger.warning(
-                            'Object length request for key {} to B2 failed, will try again in {:.2f} seconds.'.format(
-                                key, sleep_time))
+                        logger.warning('Object information request for key {} to B2 failed, '
+                                       'will try again in {:.2f} seconds.'.format(key, sleep_time))
                         time.sleep(sleep_time)
                         continue
                     raise
             else:
                 break
 
-        return file_version_info.size
+        return file_version_info
+
+    def _rm_object(self, key: str) -> Optional[int]:
+        file_id_index_entry = self._file_id_index.get(key)
+        if file_id_index_entry is not None:
+            file_id, size = file_id_index_entry
+            try:
+                self.bucket.delete_file_version(file_id, key)
+            except B2Error:
+                # The index entry might be stale, so fall back to looking up the current file ID
+                logger.debug('Deletion of object {} with file ID {} from index failed, looking up file ID.'.format(
+                    key, file_id))
+                self._file_id_index.delete(key)
+            else:
+                self._file_id_index.delete(key)
+                return size
 
-    def _rm_object(self, key: str) -> None:
         try:
             file_version_info = self._file_info(key)
             self.bucket.delete_file_version(file_version_info.id_, file_version_info.file_name)
@@ -144,6 +246,10 @@ class Storage(ReadCacheStorageBase):
                 raise FileNotFoundError('Object {} not found.'.format(key)) from None
             else:
                 raise
+        finally:
+            self._file_id_index.delete(key)
+
+        return file_version_info.size
 
     # def _rm_many_objects(self, keys: Sequence[str]) -> List[str]:
     #     """ Deletes many keys from the storage and returns a list of keys that couldn't be deleted.
@@ -159,9 +265,21 @@ class Storage(ReadCacheStorageBase):
 
     def _list_objects(self, prefix: str = None,
                       include_size: bool = False) -> Union[Iterable[str], Iterable[Tuple[str, int]]]:
-        for file_version_info, folder_name in self.bucket.ls(folder_to_list=prefix if prefix is not None else '',
-                                                             recursive=True):
-            if include_size:
-                yield file_version_info.file_name, file_version_info.size
-            else:
-                yield file_version_info.file_name
+        # The listing is processed in batches and each batch is added to the index before it is handed out, so that
+        # the callers see the index entries when they act on the listed objects.
+        file_version_infos = self.bucket.ls(folder_to_list=prefix if prefix is not None else '', recursive=True)
+        while True:
+            batch = [entry[0] for entry in itertools.islice(file_version_infos, self._FILE_ID_INDEX_BATCH_SIZE)]
+            if not batch:
+                break
+            self._file_id_index.set_many([(file_version_info.file_name, file_version_info.id_, file_version_info.size)
+                                          for file_version_info in batch])
+            for file_version_info in batch:
+                if include_size:
+                    yield file_version_info.file_name, file_version_info.size
+                else:
+                    yield file_version_info.file_name
+
+    def close(self) -> None:
+        super().close()
+        self._file_id_index.close()
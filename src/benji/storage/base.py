@@ -1,16 +1,24 @@
 #!/usr/bin/env python
 # -*- encoding: utf-8 -*-
 import base64
+import concurrent.futures
 import datetime
+import hashlib
+import heapq
+import itertools
 import json
 import os
+import random
+import struct
+import tempfile
 import threading
 import time
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union, Optional, Dict, Tuple, List, Sequence, cast, Iterator, Iterable
 
 import semantic_version
-from diskcache import FanoutCache
+from diskcache import Cache, FanoutCache
 
 from benji.config import Config, ConfigDict
 from benji.database import VersionUid, DereferencedBlock, BlockUid, Block
@@ -20,7 +28,9 @@ from benji.jobexecutor import JobExecutor
 from benji.logging import logger
 from benji.repr import ReprMixIn
 from benji.storage.dicthmac import DictHMAC
-from benji.transform.base import TransformBase
+from benji.storage.hedging import ReadHedger
+from benji.storage.readcache import MemoryReadCache, ReadCacheMode, ReadCacheAdmission
+from benji.transform.base import TransformBase, BytesLike
 from benji.utils import TokenBucket, derive_key
 from benji.versions import VERSIONS
 
@@ -52,6 +62,7 @@ class BlockNotFoundError(BenjiException, IOError):
 class StorageBase(ReprMixIn, metaclass=ABCMeta):
 
     _CHECKSUM_KEY = 'checksum'
+    _OBJECT_CHECKSUM_KEY = 'object_checksum'
     _CREATED_KEY = 'created'
     _MODIFIED_KEY = 'modified'
     _HMAC_KEY = 'hmac'
@@ -62,6 +73,17 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
 
     _META_SUFFIX = '.meta'
 
+    # Number of entries sorted in memory by list_blocks_sorted() before they are spilled to a temporary file
+    _SORTED_LISTING_CHUNK_SIZE = 262144
+    _SORTED_LISTING_RECORD = struct.Struct('>QQB')
+    _SORTED_LISTING_DATA = 1
+    _SORTED_LISTING_METADATA = 2
+
+    # Hash algorithm of the content checksum reported by the storage for an object, see
+    # _read_object_length_and_checksum(). It is recorded in the metadata of block objects at write time when
+    # recordObjectChecksums is enabled.
+    _OBJECT_CHECKSUM_ALGORITHM: Optional[str] = None
+
     def __init__(self, *, config: Config, name: str, module_configuration: ConfigDict) -> None:
         self._name = name
         self._active_transforms: List[TransformBase] = []
@@ -79,11 +101,43 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
         simultaneous_removals = Config.get_from_dict(module_configuration, 'simultaneousRemovals', types=int)
         bandwidth_read = Config.get_from_dict(module_configuration, 'bandwidthRead', types=int)
         bandwidth_write = Config.get_from_dict(module_configuration, 'bandwidthWrite', types=int)
+        self._simultaneous_listings = Config.get_from_dict(module_configuration, 'simultaneousListings', types=int)
+        self._listing_shard_levels = Config.get_from_dict(module_configuration, 'listingShardLevels', types=int)
 
         self._consistency_check_writes = Config.get_from_dict(module_configuration,
                                                               'consistencyCheckWrites',
                                                               False,
                                                               types=bool)
+        self._consistency_check_writes_method = Config.get_from_dict(module_configuration,
+                                                                     'consistencyCheckWritesMethod',
+                                                                     types=str)
+        self._consistency_check_writes_sample_rate = Config.get_from_dict(module_configuration,
+                                                                          'consistencyCheckWritesSampleRate',
+                                                                          types=(int, float))
+
+        self._record_object_checksums = Config.get_from_dict(module_configuration, 'recordObjectChecksums', types=bool)
+
+        # Per thread buffer holding intermediate results during decapsulation
+        self._decapsulate_buffers = threading.local()
+
+        self._read_hedger: Optional[ReadHedger] = None
+        if Config.get_from_dict(module_configuration, 'hedgedReads', None, types=dict) is not None:
+            hedged_reads_delay = Config.get_from_dict(module_configuration, 'hedgedReads.delay', types=int)
+            hedged_reads_percentile = Config.get_from_dict(module_configuration,
+                                                           'hedgedReads.percentile',
+                                                           types=(int, float))
+            hedged_reads_maximum_rate = Config.get_from_dict(module_configuration,
+                                                             'hedgedReads.maximumRate',
+                                                             types=(int, float))
+            # Each read can have two requests in flight
+            self._read_hedger = ReadHedger(name='Storage-Hedged-Read',
+                                           workers=2 * simultaneous_reads,
+                                           delay=hedged_reads_delay / 1000 if hedged_reads_delay > 0 else None,
+                                           percentile=hedged_reads_percentile,
+                                           maximum_rate=hedged_reads_maximum_rate)
+            logger.info('Enabling hedged reads for storage {} ({}, at most {:.1f}% of the reads).'.format(
+                name, '{}ms delay'.format(hedged_reads_delay) if hedged_reads_delay > 0 else
+                '{}th percentile delay'.format(hedged_reads_percentile), hedged_reads_maximum_rate * 100))
 
         hmac_key_encoded = Config.get_from_dict(module_configuration, 'hmac.key', None, types=str)
         hmac_key: Optional[bytes] = None
@@ -103,25 +157,68 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
             logger.info('Enabling HMAC object metadata integrity protection for storage {}.'.format(name))
             self._dict_hmac = DictHMAC(hmac_key=self._HMAC_KEY, secret_key=hmac_key)
 
+        # Changes in the number and size of objects caused by this instance, see pop_usage()
+        self._usage_lock = threading.Lock()
+        self._usage_objects_count = 0
+        self._usage_objects_size = 0
+
         self.read_throttling = TokenBucket()
         self.read_throttling.set_rate(bandwidth_read)  # 0 disables throttling
         self.write_throttling = TokenBucket()
         self.write_throttling.set_rate(bandwidth_write)  # 0 disables throttling
 
-        self._read_executor = JobExecutor(name='Storage-Read', workers=simultaneous_reads, blocking_submit=False)
-        self._write_executor = JobExecutor(name='Storage-Write', workers=simultaneous_writes, blocking_submit=True)
-        self._remove_executor = JobExecutor(name='Storage-Remove', workers=simultaneous_removals, blocking_submit=True)
+        self._read_executor = self._create_executor(name='Storage-Read',
+                                                    workers=simultaneous_reads,
+                                                    blocking_submit=False)
+        self._write_executor = self._create_executor(name='Storage-Write',
+                                                     workers=simultaneous_writes,
+                                                     blocking_submit=True)
+        self._remove_executor = self._create_executor(name='Storage-Remove',
+                                                      workers=simultaneous_removals,
+                                                      blocking_submit=True)
+
+    def _create_executor(self, *, name: str, workers: int, blocking_submit: bool) -> JobExecutor:
+        return JobExecutor(name=name, workers=workers, blocking_submit=blocking_submit)
 
     @property
     def name(self) -> str:
         return self._name
 
+    def _account_usage(self, objects_count: int, objects_size: int) -> None:
+        with self._usage_lock:
+            self._usage_objects_count += objects_count
+            self._usage_objects_size += objects_size
+
+    def pop_usage(self) -> Tuple[int, int]:
+        with self._usage_lock:
+            usage = (self._usage_objects_count, self._usage_objects_size)
+            self._usage_objects_count = 0
+            self._usage_objects_size = 0
+        return usage
+
+    def _rm_objects_accounted(self, key: str, metadata_key: str) -> None:
+        # A missing metadata object is ignored, a missing data object raises FileNotFoundError.
+        objects_count = 0
+        objects_size = 0
+        try:
+            objects_size += self._rm_object(key) or 0
+            objects_count += 1
+        finally:
+            try:
+                objects_size += self._rm_object(metadata_key) or 0
+                objects_count += 1
+            except FileNotFoundError:
+                pass
+            finally:
+                self._account_usage(-objects_count, -objects_size)
+
     def _build_metadata(self,
                         *,
                         size: int,
                         object_size: int,
                         transforms_metadata: List[Dict] = None,
-                        checksum: str = None) -> Tuple[Dict, bytes]:
+                        checksum: str = None,
+                        object_checksum: Dict = None) -> Tuple[Dict, bytes]:
 
         timestamp = datetime.datetime.utcnow().isoformat(timespec='microseconds') + 'Z'
         metadata: Dict = {
@@ -138,6 +235,9 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
         if transforms_metadata:
             metadata[self._TRANSFORMS_KEY] = transforms_metadata
 
+        if object_checksum:
+            metadata[self._OBJECT_CHECKSUM_KEY] = object_checksum
+
         if self._dict_hmac:
             self._dict_hmac.add_digest(metadata)
 
@@ -170,7 +270,14 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
     def _check_write(self, *, key: str, metadata_key: str, data_expected: bytes) -> None:
         data_actual = self._read_object(key)
         metadata_actual_json = self._read_object(metadata_key)
-
+        self._check_written(key=key,
+                            data_expected=data_expected,
+                            data_actual=data_actual,
+                            metadata_actual_json=metadata_actual_json)
+
+    # Verifies the data and metadata of an object as read back after writing it
+    def _check_written(self, *, key: str, data_expected: bytes, data_actual: bytes,
+                       metadata_actual_json: bytes) -> None:
         # Return value is ignored
         self._decode_metadata(metadata_json=metadata_actual_json, key=key, data_length=len(data_actual))
 
@@ -178,22 +285,79 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
         if data_expected != data_actual:
             raise ValueError('Written and read data of {} differ.'.format(key))
 
-    def _write(self, block: DereferencedBlock, data: bytes) -> DereferencedBlock:
+    # Returns the key and data of the object and its metadata, and the checksum of the object data (see
+    # _OBJECT_CHECKSUM_ALGORITHM) if it has been computed
+    def _write_prepare(self, block: DereferencedBlock, data: bytes) -> Tuple[str, str, bytes, bytes, Optional[str]]:
         data, transforms_metadata = self._encapsulate(data)
+        return self._write_prepare_encapsulated(block, data, transforms_metadata)
+
+    def _write_prepare_encapsulated(self, block: DereferencedBlock, data: bytes,
+                                    transforms_metadata: List[Dict]) -> Tuple[str, str, bytes, bytes, Optional[str]]:
+        object_checksum = None
+        data_checksum = None
+        if self._record_object_checksums and self._OBJECT_CHECKSUM_ALGORITHM is not None:
+            data_checksum = hashlib.new(self._OBJECT_CHECKSUM_ALGORITHM, data).hexdigest()
+            object_checksum = {'algorithm': self._OBJECT_CHECKSUM_ALGORITHM, 'value': data_checksum}
 
         metadata, metadata_json = self._build_metadata(size=block.size,
                                                        object_size=len(data),
                                                        checksum=block.checksum,
-                                                       transforms_metadata=transforms_metadata)
+                                                       transforms_metadata=transforms_metadata,
+                                                       object_checksum=object_checksum)
 
         key = block.uid.storage_object_to_path()
         metadata_key = key + self._META_SUFFIX
 
+        return key, metadata_key, data, metadata_json, data_checksum
+
+    def _write_objects(self,
+                       key: str,
+                       data: bytes,
+                       metadata_key: str,
+                       metadata_json: bytes,
+                       data_checksum: Optional[str] = None) -> bool:
+        if self._consistency_check_writes and self._consistency_check_writes_method == 'checksum':
+            data_verified = self._write_object_checksummed(key, data, data_checksum)
+            metadata_verified = self._write_object_checksummed(metadata_key, metadata_json)
+            return data_verified and metadata_verified
+        else:
+            self._write_object(key, data)
+            self._write_object(metadata_key, metadata_json)
+            return False
+
+    # Objects whose integrity has been verified by a checksum during the write are only read back for a sample
+    # of the writes.
+    def _read_back_needed(self, checksums_verified: bool) -> bool:
+        if not self._consistency_check_writes:
+            return False
+        return not checksums_verified or random.random() < self._consistency_check_writes_sample_rate
+
+    def _write_check(self, block: DereferencedBlock, *, key: str, data_expected: bytes, data_actual: bytes,
+                     metadata_actual_json: bytes) -> None:
+        try:
+            self._check_written(key=key,
+                                data_expected=data_expected,
+                                data_actual=data_actual,
+                                metadata_actual_json=metadata_actual_json)
+        except (KeyError, ValueError) as exception:
+            raise InvalidBlockException('Check write of block {} (UID {}) failed.'.format(block.idx, block.uid),
+                                        block) from exception
+
+    def _write(self, block: DereferencedBlock, data: bytes) -> DereferencedBlock:
+        key, metadata_key, data, metadata_json, data_checksum = self._write_prepare(block, data)
+        return self._write_prepared(block,
+                                    key=key,
+                                    metadata_key=metadata_key,
+                                    data=data,
+                                    metadata_json=metadata_json,
+                                    data_checksum=data_checksum)
+
+    def _write_prepared(self, block: DereferencedBlock, *, key: str, metadata_key: str, data: bytes,
+                        metadata_json: bytes, data_checksum: Optional[str]) -> DereferencedBlock:
         time.sleep(self.write_throttling.consume(len(data) + len(metadata_json)))
         t1 = time.time()
         try:
-            self._write_object(key, data)
-            self._write_object(metadata_key, metadata_json)
+            checksums_verified = self._write_objects(key, data, metadata_key, metadata_json, data_checksum)
         except:
             try:
                 self._rm_object(key)
@@ -202,15 +366,16 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
                 pass
             raise
         t2 = time.time()
+        self._account_usage(2, len(data) + len(metadata_json))
 
         logger.debug('{} wrote data of uid {} in {:.3f}s'.format(threading.current_thread().name, block.uid, t2 - t1))
 
-        if self._consistency_check_writes:
-            try:
-                self._check_write(key=key, metadata_key=metadata_key, data_expected=data)
-            except (KeyError, ValueError) as exception:
-                raise InvalidBlockException('Check write of block {} (UID {}) failed.'.format(block.idx, block.uid),
-                                            block) from exception
+        if self._read_back_needed(checksums_verified):
+            self._write_check(block,
+                              key=key,
+                              data_expected=data,
+                              data_actual=self._read_object(key),
+                              metadata_actual_json=self._read_object(metadata_key))
 
         return block
 
@@ -228,21 +393,47 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
     def write_block(self, block: Union[DereferencedBlock, Block], data: bytes) -> None:
         self._write(block.deref(), data)
 
+    # Writes already encapsulated data as returned by read_block_raw() of another storage. The object metadata is
+    # rebuilt so that it carries this storage's HMAC and object checksum.
+    def write_block_raw(self, block: Union[DereferencedBlock, Block], data: bytes,
+                        transforms_metadata: List[Dict]) -> None:
+        block_deref = block.deref()
+        key, metadata_key, data, metadata_json, data_checksum = self._write_prepare_encapsulated(
+            block_deref, data, transforms_metadata)
+        self._write_prepared(block_deref,
+                             key=key,
+                             metadata_key=metadata_key,
+                             data=data,
+                             metadata_json=metadata_json,
+                             data_checksum=data_checksum)
+
     def write_get_completed(self, timeout: int = None) -> Iterator[Union[DereferencedBlock, BaseException]]:
         return self._write_executor.get_completed(timeout=timeout)
 
-    def _read(self, block: DereferencedBlock, metadata_only: bool) -> Tuple[DereferencedBlock, Optional[bytes], Dict]:
+    def _read(self,
+              block: DereferencedBlock,
+              metadata_only: bool,
+              read_cache_mode: ReadCacheMode = ReadCacheMode.read_through
+             ) -> Tuple[DereferencedBlock, Optional[bytes], Dict]:
         key = block.uid.storage_object_to_path()
         metadata_key = key + self._META_SUFFIX
-        data: Optional[bytes] = None
-        try:
-            t1 = time.time()
+
+        def read_objects() -> Tuple[Optional[bytes], int, bytes]:
+            data: Optional[bytes] = None
             if not metadata_only:
                 data = self._read_object(key)
                 data_length = len(data)
             else:
                 data_length = self._read_object_length(key)
             metadata_json = self._read_object(metadata_key)
+            return data, data_length, metadata_json
+
+        try:
+            t1 = time.time()
+            if self._read_hedger is not None:
+                data, data_length, metadata_json = self._read_hedger.call(read_objects)
+            else:
+                data, data_length, metadata_json = read_objects()
             time.sleep(self.read_throttling.consume(len(data) if data else 0 + len(metadata_json)))
             t2 = time.time()
         except FileNotFoundError as exception:
@@ -250,6 +441,18 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
                 'Object metadata or data of block {} (UID{}) not found.'.format(block.idx, block.uid),
                 block) from exception
 
+        logger.debug('{} read data of uid {} in {:.3f}s{}'.format(threading.current_thread().name, block.uid, t2 - t1,
+                                                                  ' (metadata only)' if metadata_only else ''))
+
+        return self._read_finish(block,
+                                 key=key,
+                                 data=data,
+                                 data_length=data_length,
+                                 metadata_json=metadata_json,
+                                 metadata_only=metadata_only)
+
+    def _read_finish(self, block: DereferencedBlock, *, key: str, data: Optional[bytes], data_length: int,
+                     metadata_json: bytes, metadata_only: bool) -> Tuple[DereferencedBlock, Optional[bytes], Dict]:
         try:
             metadata = self._decode_metadata(metadata_json=metadata_json, key=key, data_length=data_length)
         except (KeyError, ValueError) as exception:
@@ -262,26 +465,122 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
                     self._CHECKSUM_KEY, block.idx, block.uid), block)
 
         if not metadata_only and self._TRANSFORMS_KEY in metadata:
-            data = self._decapsulate(data, metadata[self._TRANSFORMS_KEY])  # type: ignore
-
-        logger.debug('{} read data of uid {} in {:.3f}s{}'.format(threading.current_thread().name, block.uid, t2 - t1,
-                                                                  ' (metadata only)' if metadata_only else ''))
+            try:
+                data = self._decapsulate(data, metadata[self._TRANSFORMS_KEY])  # type: ignore
+            except (KeyError, ValueError) as exception:
+                raise InvalidBlockException(
+                    'Object data of block {} (UID {}) could not be decapsulated.'.format(block.idx, block.uid),
+                    block) from exception
 
         return block, data, metadata
 
-    def read_block_async(self, block: Block, metadata_only: bool = False) -> None:
+    def _verify(self, block: DereferencedBlock) -> Tuple[DereferencedBlock, Optional[bytes], Dict]:
+        key = block.uid.storage_object_to_path()
+        metadata_key = key + self._META_SUFFIX
+        try:
+            t1 = time.time()
+            data_length, object_checksum = self._read_object_length_and_checksum(key)
+            metadata_json = self._read_object(metadata_key)
+            time.sleep(self.read_throttling.consume(len(metadata_json)))
+            t2 = time.time()
+        except FileNotFoundError as exception:
+            raise InvalidBlockException(
+                'Object metadata or data of block {} (UID{}) not found.'.format(block.idx, block.uid),
+                block) from exception
+
+        logger.debug('{} verified data of uid {} in {:.3f}s'.format(threading.current_thread().name, block.uid,
+                                                                   t2 - t1))
+
+        block, _, metadata = self._read_finish(block,
+                                               key=key,
+                                               data=None,
+                                               data_length=data_length,
+                                               metadata_json=metadata_json,
+                                               metadata_only=True)
+        self._verify_object_checksum(block, key=key, metadata=metadata, object_checksum=object_checksum)
+        return block, None, metadata
+
+    def _verify_object_checksum(self, block: DereferencedBlock, *, key: str, metadata: Dict,
+                                object_checksum: Optional[str]) -> None:
+        recorded_object_checksum = metadata.get(self._OBJECT_CHECKSUM_KEY, None)
+        if recorded_object_checksum is None or object_checksum is None:
+            logger.debug('No object checksum available for block {} (UID {}), only checking metadata.'.format(
+                block.idx, block.uid))
+            return
+        if recorded_object_checksum['algorithm'] != self._OBJECT_CHECKSUM_ALGORITHM:
+            logger.debug('Object checksum of block {} (UID {}) uses a different algorithm ({}), '
+                         'only checking metadata.'.format(block.idx, block.uid, recorded_object_checksum['algorithm']))
+            return
+        if recorded_object_checksum['value'] != object_checksum:
+            raise InvalidBlockException(
+                'Object checksum mismatch for block {} (UID {}). Expected: {}, got: {}.'.format(
+                    block.idx, block.uid, recorded_object_checksum['value'], object_checksum), block)
+
+    # Checks the existence of the block and its metadata and compares the content checksum reported by the storage
+    # with the one recorded at write time. The results are returned via read_get_completed().
+    def verify_block_async(self, block: Block) -> None:
+        block_deref = block.deref()
+
+        def job():
+            return self._verify(block_deref)
+
+        self._read_executor.submit(job)
+
+    def read_block_async(self,
+                         block: Block,
+                         metadata_only: bool = False,
+                         read_cache_mode: ReadCacheMode = ReadCacheMode.read_through) -> None:
         # We do need to dereference the block outside of the closure otherwise a reference to the block will be held
         # inside of the closure leading to database troubles.
         # See https://github.com/elemental-lf/benji/issues/61.
         block_deref = block.deref()
 
         def job():
-            return self._read(block_deref, metadata_only)
+            return self._read(block_deref, metadata_only, read_cache_mode)
 
         self._read_executor.submit(job)
 
-    def read_block(self, block: Block, metadata_only: bool = False) -> Optional[bytes]:
-        return self._read(block.deref(), metadata_only)[1]
+    def read_block(self,
+                   block: Block,
+                   metadata_only: bool = False,
+                   read_cache_mode: ReadCacheMode = ReadCacheMode.read_through) -> Optional[bytes]:
+        return self._read(block.deref(), metadata_only, read_cache_mode)[1]
+
+    # Returns the data of a block as stored (i.e. still encapsulated) together with the transforms needed to
+    # decapsulate it. The read cache is bypassed.
+    def read_block_raw(self, block: Union[DereferencedBlock, Block]) -> Tuple[bytes, List[Dict]]:
+        block_deref = block.deref()
+        key = block_deref.uid.storage_object_to_path()
+        metadata_key = key + self._META_SUFFIX
+        try:
+            data = self._read_object(key)
+            metadata_json = self._read_object(metadata_key)
+        except FileNotFoundError as exception:
+            raise InvalidBlockException(
+                'Object metadata or data of block {} (UID{}) not found.'.format(block_deref.idx, block_deref.uid),
+                block_deref) from exception
+        time.sleep(self.read_throttling.consume(len(data) + len(metadata_json)))
+
+        _, _, metadata = self._read_finish(block_deref,
+                                           key=key,
+                                           data=None,
+                                           data_length=len(data),
+                                           metadata_json=metadata_json,
+                                           metadata_only=True)
+        try:
+            self.check_block_metadata(block=block_deref, data_length=None, metadata=metadata)
+        except ValueError as exception:
+            raise InvalidBlockException(str(exception), block_deref) from exception
+
+        return data, metadata.get(self._TRANSFORMS_KEY, [])
+
+    def block_exists(self, uid: BlockUid) -> bool:
+        # The metadata object is written after the data object
+        try:
+            self._read_object_length(uid.storage_object_to_path() + self._META_SUFFIX)
+        except FileNotFoundError:
+            return False
+        return True
 
     def read_get_completed(self,
                            timeout: int = None) -> Iterator[Union[Tuple[DereferencedBlock, bytes, Dict], BaseException]]:
@@ -309,14 +608,9 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
         key = uid.storage_object_to_path()
         metadata_key = key + self._META_SUFFIX
         try:
-            self._rm_object(key)
+            self._rm_objects_accounted(key, metadata_key)
         except FileNotFoundError as exception:
             raise BlockNotFoundError('Block UID {} not found on storage.'.format(uid), uid) from exception
-        finally:
-            try:
-                self._rm_object(metadata_key)
-            except FileNotFoundError:
-                pass
         return uid
 
     def rm_block_async(self, uid: BlockUid) -> None:
@@ -343,8 +637,44 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
     #     self._rm_many_objects(metadata_keys)
     #     return [cast(BlockUid, BlockUid.storage_path_to_object(error)) for error in errors]
 
+    def _list_objects_sharded(self, prefix: str,
+                              include_size: bool = False) -> Union[Iterable[str], Iterable[Tuple[str, int]]]:
+        if self._simultaneous_listings == 1:
+            yield from self._list_objects(prefix, include_size=include_size)
+            return
+
+        # Object keys are spread over 256 (or 65536) sub-prefixes by StorageKeyMixIn._to_path, so we can list them
+        # in parallel. Objects which don't follow this pattern are not listed.
+        if self._listing_shard_levels == 1:
+            shard_prefixes = ['{}{:02x}/'.format(prefix, i) for i in range(256)]
+        else:
+            shard_prefixes = ['{}{:02x}/{:02x}/'.format(prefix, i, j) for i in range(256) for j in range(256)]
+
+        def job(shard_prefix: str) -> List:
+            return list(self._list_objects(shard_prefix, include_size=include_size))
+
+        # We don't use a JobExecutor here as it isn't suited for this many jobs. Instead only a limited number of
+        # listings are kept in flight which also limits the number of outstanding results.
+        shard_prefixes_iter = iter(shard_prefixes)
+        with ThreadPoolExecutor(max_workers=self._simultaneous_listings, thread_name_prefix='Storage-List') as executor:
+            futures = {
+                executor.submit(job, shard_prefix)
+                for shard_prefix in itertools.islice(shard_prefixes_iter, 2 * self._simultaneous_listings)
+            }
+            try:
+                while futures:
+                    done, futures = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        shard_prefix = next(shard_prefixes_iter, None)
+                        if shard_prefix is not None:
+                            futures.add(executor.submit(job, shard_prefix))
+                        yield from future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
     def list_blocks(self) -> Iterable[BlockUid]:
-        keys = self._list_objects(BlockUid.storage_prefix())
+        keys = self._list_objects_sharded(BlockUid.storage_prefix())
         for key in keys:
             assert isinstance(key, str)
             if key.endswith(self._META_SUFFIX):
@@ -355,8 +685,75 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
                 # Ignore any keys which don't match our pattern to account for stray objects/files
                 pass
 
+    # Returns all block UIDs found on the storage in ascending order together with flags denoting the presence of the
+    # data and the metadata object. As the object keys are ordered by a hash prefix, the listing is sorted in chunks
+    # which are spilled to temporary files and merged afterwards. This keeps the memory usage bounded. The listing
+    # itself is completed before this method returns.
+    def list_blocks_sorted(self) -> Iterator[Tuple[BlockUid, bool, bool]]:
+        chunk: List[Tuple[int, int, int]] = []
+        chunk_files = []
+
+        def spill_chunk() -> None:
+            chunk.sort()
+            chunk_file = tempfile.TemporaryFile()
+            for entry in chunk:
+                chunk_file.write(self._SORTED_LISTING_RECORD.pack(*entry))
+            chunk_file.seek(0)
+            chunk_files.append(chunk_file)
+            chunk.clear()
+
+        try:
+            for key in self._list_objects_sharded(BlockUid.storage_prefix()):
+                assert isinstance(key, str)
+                if key.endswith(self._META_SUFFIX):
+                    key = key[:-len(self._META_SUFFIX)]
+                    kind = self._SORTED_LISTING_METADATA
+                else:
+                    kind = self._SORTED_LISTING_DATA
+                try:
+                    uid = BlockUid.storage_path_to_object(key)
+                except (RuntimeError, ValueError):
+                    # Ignore any keys which don't match our pattern to account for stray objects/files
+                    continue
+                chunk.append((uid.left, uid.right, kind))
+                if len(chunk) == self._SORTED_LISTING_CHUNK_SIZE:
+                    spill_chunk()
+            if chunk_files and chunk:
+                spill_chunk()
+        except:
+            for chunk_file in chunk_files:
+                chunk_file.close()
+            raise
+
+        def read_chunk_file(chunk_file) -> Iterator[Tuple[int, int, int]]:
+            record_size = self._SORTED_LISTING_RECORD.size
+            while True:
+                buffer = chunk_file.read(record_size * 4096)
+                if not buffer:
+                    break
+                yield from self._SORTED_LISTING_RECORD.iter_unpack(buffer)
+
+        def merge() -> Iterator[Tuple[BlockUid, bool, bool]]:
+            try:
+                if chunk_files:
+                    entries = heapq.merge(*[read_chunk_file(chunk_file) for chunk_file in chunk_files])
+                else:
+                    chunk.sort()
+                    entries = iter(chunk)
+                for (left, right), group in itertools.groupby(entries, key=lambda entry: (entry[0], entry[1])):
+                    kinds = 0
+                    for entry in group:
+                        kinds |= entry[2]
+                    yield BlockUid(left, right), bool(kinds & self._SORTED_LISTING_DATA), bool(
+                        kinds & self._SORTED_LISTING_METADATA)
+            finally:
+                for chunk_file in chunk_files:
+                    chunk_file.close()
+
+        return merge()
+
     def list_versions(self) -> Iterable[VersionUid]:
-        keys = self._list_objects(VersionUid.storage_prefix())
+        keys = self._list_objects_sharded(VersionUid.storage_prefix())
         for key in keys:
             assert isinstance(key, str)
             if key.endswith(self._META_SUFFIX):
@@ -376,7 +773,11 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
         metadata = self._decode_metadata(metadata_json=metadata_json, key=key, data_length=len(data))
 
         if self._TRANSFORMS_KEY in metadata:
-            data = self._decapsulate(data, metadata[self._TRANSFORMS_KEY])
+            try:
+                data = self._decapsulate(data, metadata[self._TRANSFORMS_KEY])
+            except (KeyError, ValueError) as exception:
+                raise ValueError('Object data of version {} could not be decapsulated.'.format(
+                    version_uid)) from exception
 
         if len(data) != metadata[self._SIZE_KEY]:
             raise ValueError('Length mismatch of original data for object {}. Expected: {}, got: {}.'.format(
@@ -395,6 +796,13 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
                 pass
             else:
                 raise FileExistsError('Version {} already exists in storage.'.format(version_uid))
+        else:
+            # Account for the objects which are going to be overwritten
+            for existing_key in (key, metadata_key):
+                try:
+                    self._account_usage(-1, -self._read_object_length(existing_key))
+                except FileNotFoundError:
+                    pass
 
         data_bytes = data.encode('utf-8')
         size = len(data_bytes)
@@ -405,8 +813,7 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
                                                        transforms_metadata=transforms_metadata)
 
         try:
-            self._write_object(key, data_bytes)
-            self._write_object(metadata_key, metadata_json)
+            checksums_verified = self._write_objects(key, data_bytes, metadata_key, metadata_json)
         except:
             try:
                 self._rm_object(key)
@@ -414,30 +821,43 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
             except FileNotFoundError:
                 pass
             raise
+        self._account_usage(2, len(data_bytes) + len(metadata_json))
 
-        if self._consistency_check_writes:
+        if self._read_back_needed(checksums_verified):
             self._check_write(key=key, metadata_key=metadata_key, data_expected=data_bytes)
 
     def rm_version(self, version_uid: VersionUid) -> None:
         key = version_uid.storage_object_to_path()
         metadata_key = key + self._META_SUFFIX
-        try:
-            self._rm_object(key)
-        finally:
-            try:
-                self._rm_object(metadata_key)
-            except FileNotFoundError:
-                pass
+        self._rm_objects_accounted(key, metadata_key)
 
     def storage_stats(self) -> Tuple[int, int]:
         objects_count = 0
         objects_size = 0
-        for key, size in cast(Iterable[Tuple[str, int]], self._list_objects(include_size=True)):
+        if self._simultaneous_listings == 1:
+            objects = self._list_objects(include_size=True)
+        else:
+            objects = itertools.chain(self._list_objects_sharded(BlockUid.storage_prefix(), include_size=True),
+                                      self._list_objects_sharded(VersionUid.storage_prefix(), include_size=True))
+        for key, size in cast(Iterable[Tuple[str, int]], objects):
             objects_count += 1
             objects_size += size
         return objects_count, objects_size
 
-    def _encapsulate(self, data: bytes) -> Tuple[bytes, List]:
+    @property
+    def active_transforms(self) -> List[str]:
+        return [transform.name for transform in self._active_transforms]
+
+    def transforms_stats(self) -> Dict[str, Dict[str, int]]:
+        return {transform.name: transform.stats() for transform in self._active_transforms}
+
+    # Checks if data encapsulated with the given transforms could have been written by this storage. Transforms are
+    # optional per object (e.g. compression is skipped for incompressible data), but their order must match.
+    def transforms_compatible(self, transforms_metadata: Sequence[Dict]) -> bool:
+        active_transforms = iter([(transform.name, transform.module) for transform in self._active_transforms])
+        return all((element['name'], element['module']) in active_transforms for element in transforms_metadata)
+
+    def _encapsulate(self, data: BytesLike) -> Tuple[BytesLike, List]:
         if self._active_transforms is not None:
             transforms_metadata = []
             for transform in self._active_transforms:
@@ -453,8 +873,16 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
         else:
             return data, []
 
-    def _decapsulate(self, data: bytes, transforms_metadata: Sequence[Dict]) -> bytes:
-        for element in reversed(transforms_metadata):
+    def _decapsulate_buffer(self, size: int) -> bytearray:
+        buffer = getattr(self._decapsulate_buffers, 'buffer', None)
+        if buffer is None or len(buffer) < size:
+            buffer = bytearray(size)
+            self._decapsulate_buffers.buffer = buffer
+        return buffer
+
+    def _decapsulate(self, data: BytesLike, transforms_metadata: Sequence[Dict]) -> BytesLike:
+        data_in_buffer = False
+        for index, element in enumerate(reversed(transforms_metadata)):
             name = element['name']
             module = element['module']
             transform = TransformFactory.get_by_name(name)
@@ -463,7 +891,19 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
                     raise ConfigurationError('Mismatch between object transform module and configured module for ' +
                                              '{} ({} != {})'.format(name, module, transform.module))
 
+                # Intermediate results are only consumed by the next transform, so they can be written to a
+                # buffer which is reused for each block. The final result needs its own buffer.
+                if index < len(transforms_metadata) - 1 and not data_in_buffer:
+                    data_decapsulated = transform.decapsulate_into(data=data,
+                                                                   materials=element['materials'],
+                                                                   output=self._decapsulate_buffer(len(data)))
+                    if data_decapsulated is not None:
+                        data = data_decapsulated
+                        data_in_buffer = True
+                        continue
+
                 data = transform.decapsulate(data=data, materials=element['materials'])
+                data_in_buffer = False
             else:
                 raise IOError('Unknown transform {} in object metadata.'.format(name))
         return data
@@ -471,18 +911,31 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
     def wait_writes_finished(self) -> None:
         self._write_executor.wait_for_all()
 
-    def use_read_cache(self, enable: bool) -> bool:
-        return False
+    def read_cache_stats(self) -> Dict[str, Dict[str, int]]:
+        return {}
 
     def close(self) -> None:
         self._read_executor.shutdown()
         self._write_executor.shutdown()
         self._remove_executor.shutdown()
+        if self._read_hedger is not None:
+            stats = self._read_hedger.stats()
+            logger.debug('Hedged read statistics: {} reads, {} hedged, {} won by the hedged request, {} not hedged '
+                         'due to the rate limit.'.format(stats['requests'], stats['hedged'], stats['hedge_wins'],
+                                                         stats['budget_exhausted']))
+            self._read_hedger.shutdown()
 
     @abstractmethod
     def _write_object(self, key: str, data: bytes):
         raise NotImplementedError
 
+    # Writes the object and returns True if the integrity of the written data has been verified by a checksum.
+    # Storages supporting this need to override this method, otherwise the objects are read back. checksum is the
+    # checksum of data in the format of _OBJECT_CHECKSUM_ALGORITHM if it is already known.
+    def _write_object_checksummed(self, key: str, data: bytes, checksum: Optional[str] = None) -> bool:
+        self._write_object(key, data)
+        return False
+
     @abstractmethod
     def _read_object(self, key: str) -> bytes:
         raise NotImplementedError
@@ -491,8 +944,14 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
     def _read_object_length(self, key: str) -> int:
         raise NotImplementedError
 
+    # Returns the length of the object and its content checksum as reported by the storage (in the format of
+    # _OBJECT_CHECKSUM_ALGORITHM) or None when the storage doesn't report one.
+    def _read_object_length_and_checksum(self, key: str) -> Tuple[int, Optional[str]]:
+        return self._read_object_length(key), None
+
+    # Returns the size of the removed object if it is known
     @abstractmethod
-    def _rm_object(self, key: str) -> None:
+    def _rm_object(self, key: str) -> Optional[int]:
         raise NotImplementedError
 
     @abstractmethod
@@ -503,11 +962,23 @@ class StorageBase(ReprMixIn, metaclass=ABCMeta):
 
 class ReadCacheStorageBase(StorageBase):
 
+    # Subdirectory of the disk based read cache holding the statistics of all processes which used the cache
+    _READ_CACHE_STATS_DIRECTORY = 'stats'
+    _READ_CACHE_STATS_COUNTERS = ('hits', 'misses', 'rejections')
+
     def __init__(self, *, config: Config, name: str, module_configuration: ConfigDict) -> None:
         read_cache_directory = Config.get_from_dict(module_configuration, 'readCache.directory', None, types=str)
         read_cache_maximum_size = Config.get_from_dict(module_configuration, 'readCache.maximumSize', None, types=int)
         read_cache_shards = Config.get_from_dict(module_configuration, 'readCache.shards', None, types=int)
+        read_cache_memory_maximum_size = Config.get_from_dict(module_configuration,
+                                                              'readCache.memoryMaximumSize',
+                                                              None,
+                                                              types=int)
+        read_cache_admission = Config.get_from_dict(module_configuration, 'readCache.admission', 'always', types=str)
 
+        self._read_cache_admission = ReadCacheAdmission(read_cache_admission)
+
+        self._read_cache_stats_store: Optional[Cache] = None
         if read_cache_directory and read_cache_maximum_size:
             os.makedirs(read_cache_directory, exist_ok=True)
             try:
@@ -518,50 +989,184 @@ class ReadCacheStorageBase(StorageBase):
                     eviction_policy='least-frequently-used',
                     statistics=1,
                 )
+                # The counters must never be evicted
+                self._read_cache_stats_store = Cache(os.path.join(read_cache_directory,
+                                                                  self._READ_CACHE_STATS_DIRECTORY),
+                                                     eviction_policy='none')
             except Exception:
                 logger.warning('Unable to enable disk based read caching. Continuing without it.')
                 self._read_cache = None
+                self._read_cache_stats_store = None
             else:
                 logger.debug('Disk based read caching instantiated (cache size {}, shards {}).'.format(
                     read_cache_maximum_size, read_cache_shards))
         else:
             self._read_cache = None
-        self._use_read_cache = True
+
+        if read_cache_memory_maximum_size:
+            self._memory_read_cache: Optional[MemoryReadCache] = MemoryReadCache(
+                read_cache_memory_maximum_size, admit=self._read_cache_admission.admit_memory)
+            logger.debug(
+                'Memory based read caching instantiated (cache size {}).'.format(read_cache_memory_maximum_size))
+        else:
+            self._memory_read_cache = None
+
+        self._read_cache_stats_lock = threading.Lock()
+        self._read_cache_disk_hits = 0
+        self._read_cache_disk_misses = 0
+        self._read_cache_disk_rejections = 0
 
         # Start reader and write threads after the disk cached is created, so that they see it.
         super().__init__(config=config, name=name, module_configuration=module_configuration)
 
-    def _read(self, block: DereferencedBlock, metadata_only: bool) -> Tuple[DereferencedBlock, Optional[bytes], Dict]:
+    def _read_cache_disk_lookup(self, key: str, metadata_key: str,
+                                metadata_only: bool) -> Optional[Tuple[Optional[bytes], Dict]]:
+        assert self._read_cache is not None
+        metadata = self._read_cache.get(metadata_key)
+        data = None
+        if metadata and not metadata_only:
+            data = self._read_cache.get(key)
+        hit = bool(metadata) and (metadata_only or bool(data))
+        with self._read_cache_stats_lock:
+            if hit:
+                self._read_cache_disk_hits += 1
+            else:
+                self._read_cache_disk_misses += 1
+        return (data, metadata) if hit else None
+
+    def _read_cache_lookup(self, block: DereferencedBlock, metadata_only: bool,
+                           read_cache_mode: ReadCacheMode) -> Optional[Tuple[DereferencedBlock, Optional[bytes], Dict]]:
+        if read_cache_mode == ReadCacheMode.bypass:
+            return None
+
         key = block.uid.storage_object_to_path()
         metadata_key = key + self._META_SUFFIX
-        if self._read_cache is not None and self._use_read_cache:
-            metadata = self._read_cache.get(metadata_key)
-            if metadata and metadata_only:
-                return block, None, metadata
-            elif metadata:
-                data = self._read_cache.get(key)
-                if data:
-                    return block, data, metadata
+        # Every access counts, even if it is a miss or the result isn't stored
+        self._read_cache_admission.record(key)
+        if not read_cache_mode.lookup:
+            return None
 
-        block, data, metadata = super()._read(block, metadata_only)
+        if self._memory_read_cache is not None:
+            cached = self._memory_read_cache.get(key, metadata_only)
+            if cached is not None:
+                data, metadata = cached
+                return block, None if metadata_only else data, metadata
 
-        # We always put blocks into the cache even when self._use_read_cache is False
         if self._read_cache is not None:
+            cached = self._read_cache_disk_lookup(key, metadata_key, metadata_only)
+            if cached is not None:
+                data, metadata = cached
+                # Promote to the memory tier
+                if self._memory_read_cache is not None:
+                    self._memory_read_cache.set(key, data, metadata)
+                return block, data, metadata
+
+        return None
+
+    def _read_cache_store(self, block: DereferencedBlock, data: Optional[bytes], metadata: Dict, metadata_only: bool,
+                          read_cache_mode: ReadCacheMode) -> None:
+        if not read_cache_mode.store:
+            return
+
+        key = block.uid.storage_object_to_path()
+        if self._memory_read_cache is not None:
+            self._memory_read_cache.set(key, None if metadata_only else data, metadata)
+        if self._read_cache is not None:
+            if not self._read_cache_admission.admit_disk(key):
+                with self._read_cache_stats_lock:
+                    self._read_cache_disk_rejections += 1
+                return
+            metadata_key = key + self._META_SUFFIX
             self._read_cache.set(metadata_key, metadata)
             if not metadata_only:
                 self._read_cache.set(key, data)
 
+    def _read_cache_invalidate(self, uid: BlockUid) -> None:
+        key = uid.storage_object_to_path()
+        if self._memory_read_cache is not None:
+            self._memory_read_cache.delete(key)
+        if self._read_cache is not None:
+            self._read_cache.delete(key + self._META_SUFFIX)
+            self._read_cache.delete(key)
+
+    def _read(self,
+              block: DereferencedBlock,
+              metadata_only: bool,
+              read_cache_mode: ReadCacheMode = ReadCacheMode.read_through
+             ) -> Tuple[DereferencedBlock, Optional[bytes], Dict]:
+        cached = self._read_cache_lookup(block, metadata_only, read_cache_mode)
+        if cached is not None:
+            return cached
+
+        block, data, metadata = super()._read(block, metadata_only)
+        self._read_cache_store(block, data, metadata, metadata_only, read_cache_mode)
+
         return block, data, metadata
 
-    def use_read_cache(self, enable: bool) -> bool:
-        old_value = self._use_read_cache
-        self._use_read_cache = enable
-        return old_value
+    def _rm_block(self, uid: BlockUid) -> BlockUid:
+        self._read_cache_invalidate(uid)
+        return super()._rm_block(uid)
+
+    # Returns the hits, misses and rejections of each tier caused by this process
+    def _read_cache_counters(self) -> Dict[str, Dict[str, int]]:
+        counters = {}
+        if self._memory_read_cache is not None:
+            hits, misses = self._memory_read_cache.stats()
+            counters['memory'] = {'hits': hits, 'misses': misses, 'rejections': self._memory_read_cache.rejections}
+        if self._read_cache is not None:
+            with self._read_cache_stats_lock:
+                counters['disk'] = {
+                    'hits': self._read_cache_disk_hits,
+                    'misses': self._read_cache_disk_misses,
+                    'rejections': self._read_cache_disk_rejections,
+                }
+        return counters
+
+    # The counters of all processes which used the same disk based read cache are accumulated, so that they are
+    # available to other processes like the REST API. Without a disk based read cache only the counters of this
+    # process are reported.
+    def read_cache_stats(self) -> Dict[str, Dict[str, int]]:
+        stats = self._read_cache_counters()
+        if self._read_cache_stats_store is not None:
+            for tier, tier_stats in stats.items():
+                for counter in self._READ_CACHE_STATS_COUNTERS:
+                    tier_stats[counter] += self._read_cache_stats_store.get('{}.{}'.format(tier, counter), 0)
+        if self._memory_read_cache is not None:
+            stats['memory'].update({
+                'objects_count': len(self._memory_read_cache),
+                'objects_size': self._memory_read_cache.size,
+            })
+        if self._read_cache is not None:
+            hits_total, misses_total = self._read_cache.stats()
+            stats['disk'].update({
+                # These count data and metadata objects separately and are kept since the creation of the cache
+                'hits_total': hits_total,
+                'misses_total': misses_total,
+                'objects_count': len(self._read_cache),
+                'objects_size': self._read_cache.volume(),
+            })
+        return stats
 
     def close(self) -> None:
         super().close()
+        counters = self._read_cache_counters()
+        if self._read_cache_stats_store is not None:
+            for tier, tier_counters in counters.items():
+                for counter, value in tier_counters.items():
+                    if value:
+                        # incr() is atomic, other processes might be updating the counters at the same time
+                        self._read_cache_stats_store.incr('{}.{}'.format(tier, counter), value)
+            self._read_cache_stats_store.close()
+        for tier, tier_stats in counters.items():
+            lookups = tier_stats['hits'] + tier_stats['misses']
+            hit_ratio = tier_stats['hits'] / lookups * 100 if lookups > 0 else 0
+            logger.debug('Read cache statistics for {} tier: {} hits, {} misses, hit ratio {:.1f}%, '
+                         '{} rejected.'.format(tier, tier_stats['hits'], tier_stats['misses'], hit_ratio,
+                                               tier_stats['rejections']))
         if self._read_cache is not None:
             (cache_hits, cache_misses) = self._read_cache.stats()
             logger.debug('Disk based cache statistics (since cache creation): {} hits, {} misses.'.format(
                 cache_hits, cache_misses))
             self._read_cache.close()
+        if self._memory_read_cache is not None:
+            self._memory_read_cache.clear()
@@ -1,19 +1,157 @@
 #!/usr/bin/env python
 # -*- encoding: utf-8 -*-
 
+import ctypes
+import ctypes.util
+import hashlib
 import os
+import threading
+import uuid
 from os.path import getsize
-from typing import Union, Iterable, Tuple
+from typing import Union, Iterable, Tuple, List, Optional, Set
 
 from benji.config import Config, ConfigDict
+from benji.exception import ConfigurationError
+from benji.logging import logger
 from benji.storage.base import StorageBase
 
+_TEMPORARY_SUFFIX = '.tmp'
+
+
+class _StagedObject:
+
+    def __init__(self, *, filename: str, temporary_filename: str, fd: Optional[int]) -> None:
+        self.filename = filename
+        self.temporary_filename = temporary_filename
+        self.fd = fd
+        self.committed = False
+        self.exception: Optional[BaseException] = None
+
+    def discard(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        os.unlink(self.temporary_filename)
+
+
+class _GroupCommitter:
+
+    # Objects are written to temporary files without syncing them individually. The first writer which finds no
+    # commit in progress becomes the leader and commits all objects staged up to this point: The data is synced,
+    # the temporary files are renamed into place and the renames are made durable by syncing the directories.
+    # Writers arriving during a commit are collected into the next batch. All writers block until the batch
+    # containing their objects has been committed. A writer can hand in several objects (the data and metadata
+    # objects of a block), these always end up in the same batch.
+    def __init__(self, *, path: str, method: str) -> None:
+        self._path = path
+        self._method = method
+        self._condition = threading.Condition()
+        self._pending: List[_StagedObject] = []
+        self._committing = False
+
+        if method == 'syncfs':
+            libc_name = ctypes.util.find_library('c')
+            libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+            if libc is None or not hasattr(libc, 'syncfs'):
+                raise ConfigurationError('Group commit method syncfs is not supported on this platform.')
+            self._syncfs_function = libc.syncfs
+
+    def _syncfs(self) -> None:
+        fd = os.open(self._path, os.O_RDONLY)
+        try:
+            if self._syncfs_function(fd) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno), self._path)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _fsync_directory(directory: str) -> None:
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _commit_batch(self, batch: List[_StagedObject]) -> None:
+        try:
+            if self._method == 'syncfs':
+                self._syncfs()
+            else:
+                for staged in batch:
+                    os.fdatasync(staged.fd)
+        except BaseException as exception:
+            for staged in batch:
+                staged.exception = exception
+        finally:
+            for staged in batch:
+                if staged.fd is not None:
+                    os.close(staged.fd)
+                    staged.fd = None
+
+        directories: Set[str] = set()
+        for staged in batch:
+            if staged.exception is None:
+                try:
+                    os.rename(staged.temporary_filename, staged.filename)
+                except BaseException as exception:
+                    staged.exception = exception
+                else:
+                    directories.add(os.path.dirname(staged.filename))
+                    continue
+            try:
+                os.unlink(staged.temporary_filename)
+            except OSError:
+                pass
+
+        try:
+            if self._method == 'syncfs':
+                if directories:
+                    self._syncfs()
+            else:
+                for directory in directories:
+                    self._fsync_directory(directory)
+        except BaseException as exception:
+            for staged in batch:
+                if staged.exception is None:
+                    staged.exception = exception
+
+        logger.debug('Group commit of {} objects finished.'.format(len(batch)))
+
+    def commit(self, staged_objects: List[_StagedObject]) -> None:
+        staged = staged_objects[-1]
+        with self._condition:
+            self._pending.extend(staged_objects)
+            while not staged.committed and self._committing:
+                self._condition.wait()
+            if staged.committed:
+                batch = None
+            else:
+                self._committing = True
+                batch, self._pending = self._pending, []
+
+        if batch is not None:
+            try:
+                self._commit_batch(batch)
+            finally:
+                with self._condition:
+                    for committed_staged in batch:
+                        committed_staged.committed = True
+                    self._committing = False
+                    self._condition.notify_all()
+
+        for staged in staged_objects:
+            if staged.exception is not None:
+                raise staged.exception
+
 
 class Storage(StorageBase):
 
     WRITE_QUEUE_LENGTH = 10
     READ_QUEUE_LENGTH = 20
 
+    _OBJECT_CHECKSUM_ALGORITHM = 'sha256'
+
     def __init__(self, *, config: Config, name: str, module_configuration: ConfigDict):
         super().__init__(config=config, name=name, module_configuration=module_configuration)
 
@@ -26,9 +164,38 @@ class Storage(StorageBase):
         if not self.path.endswith(os.path.sep):
             self.path = os.path.join(self.path, '')
 
+        self._group_committer: Optional[_GroupCommitter] = None
+        if Config.get_from_dict(module_configuration, 'groupCommit', types=bool):
+            group_commit_method = Config.get_from_dict(module_configuration, 'groupCommitMethod', types=str)
+            os.makedirs(self.path, exist_ok=True)
+            self._group_committer = _GroupCommitter(path=self.path, method=group_commit_method)
+            logger.info('Enabling group commit ({}) for storage {}.'.format(group_commit_method, name))
+
+    @staticmethod
+    def _stage_object(filename: str, data: bytes) -> _StagedObject:
+        temporary_filename = '{}.{}{}'.format(filename, uuid.uuid4().hex, _TEMPORARY_SUFFIX)
+        try:
+            fd = os.open(temporary_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            fd = os.open(temporary_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            with open(fd, 'wb', buffering=0, closefd=False) as f:
+                f.write(data)
+        except:
+            os.close(fd)
+            os.unlink(temporary_filename)
+            raise
+
+        return _StagedObject(filename=filename, temporary_filename=temporary_filename, fd=fd)
+
     def _write_object(self, key: str, data: bytes) -> None:
         filename = os.path.join(self.path, key)
 
+        if self._group_committer is not None:
+            self._group_committer.commit([self._stage_object(filename, data)])
+            return
+
         try:
             with open(filename, 'wb', buffering=0) as f:
                 f.write(data)
@@ -39,6 +206,32 @@ class Storage(StorageBase):
                 f.write(data)
                 os.fdatasync(f.fileno())
 
+    # The data is synced to disk as part of the write. Reading it back would only return it from the page cache
+    # and wouldn't add any further assurance.
+    def _write_object_checksummed(self, key: str, data: bytes, checksum: Optional[str] = None) -> bool:
+        self._write_object(key, data)
+        return True
+
+    def _write_objects(self,
+                       key: str,
+                       data: bytes,
+                       metadata_key: str,
+                       metadata_json: bytes,
+                       data_checksum: Optional[str] = None) -> bool:
+        if self._group_committer is None:
+            return super()._write_objects(key, data, metadata_key, metadata_json, data_checksum)
+
+        # Both objects are committed together, so that a single sync round covers them
+        staged_data = self._stage_object(os.path.join(self.path, key), data)
+        try:
+            staged_metadata = self._stage_object(os.path.join(self.path, metadata_key), metadata_json)
+        except:
+            staged_data.discard()
+            raise
+        self._group_committer.commit([staged_data, staged_metadata])
+        # See _write_object_checksummed()
+        return self._consistency_check_writes and self._consistency_check_writes_method == 'checksum'
+
     def _read_object(self, key: str) -> bytes:
         filename = os.path.join(self.path, key)
 
@@ -58,12 +251,19 @@ class Storage(StorageBase):
 
         return os.path.getsize(filename)
 
-    def _rm_object(self, key: str) -> None:
+    # There is no content checksum maintained by the filesystem, so it is computed from the file
+    def _read_object_length_and_checksum(self, key: str) -> Tuple[int, Optional[str]]:
+        data = self._read_object(key)
+        return len(data), hashlib.sha256(data).hexdigest()
+
+    def _rm_object(self, key: str) -> Optional[int]:
         filename = os.path.join(self.path, key)
 
         if not os.path.exists(filename):
             raise FileNotFoundError('File {} not found.'.format(filename))
+        size = getsize(filename)
         os.unlink(filename)
+        return size
 
     # def _rm_many_objects(self, keys: Sequence[str]) -> List[str]:
     #     errors = []
@@ -78,6 +278,9 @@ class Storage(StorageBase):
                       include_size: bool = False) -> Union[Iterable[str], Iterable[Tuple[str, int]]]:
         for root, dirnames, filenames in os.walk(os.path.join(self.path, prefix) if prefix is not None else self.path):
             for filename in filenames:
+                # Skip objects which are still being written or which have been left behind by an interrupted write
+                if filename.endswith(_TEMPORARY_SUFFIX):
+                    continue
                 key = (os.path.join(root, filename))[len(self.path):]
                 if include_size:
                     try:
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+import asyncio
+import concurrent.futures
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Optional, Dict, Any, Deque, Awaitable
+
+
+class LatencyTracker:
+    """Keeps the latencies of the most recent requests and computes a percentile of them"""
+
+    _WINDOW = 1000
+    # The percentile is only recomputed after this number of new samples
+    _RECOMPUTE_INTERVAL = 100
+    _MINIMUM_SAMPLES = 50
+
+    def __init__(self, percentile: float) -> None:
+        self._percentile = percentile
+        self._samples: Deque[float] = deque(maxlen=self._WINDOW)
+        self._new_samples = 0
+        self._value: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+            self._new_samples += 1
+            if self._new_samples >= self._RECOMPUTE_INTERVAL or (self._value is None and
+                                                                  len(self._samples) >= self._MINIMUM_SAMPLES):
+                samples = sorted(self._samples)
+                index = min(math.ceil(len(samples) * self._percentile / 100) - 1, len(samples) - 1)
+                self._value = samples[max(index, 0)]
+                self._new_samples = 0
+
+    # Returns None as long as there are not enough samples
+    @property
+    def value(self) -> Optional[float]:
+        return self._value
+
+
+class HedgingBudget:
+    """Limits the hedged requests to a fraction of all requests
+
+    Each request adds maximum_rate tokens and each hedged request consumes one token. A small burst is allowed
+    so that hedging works right from the start.
+    """
+
+    _BURST = 10
+
+    def __init__(self, maximum_rate: float) -> None:
+        self._maximum_rate = maximum_rate
+        self._tokens = float(self._BURST) if maximum_rate > 0 else 0.0
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self._tokens + self._maximum_rate, self._BURST)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class ReadHedger:
+    """Runs requests and issues a duplicate when the first one takes too long
+
+    The duplicate is issued after a fixed delay or, when no delay is given, after the configured percentile of the
+    recent request latencies. The first successful response wins. The other request is left to complete in the
+    background and its result is discarded. call() runs the requests in threads, call_async() runs them as tasks
+    on the current event loop.
+    """
+
+    def __init__(self, *, name: str, workers: int, delay: Optional[float], percentile: float,
+                 maximum_rate: float) -> None:
+        self._delay = delay
+        self._latencies = LatencyTracker(percentile)
+        self._budget = HedgingBudget(maximum_rate)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._budget_exhausted = 0
+
+    def _submit(self, function: Callable[[], Any]) -> Future:
+
+        def timed():
+            t1 = time.monotonic()
+            result = function()
+            self._latencies.add(time.monotonic() - t1)
+            return result
+
+        return self._executor.submit(timed)
+
+    # Accounts for a new request and returns the delay after which it is hedged, None disables hedging
+    def _begin(self) -> Optional[float]:
+        with self._stats_lock:
+            self._requests += 1
+        self._budget.deposit()
+        return self._delay if self._delay is not None else self._latencies.value
+
+    def _may_hedge(self) -> bool:
+        hedge = self._budget.withdraw()
+        with self._stats_lock:
+            if hedge:
+                self._hedged += 1
+            else:
+                self._budget_exhausted += 1
+        return hedge
+
+    def _record_hedge_win(self) -> None:
+        with self._stats_lock:
+            self._hedge_wins += 1
+
+    def call(self, function: Callable[[], Any]) -> Any:
+        delay = self._begin()
+        primary = self._submit(function)
+        if delay is None:
+            return primary.result()
+        try:
+            return primary.result(timeout=delay)
+        except concurrent.futures.TimeoutError:
+            pass
+
+        if not self._may_hedge():
+            return primary.result()
+
+        hedge = self._submit(function)
+        done, _ = concurrent.futures.wait([primary, hedge], return_when=concurrent.futures.FIRST_COMPLETED)
+        winner = primary if primary in done else hedge
+        if winner.exception() is not None:
+            # Give the other request a chance to succeed
+            loser = hedge if winner is primary else primary
+            if loser.exception() is None:
+                winner = loser
+        if winner is hedge:
+            self._record_hedge_win()
+        return winner.result()
+
+    async def _timed_async(self, function: Callable[[], Awaitable]) -> Any:
+        t1 = time.monotonic()
+        result = await function()
+        self._latencies.add(time.monotonic() - t1)
+        return result
+
+    def _submit_async(self, function: Callable[[], Awaitable]) -> asyncio.Future:
+        task = asyncio.ensure_future(self._timed_async(function))
+        # The result of a request left to complete in the background is never retrieved otherwise, which would
+        # lead to warnings if it fails
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return task
+
+    async def call_async(self, function: Callable[[], Awaitable]) -> Any:
+        delay = self._begin()
+        primary = self._submit_async(function)
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        if not self._may_hedge():
+            return await primary
+
+        hedge = self._submit_async(function)
+        done, _ = await asyncio.wait([primary, hedge], return_when=asyncio.FIRST_COMPLETED)
+        winner = primary if primary in done else hedge
+        if winner.exception() is not None:
+            # Give the other request a chance to succeed
+            loser = hedge if winner is primary else primary
+            await asyncio.wait([loser])
+            if loser.exception() is None:
+                winner = loser
+        if winner is hedge:
+            self._record_hedge_win()
+        return winner.result()
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {
+                'requests': self._requests,
+                'hedged': self._hedged,
+                'hedge_wins': self._hedge_wins,
+                'budget_exhausted': self._budget_exhausted,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+import hashlib
+import os
+import threading
+import time
+from typing import Union, Iterable, Tuple, Optional, Dict
+
+import lmdb
+
+from benji.config import Config, ConfigDict
+from benji.database import DereferencedBlock
+from benji.logging import logger
+from benji.storage.base import StorageBase, InvalidBlockException
+from benji.storage.readcache import ReadCacheMode
+
+
+class Storage(StorageBase):
+
+    # Number of keys returned per read transaction when listing objects. Long running read transactions prevent
+    # LMDB from reusing freed pages, so the listing is split into several transactions.
+    _LIST_BATCH_SIZE = 1000
+
+    _OBJECT_CHECKSUM_ALGORITHM = 'sha256'
+
+    # All objects are stored as key-value pairs in a single memory mapped LMDB environment. This avoids the
+    # overhead of one file per object and makes listings a sorted cursor scan.
+    def __init__(self, *, config: Config, name: str, module_configuration: ConfigDict) -> None:
+        super().__init__(config=config, name=name, module_configuration=module_configuration)
+
+        path = Config.get_from_dict(module_configuration, 'path', types=str)
+        map_size = Config.get_from_dict(module_configuration, 'mapSize', types=int)
+        sync = Config.get_from_dict(module_configuration, 'sync', types=bool)
+        read_ahead = Config.get_from_dict(module_configuration, 'readAhead', types=bool)
+
+        os.makedirs(path, exist_ok=True)
+        # LMDB supports only one write transaction at a time, but readers can proceed in parallel with
+        # the writer. Allow enough readers for all read, write (consistency check) and listing threads.
+        max_readers = 2 * (Config.get_from_dict(module_configuration, 'simultaneousReads', types=int) +
+                           Config.get_from_dict(module_configuration, 'simultaneousWrites', types=int) +
+                           self._simultaneous_listings) + 16
+        self._env = lmdb.open(path,
+                              map_size=map_size,
+                              sync=sync,
+                              readahead=read_ahead,
+                              max_readers=max_readers,
+                              max_spare_txns=max_readers,
+                              lock=True)
+
+    def _write_object(self, key: str, data: bytes) -> None:
+        with self._env.begin(write=True) as txn:
+            txn.put(key.encode('utf-8'), data)
+
+    def _read_object(self, key: str) -> bytes:
+        with self._env.begin() as txn:
+            data = txn.get(key.encode('utf-8'))
+        if data is None:
+            raise FileNotFoundError('Key {} not found.'.format(key))
+        return data
+
+    def _read_object_length(self, key: str) -> int:
+        with self._env.begin(buffers=True) as txn:
+            data = txn.get(key.encode('utf-8'))
+            if data is None:
+                raise FileNotFoundError('Key {} not found.'.format(key))
+            return len(data)
+
+    def _read_object_length_and_checksum(self, key: str) -> Tuple[int, Optional[str]]:
+        with self._env.begin(buffers=True) as txn:
+            data = txn.get(key.encode('utf-8'))
+            if data is None:
+                raise FileNotFoundError('Key {} not found.'.format(key))
+            return len(data), hashlib.sha256(data).hexdigest()
+
+    def _rm_object(self, key: str) -> Optional[int]:
+        with self._env.begin(write=True) as txn:
+            data = txn.pop(key.encode('utf-8'))
+        if data is None:
+            raise FileNotFoundError('Key {} not found.'.format(key))
+        return len(data)
+
+    def _list_objects(self, prefix: str = None,
+                      include_size: bool = False) -> Union[Iterable[str], Iterable[Tuple[str, int]]]:
+        prefix_bytes = prefix.encode('utf-8') if prefix is not None else b''
+        start = prefix_bytes
+        skip_start = False
+        while True:
+            objects = []
+            with self._env.begin(buffers=True) as txn:
+                cursor = txn.cursor()
+                if not cursor.set_range(start):
+                    break
+                for key, value in cursor:
+                    key = bytes(key)
+                    if skip_start and key == start:
+                        continue
+                    if not key.startswith(prefix_bytes):
+                        break
+                    objects.append((key, len(value)))
+                    if len(objects) == self._LIST_BATCH_SIZE:
+                        break
+            for key, size in objects:
+                if include_size:
+                    yield key.decode('utf-8'), size
+                else:
+                    yield key.decode('utf-8')
+            if len(objects) < self._LIST_BATCH_SIZE:
+                break
+            start = objects[-1][0]
+            skip_start = True
+
+    def _read(self,
+              block: DereferencedBlock,
+              metadata_only: bool,
+              read_cache_mode: ReadCacheMode = ReadCacheMode.read_through
+             ) -> Tuple[DereferencedBlock, Optional[bytes], Dict]:
+        key = block.uid.storage_object_to_path()
+        metadata_key = key + self._META_SUFFIX
+        # The data is returned as a memoryview pointing directly into the memory map. It is only valid during the
+        # transaction, so the transforms are applied inside of it. Without transforms a copy has to be made.
+        with self._env.begin(buffers=True) as txn:
+            t1 = time.time()
+            data = txn.get(key.encode('utf-8'))
+            metadata_json = txn.get(metadata_key.encode('utf-8'))
+            if data is None or metadata_json is None:
+                raise InvalidBlockException(
+                    'Object metadata or data of block {} (UID{}) not found.'.format(block.idx, block.uid), block)
+            data_length = len(data)
+            metadata_json = bytes(metadata_json)
+            t2 = time.time()
+
+            logger.debug('{} read data of uid {} in {:.3f}s{}'.format(threading.current_thread().name, block.uid,
+                                                                      t2 - t1,
+                                                                      ' (metadata only)' if metadata_only else ''))
+
+            block, data, metadata = self._read_finish(block,
+                                                      key=key,
+                                                      data=data if not metadata_only else None,
+                                                      data_length=data_length,
+                                                      metadata_json=metadata_json,
+                                                      metadata_only=metadata_only)
+            if isinstance(data, memoryview):
+                data = data.tobytes()
+
+        time.sleep(self.read_throttling.consume((len(data) if data else 0) + len(metadata_json)))
+
+        return block, data, metadata
+
+    def close(self) -> None:
+        super().close()
+        self._env.close()
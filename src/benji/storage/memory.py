@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+import hashlib
+import threading
+from typing import Union, Iterable, Tuple, Optional, Dict
+
+from benji.config import Config, ConfigDict
+from benji.storage.base import StorageBase
+
+
+# The objects are kept on the module level so that they survive closing and reopening the storage (e.g. between
+# two Benji instances) inside the same process.
+_objects: Dict[str, Dict[str, bytes]] = {}
+_objects_lock = threading.Lock()
+
+
+class Storage(StorageBase):
+
+    _OBJECT_CHECKSUM_ALGORITHM = 'sha256'
+
+    # All objects are kept in memory and are lost when the process terminates. This is only useful for
+    # testing and benchmarking.
+    def __init__(self, *, config: Config, name: str, module_configuration: ConfigDict) -> None:
+        super().__init__(config=config, name=name, module_configuration=module_configuration)
+
+        with _objects_lock:
+            self._objects = _objects.setdefault(name, {})
+        self._objects_lock = _objects_lock
+
+    def _write_object(self, key: str, data: bytes) -> None:
+        with self._objects_lock:
+            self._objects[key] = bytes(data)
+
+    def _read_object(self, key: str) -> bytes:
+        with self._objects_lock:
+            try:
+                return self._objects[key]
+            except KeyError:
+                raise FileNotFoundError('Key {} not found.'.format(key)) from None
+
+    def _read_object_length(self, key: str) -> int:
+        return len(self._read_object(key))
+
+    def _read_object_length_and_checksum(self, key: str) -> Tuple[int, Optional[str]]:
+        data = self._read_object(key)
+        return len(data), hashlib.sha256(data).hexdigest()
+
+    def _rm_object(self, key: str) -> Optional[int]:
+        with self._objects_lock:
+            try:
+                return len(self._objects.pop(key))
+            except KeyError:
+                raise FileNotFoundError('Key {} not found.'.format(key)) from None
+
+    def _list_objects(self, prefix: str = None,
+                      include_size: bool = False) -> Union[Iterable[str], Iterable[Tuple[str, int]]]:
+        with self._objects_lock:
+            objects = [(key, len(data))
+                       for key, data in self._objects.items()
+                       if prefix is None or key.startswith(prefix)]
+        for key, size in objects:
+            if include_size:
+                yield key, size
+            else:
+                yield key
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+import enum
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple, Iterable, Callable
+
+
+class MemoryReadCache:
+    """Size bounded in-memory LRU cache for decapsulated blocks and their metadata"""
+
+    # Rough estimate of the memory used by an entry in addition to the data itself
+    _ENTRY_OVERHEAD = 512
+
+    def __init__(self, maximum_size: int, admit: Callable[[str, Optional[str]], bool] = None) -> None:
+        self._maximum_size = maximum_size
+        # Called with the key of the new entry and the key of the entry which would be evicted first (or None
+        # when there is enough free space).
+        self._admit = admit
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._rejections = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _entry_size(cls, data: Optional[bytes]) -> int:
+        return cls._ENTRY_OVERHEAD + (len(data) if data is not None else 0)
+
+    def get(self, key: str, metadata_only: bool) -> Optional[Tuple[Optional[bytes], Dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            # Entries without data only satisfy metadata only lookups
+            if entry is None or (not metadata_only and entry[0] is None):
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def set(self, key: str, data: Optional[bytes], metadata: Dict) -> None:
+        entry_size = self._entry_size(data)
+        if entry_size > self._maximum_size:
+            return
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                # Don't replace a complete entry with a metadata only one
+                if data is None and old_entry[0] is not None:
+                    data = old_entry[0]
+                    entry_size = self._entry_size(data)
+                self._size -= self._entry_size(old_entry[0])
+            elif self._admit is not None:
+                victim_key = next(iter(self._entries)) if self._size + entry_size > self._maximum_size else None
+                if not self._admit(key, victim_key):
+                    self._rejections += 1
+                    return
+            self._entries[key] = (data, metadata)
+            self._size += entry_size
+            while self._size > self._maximum_size:
+                _, (evicted_data, _) = self._entries.popitem(last=False)
+                self._size -= self._entry_size(evicted_data)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= self._entry_size(entry[0])
+
+    def stats(self) -> Tuple[int, int]:
+        with self._lock:
+            return self._hits, self._misses
+
+    @property
+    def rejections(self) -> int:
+        return self._rejections
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class ReadCacheMode(enum.Enum):
+    # Lookup blocks in the cache and store blocks read from the storage
+    read_through = 1
+    # Lookup blocks in the cache, but don't store blocks read from the storage
+    read_only = 2
+    # Don't use the cache at all
+    bypass = 3
+    # Always read from the storage, but store the blocks in the cache
+    write_only = 4
+
+    def __str__(self) -> str:
+        return self.name
+
+    @property
+    def lookup(self) -> bool:
+        return self == self.read_through or self == self.read_only
+
+    @property
+    def store(self) -> bool:
+        return self == self.read_through or self == self.write_only
+
+
+class FrequencySketch:
+    """Count-min sketch with periodic aging as used by TinyLFU"""
+
+    _DEPTH = 4
+    _MAXIMUM_COUNT = 15
+    # Odd multipliers for deriving the row indexes from a single hash value
+    _SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+
+    def __init__(self, width: int) -> None:
+        if width & (width - 1) != 0:
+            raise ValueError('Width must be a power of two.')
+        self._width = width
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in range(self._DEPTH)]
+        self._sample_size = 10 * width
+        self._additions = 0
+        self._lock = threading.Lock()
+
+    def _indexes(self, key: str) -> Iterable[int]:
+        key_hash = hash(key)
+        for seed in self._SEEDS:
+            yield ((key_hash * seed) >> 32) & self._mask
+
+    def increment(self, key: str) -> None:
+        with self._lock:
+            for row, index in zip(self._rows, self._indexes(key)):
+                if row[index] < self._MAXIMUM_COUNT:
+                    row[index] += 1
+            self._additions += 1
+            if self._additions >= self._sample_size:
+                self._age()
+
+    def _age(self) -> None:
+        for row in self._rows:
+            for index in range(self._width):
+                row[index] >>= 1
+        self._additions //= 2
+
+    def estimate(self, key: str) -> int:
+        with self._lock:
+            return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+
+class ReadCacheAdmission:
+    """Decides which blocks are admitted to the read cache tiers
+
+    always:       All blocks are admitted.
+    secondAccess: Blocks are admitted when they have been accessed at least twice recently.
+    tinyLFU:      The memory tier admits a block when there is free space or when it has been accessed more
+                  frequently than the block which would be evicted. The disk tier admits blocks on their second
+                  access as its eviction candidates are not known.
+    """
+
+    POLICIES = ('always', 'secondAccess', 'tinyLFU')
+
+    _SKETCH_WIDTH = 65536
+
+    def __init__(self, policy: str) -> None:
+        if policy not in self.POLICIES:
+            raise ValueError('Unknown read cache admission policy {}.'.format(policy))
+        self._policy = policy
+        self._sketch = FrequencySketch(self._SKETCH_WIDTH) if policy != 'always' else None
+
+    @property
+    def policy(self) -> str:
+        return self._policy
+
+    def record(self, key: str) -> None:
+        if self._sketch is not None:
+            self._sketch.increment(key)
+
+    def admit_memory(self, key: str, victim_key: Optional[str]) -> bool:
+        if self._sketch is None:
+            return True
+        elif self._policy == 'tinyLFU':
+            return victim_key is None or self._sketch.estimate(key) > self._sketch.estimate(victim_key)
+        else:
+            return self._sketch.estimate(key) >= 2
+
+    def admit_disk(self, key: str) -> bool:
+        return self._sketch is None or self._sketch.estimate(key) >= 2
@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 # -*- encoding: utf-8 -*-
+import concurrent.futures
 import threading
-from typing import Iterable, Union, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Union, Tuple, Optional, Callable, List, Any, Dict
 
 import boto3
 from botocore.client import Config as BotoCoreClientConfig
@@ -11,6 +13,7 @@ from botocore.handlers import set_list_objects_encoding_type_url
 from benji.config import Config, ConfigDict
 from benji.logging import logger
 from benji.storage.base import ReadCacheStorageBase
+from benji.storage.s3common import etag_to_md5, content_md5
 
 
 class Storage(ReadCacheStorageBase):
@@ -18,6 +21,8 @@ class Storage(ReadCacheStorageBase):
     WRITE_QUEUE_LENGTH = 20
     READ_QUEUE_LENGTH = 20
 
+    _OBJECT_CHECKSUM_ALGORITHM = 'md5'
+
     def __init__(self, *, config: Config, name: str, module_configuration: ConfigDict):
         aws_access_key_id = Config.get_from_dict(module_configuration, 'awsAccessKeyId', None, types=str)
         if aws_access_key_id is None:
@@ -38,6 +43,21 @@ class Storage(ReadCacheStorageBase):
         self._bucket_name = Config.get_from_dict(module_configuration, 'bucketName', types=str)
         self._disable_encoding_type = Config.get_from_dict(module_configuration, 'disableEncodingType', types=bool)
 
+        self._multipart_threshold = Config.get_from_dict(module_configuration, 'multipartThreshold', types=int)
+        self._multipart_part_size = Config.get_from_dict(module_configuration, 'multipartPartSize', types=int)
+        self._ranged_read_part_size = Config.get_from_dict(module_configuration, 'rangedReadPartSize', types=int)
+        self._transfer_parallelism = Config.get_from_dict(module_configuration, 'transferParallelism', types=int)
+        # The thread executing the read or write transfers one part of the object itself, the other parts are
+        # transferred by this pool. It is sized so that each read and write thread can have transferParallelism
+        # requests in flight.
+        self._transfer_executor: Optional[ThreadPoolExecutor] = None
+        if self._transfer_parallelism > 1 and (self._multipart_threshold > 0 or self._ranged_read_part_size > 0):
+            simultaneous_transfers = (Config.get_from_dict(module_configuration, 'simultaneousReads', types=int) +
+                                      Config.get_from_dict(module_configuration, 'simultaneousWrites', types=int))
+            self._transfer_executor = ThreadPoolExecutor(max_workers=simultaneous_transfers *
+                                                         (self._transfer_parallelism - 1),
+                                                         thread_name_prefix='S3-Transfer')
+
         self._resource_config = {
             'aws_access_key_id': aws_access_key_id,
             'aws_secret_access_key': aws_secret_access_key,
@@ -76,15 +96,84 @@ class Storage(ReadCacheStorageBase):
             self._local.resource = self._local.session.resource('s3', **self._resource_config)
             self._local.bucket = self._local.resource.Bucket(self._bucket_name)
 
+    # Calls function for each part number and returns the results in order. At most transferParallelism parts are
+    # transferred at the same time, the calling thread takes part in the transfer.
+    def _transfer_parts(self, function: Callable[[int], Any], parts_count: int) -> List[Any]:
+        results: List[Any] = [None] * parts_count
+        lanes_count = min(self._transfer_parallelism, parts_count) if self._transfer_executor else 1
+
+        def lane(lane_index: int) -> None:
+            self._init_connection()
+            for part in range(lane_index, parts_count, lanes_count):
+                results[part] = function(part)
+
+        futures = [self._transfer_executor.submit(lane, lane_index) for lane_index in range(1, lanes_count)]
+        try:
+            lane(0)
+        finally:
+            concurrent.futures.wait(futures)
+        for future in futures:
+            future.result()
+
+        return results
+
+    def _write_object_multipart(self, key: str, data: bytes, checksummed: bool) -> None:
+        client = self._local.resource.meta.client
+        upload_id = client.create_multipart_upload(Bucket=self._bucket_name, Key=key)['UploadId']
+        part_size = self._multipart_part_size
+        try:
+
+            def upload_part(part: int) -> Dict[str, Any]:
+                body = data[part * part_size:(part + 1) * part_size]
+                arguments = {
+                    'Bucket': self._bucket_name,
+                    'Key': key,
+                    'UploadId': upload_id,
+                    'PartNumber': part + 1,
+                    'Body': body,
+                }
+                if checksummed:
+                    arguments['ContentMD5'] = content_md5(body)
+                response = self._local.resource.meta.client.upload_part(**arguments)
+                return {'ETag': response['ETag'], 'PartNumber': part + 1}
+
+            parts = self._transfer_parts(upload_part, (len(data) + part_size - 1) // part_size)
+            client.complete_multipart_upload(Bucket=self._bucket_name,
+                                             Key=key,
+                                             UploadId=upload_id,
+                                             MultipartUpload={'Parts': parts})
+        except:
+            try:
+                client.abort_multipart_upload(Bucket=self._bucket_name, Key=key, UploadId=upload_id)
+            except ClientError as exception:
+                logger.warning('Aborting multipart upload of {} failed: {}'.format(key, str(exception)))
+            raise
+
     def _write_object(self, key: str, data: bytes) -> None:
         self._init_connection()
-        object = self._local.bucket.Object(key)
-        object.put(Body=data)
+        if 0 < self._multipart_threshold <= len(data):
+            self._write_object_multipart(key, data, checksummed=False)
+        else:
+            object = self._local.bucket.Object(key)
+            object.put(Body=data)
+
+    def _write_object_checksummed(self, key: str, data: bytes, checksum: Optional[str] = None) -> bool:
+        self._init_connection()
+        # The server verifies the MD5 checksum (of each part) and rejects the request with BadDigest if it doesn't
+        # match
+        if 0 < self._multipart_threshold <= len(data):
+            self._write_object_multipart(key, data, checksummed=True)
+        else:
+            object = self._local.bucket.Object(key)
+            object.put(Body=data, ContentMD5=content_md5(data, checksum))
+        return True
 
     def _read_object(self, key: str) -> bytes:
         self._init_connection()
         object = self._local.bucket.Object(key)
         try:
+            if self._ranged_read_part_size > 0:
+                return self._read_object_ranged(object)
             data_dict = object.get()
             data = data_dict['Body'].read()
         except ClientError as e:
@@ -95,6 +184,41 @@ class Storage(ReadCacheStorageBase):
 
         return data
 
+    # The first part is requested without knowing the length of the object, so small objects still only need one
+    # request. The remaining parts are requested in parallel and are pinned to the same object version by its ETag.
+    def _read_object_ranged(self, object) -> bytes:
+        part_size = self._ranged_read_part_size
+        try:
+            data_dict = object.get(Range='bytes=0-{}'.format(part_size - 1))
+        except ClientError as e:
+            # Empty objects can't satisfy any range
+            if e.response['Error']['Code'] == 'InvalidRange':
+                return object.get()['Body'].read()
+            raise
+        first_part = data_dict['Body'].read()
+        content_range = data_dict.get('ContentRange')
+        if content_range is None:
+            # The server ignored the range and returned the whole object
+            return first_part
+        object_length = int(content_range.split('/')[1])
+        if object_length <= len(first_part):
+            return first_part
+
+        key = object.key
+        e_tag = data_dict['ETag']
+
+        def read_part(part: int) -> bytes:
+            if part == 0:
+                return first_part
+            end = min((part + 1) * part_size, object_length) - 1
+            response = self._local.resource.meta.client.get_object(Bucket=self._bucket_name,
+                                                                   Key=key,
+                                                                   Range='bytes={}-{}'.format(part * part_size, end),
+                                                                   IfMatch=e_tag)
+            return response['Body'].read()
+
+        return b''.join(self._transfer_parts(read_part, (object_length + part_size - 1) // part_size))
+
     def _read_object_length(self, key: str) -> int:
         self._init_connection()
         object = self._local.bucket.Object(key)
@@ -108,7 +232,21 @@ class Storage(ReadCacheStorageBase):
 
         return object.content_length
 
-    def _rm_object(self, key):
+    def _read_object_length_and_checksum(self, key: str) -> Tuple[int, Optional[str]]:
+        self._init_connection()
+        object = self._local.bucket.Object(key)
+        try:
+            object.load()
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'NoSuchKey' or e.response['Error']['Code'] == '404':
+                raise FileNotFoundError('Key {} not found.'.format(key)) from None
+            else:
+                raise
+
+        return object.content_length, etag_to_md5(object.e_tag, object.server_side_encryption,
+                                                  object.sse_customer_algorithm)
+
+    def _rm_object(self, key: str) -> Optional[int]:
         self._init_connection()
         # delete() always returns 204 even when key doesn't exist, so check for existence
         object = self._local.bucket.Object(key)
@@ -120,8 +258,12 @@ class Storage(ReadCacheStorageBase):
             else:
                 raise
         else:
+            # The resource's attributes are reset by the delete action, so save the length beforehand
+            length = object.content_length
             object.delete()
 
+        return length
+
     # def _rm_many_objects(self, keys: Sequence[str]) -> List[str]:
     #     self._init_connection()
     #     errors: List[str] = []
@@ -160,3 +302,8 @@ class Storage(ReadCacheStorageBase):
                 yield object_summary.key, object_summary.size
             else:
                 yield object_summary.key
+
+    def close(self) -> None:
+        super().close()
+        if self._transfer_executor is not None:
+            self._transfer_executor.shutdown()
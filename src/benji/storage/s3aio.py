@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Union, Tuple, Optional, Dict, List, Any
+
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from botocore.exceptions import ClientError
+from botocore.handlers import set_list_objects_encoding_type_url
+
+from benji.config import Config, ConfigDict
+from benji.database import DereferencedBlock, Block, BlockUid
+from benji.jobexecutor import JobExecutor, AsyncJobExecutor
+from benji.logging import logger
+from benji.storage.base import ReadCacheStorageBase, InvalidBlockException, BlockNotFoundError
+from benji.storage.readcache import ReadCacheMode
+from benji.storage.s3common import etag_to_md5, content_md5
+
+
+class Storage(ReadCacheStorageBase):
+
+    WRITE_QUEUE_LENGTH = 20
+    READ_QUEUE_LENGTH = 20
+
+    _OBJECT_CHECKSUM_ALGORITHM = 'md5'
+
+    def __init__(self, *, config: Config, name: str, module_configuration: ConfigDict):
+        aws_access_key_id = Config.get_from_dict(module_configuration, 'awsAccessKeyId', None, types=str)
+        if aws_access_key_id is None:
+            aws_access_key_id_file = Config.get_from_dict(module_configuration, 'awsAccessKeyIdFile', types=str)
+            with open(aws_access_key_id_file, 'r') as f:
+                aws_access_key_id = f.read().rstrip()
+        aws_secret_access_key = Config.get_from_dict(module_configuration, 'awsSecretAccessKey', None, types=str)
+        if aws_secret_access_key is None:
+            aws_secret_access_key_file = Config.get_from_dict(module_configuration, 'awsSecretAccessKeyFile', types=str)
+            with open(aws_secret_access_key_file, 'r') as f:
+                aws_secret_access_key = f.read().rstrip()
+        region_name = Config.get_from_dict(module_configuration, 'regionName', None, types=str)
+        endpoint_url = Config.get_from_dict(module_configuration, 'endpointUrl', None, types=str)
+        use_ssl = Config.get_from_dict(module_configuration, 'useSsl', None, types=bool)
+        addressing_style = Config.get_from_dict(module_configuration, 'addressingStyle', None, types=str)
+        signature_version = Config.get_from_dict(module_configuration, 'signatureVersion', None, types=str)
+        max_pool_connections = Config.get_from_dict(module_configuration, 'maxPoolConnections', types=int)
+        simultaneous_transforms = Config.get_from_dict(module_configuration, 'simultaneousTransforms', types=int)
+
+        self._bucket_name = Config.get_from_dict(module_configuration, 'bucketName', types=str)
+        self._disable_encoding_type = Config.get_from_dict(module_configuration, 'disableEncodingType', types=bool)
+
+        self._client_config: Dict[str, Any] = {
+            'aws_access_key_id': aws_access_key_id,
+            'aws_secret_access_key': aws_secret_access_key,
+        }
+
+        if region_name:
+            self._client_config['region_name'] = region_name
+
+        if endpoint_url:
+            self._client_config['endpoint_url'] = endpoint_url
+
+        if use_ssl:
+            self._client_config['use_ssl'] = use_ssl
+
+        client_config: Dict[str, Any] = {'max_pool_connections': max_pool_connections}
+        if addressing_style:
+            client_config['s3'] = {'addressing_style': addressing_style}
+
+        if signature_version:
+            client_config['signature_version'] = signature_version
+
+        self._client_config['config'] = AioConfig(**client_config)
+
+        # All requests are issued from a single event loop running in its own thread. CPU intensive work like
+        # the transforms and the read cache access is offloaded to a small thread pool.
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._run_loop, name='Storage-AsyncIO', daemon=True)
+        self._loop_thread.start()
+        self._transform_executor = ThreadPoolExecutor(max_workers=simultaneous_transforms,
+                                                      thread_name_prefix='Storage-Transform')
+        self._run(self._init_client())
+
+        super().__init__(config=config, name=name, module_configuration=module_configuration)
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _run(self, coroutine) -> Any:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _in_executor(self, function, *args, **kwargs) -> Any:
+        return await self._loop.run_in_executor(self._transform_executor, functools.partial(function, *args, **kwargs))
+
+    async def _init_client(self) -> None:
+        logger.debug('Initializing asynchronous S3 session and client.')
+        session = get_session()
+        if self._disable_encoding_type:
+            session.unregister('before-parameter-build.s3.ListObjects', set_list_objects_encoding_type_url)
+        self._client_context = session.create_client('s3', **self._client_config)
+        self._client = await self._client_context.__aenter__()
+
+    async def _close_client(self) -> None:
+        await self._client_context.__aexit__(None, None, None)
+
+    def _create_executor(self, *, name: str, workers: int, blocking_submit: bool) -> JobExecutor:
+        return AsyncJobExecutor(name=name, workers=workers, blocking_submit=blocking_submit, loop=self._loop)
+
+    @staticmethod
+    def _is_not_found(exception: ClientError) -> bool:
+        return exception.response['Error']['Code'] in ('NoSuchKey', '404')
+
+    async def _write_object_async(self, key: str, data: bytes) -> None:
+        await self._client.put_object(Bucket=self._bucket_name, Key=key, Body=data)
+
+    async def _write_object_checksummed_async(self, key: str, data: bytes, checksum: Optional[str] = None) -> bool:
+        # The server verifies the MD5 checksum and rejects the request with BadDigest if it doesn't match
+        await self._client.put_object(Bucket=self._bucket_name,
+                                      Key=key,
+                                      Body=data,
+                                      ContentMD5=content_md5(data, checksum))
+        return True
+
+    async def _write_objects_async(self,
+                                   key: str,
+                                   data: bytes,
+                                   metadata_key: str,
+                                   metadata_json: bytes,
+                                   data_checksum: Optional[str] = None) -> bool:
+        if self._consistency_check_writes and self._consistency_check_writes_method == 'checksum':
+            data_verified = await self._write_object_checksummed_async(key, data, data_checksum)
+            metadata_verified = await self._write_object_checksummed_async(metadata_key, metadata_json)
+            return data_verified and metadata_verified
+        else:
+            await self._write_object_async(key, data)
+            await self._write_object_async(metadata_key, metadata_json)
+            return False
+
+    async def _read_object_async(self, key: str) -> bytes:
+        try:
+            response = await self._client.get_object(Bucket=self._bucket_name, Key=key)
+            async with response['Body'] as stream:
+                data = await stream.read()
+        except ClientError as e:
+            if self._is_not_found(e):
+                raise FileNotFoundError('Key {} not found.'.format(key)) from None
+            else:
+                raise
+
+        return data
+
+    async def _head_object_async(self, key: str) -> Dict:
+        try:
+            return await self._client.head_object(Bucket=self._bucket_name, Key=key)
+        except ClientError as e:
+            if self._is_not_found(e):
+                raise FileNotFoundError('Key {} not found.'.format(key)) from None
+            else:
+                raise
+
+    async def _read_object_length_async(self, key: str) -> int:
+        response = await self._head_object_async(key)
+        return response['ContentLength']
+
+    async def _read_object_length_and_checksum_async(self, key: str) -> Tuple[int, Optional[str]]:
+        response = await self._head_object_async(key)
+        return response['ContentLength'], etag_to_md5(response['ETag'], response.get('ServerSideEncryption'),
+                                                      response.get('SSECustomerAlgorithm'))
+
+    async def _rm_object_async(self, key: str) -> int:
+        # delete_object() always returns 204 even when key doesn't exist, so check for existence
+        length = await self._read_object_length_async(key)
+        await self._client.delete_object(Bucket=self._bucket_name, Key=key)
+        return length
+
+    async def _list_objects_page(self, prefix: Optional[str],
+                                 marker: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+        arguments = {'Bucket': self._bucket_name}
+        if prefix is not None:
+            arguments['Prefix'] = prefix
+        if marker is not None:
+            arguments['Marker'] = marker
+        response = await self._client.list_objects(**arguments)
+        contents = response.get('Contents', [])
+        if response.get('IsTruncated', False) and contents:
+            return contents, response.get('NextMarker', contents[-1]['Key'])
+        else:
+            return contents, None
+
+    def _write_object(self, key: str, data: bytes) -> None:
+        self._run(self._write_object_async(key, data))
+
+    def _write_object_checksummed(self, key: str, data: bytes, checksum: Optional[str] = None) -> bool:
+        return self._run(self._write_object_checksummed_async(key, data, checksum))
+
+    def _read_object(self, key: str) -> bytes:
+        return self._run(self._read_object_async(key))
+
+    def _read_object_length(self, key: str) -> int:
+        return self._run(self._read_object_length_async(key))
+
+    def _read_object_length_and_checksum(self, key: str) -> Tuple[int, Optional[str]]:
+        return self._run(self._read_object_length_and_checksum_async(key))
+
+    def _rm_object(self, key: str) -> Optional[int]:
+        return self._run(self._rm_object_async(key))
+
+    def _list_objects(self, prefix: str = None,
+                      include_size: bool = False) -> Union[Iterable[str], Iterable[Tuple[str, int]]]:
+        marker: Optional[str] = None
+        while True:
+            contents, marker = self._run(self._list_objects_page(prefix, marker))
+            for object in contents:
+                if include_size:
+                    yield object['Key'], object['Size']
+                else:
+                    yield object['Key']
+            if marker is None:
+                break
+
+    async def _write_async(self, block: DereferencedBlock, data: bytes) -> DereferencedBlock:
+        key, metadata_key, data, metadata_json, data_checksum = await self._in_executor(
+            self._write_prepare, block, data)
+
+        await asyncio.sleep(self.write_throttling.consume(len(data) + len(metadata_json)))
+        t1 = time.time()
+        try:
+            checksums_verified = await self._write_objects_async(key, data, metadata_key, metadata_json, data_checksum)
+        except:
+            try:
+                await self._rm_object_async(key)
+                await self._rm_object_async(metadata_key)
+            except FileNotFoundError:
+                pass
+            raise
+        t2 = time.time()
+        self._account_usage(2, len(data) + len(metadata_json))
+
+        logger.debug('Wrote data of uid {} in {:.3f}s'.format(block.uid, t2 - t1))
+
+        if self._read_back_needed(checksums_verified):
+            self._write_check(block,
+                              key=key,
+                              data_expected=data,
+                              data_actual=await self._read_object_async(key),
+                              metadata_actual_json=await self._read_object_async(metadata_key))
+
+        return block
+
+    def write_block_async(self, block: Union[DereferencedBlock, Block], data: bytes) -> None:
+        block_deref = block.deref()
+
+        def job():
+            return self._write_async(block_deref, data)
+
+        self._write_executor.submit(job)
+
+    async def _read_async(self, block: DereferencedBlock, metadata_only: bool,
+                          read_cache_mode: ReadCacheMode) -> Tuple[DereferencedBlock, Optional[bytes], Dict]:
+        cached = await self._in_executor(self._read_cache_lookup, block, metadata_only, read_cache_mode)
+        if cached is not None:
+            return cached
+
+        key = block.uid.storage_object_to_path()
+        metadata_key = key + self._META_SUFFIX
+
+        async def read_objects() -> Tuple[Optional[bytes], int, bytes]:
+            data: Optional[bytes] = None
+            if not metadata_only:
+                data = await self._read_object_async(key)
+                data_length = len(data)
+            else:
+                data_length = await self._read_object_length_async(key)
+            metadata_json = await self._read_object_async(metadata_key)
+            return data, data_length, metadata_json
+
+        try:
+            t1 = time.time()
+            if self._read_hedger is not None:
+                data, data_length, metadata_json = await self._read_hedger.call_async(read_objects)
+            else:
+                data, data_length, metadata_json = await read_objects()
+            await asyncio.sleep(self.read_throttling.consume((len(data) if data else 0) + len(metadata_json)))
+            t2 = time.time()
+        except FileNotFoundError as exception:
+            raise InvalidBlockException(
+                'Object metadata or data of block {} (UID{}) not found.'.format(block.idx, block.uid),
+                block) from exception
+
+        logger.debug('Read data of uid {} in {:.3f}s{}'.format(block.uid, t2 - t1,
+                                                               ' (metadata only)' if metadata_only else ''))
+
+        def finish():
+            result = self._read_finish(block,
+                                       key=key,
+                                       data=data,
+                                       data_length=data_length,
+                                       metadata_json=metadata_json,
+                                       metadata_only=metadata_only)
+            self._read_cache_store(*result, metadata_only, read_cache_mode)
+            return result
+
+        return await self._in_executor(finish)
+
+    def read_block_async(self,
+                         block: Block,
+                         metadata_only: bool = False,
+                         read_cache_mode: ReadCacheMode = ReadCacheMode.read_through) -> None:
+        block_deref = block.deref()
+
+        def job():
+            return self._read_async(block_deref, metadata_only, read_cache_mode)
+
+        self._read_executor.submit(job)
+
+    async def _verify_async(self, block: DereferencedBlock) -> Tuple[DereferencedBlock, Optional[bytes], Dict]:
+        key = block.uid.storage_object_to_path()
+        metadata_key = key + self._META_SUFFIX
+        try:
+            t1 = time.time()
+            data_length, object_checksum = await self._read_object_length_and_checksum_async(key)
+            metadata_json = await self._read_object_async(metadata_key)
+            await asyncio.sleep(self.read_throttling.consume(len(metadata_json)))
+            t2 = time.time()
+        except FileNotFoundError as exception:
+            raise InvalidBlockException(
+                'Object metadata or data of block {} (UID{}) not found.'.format(block.idx, block.uid),
+                block) from exception
+
+        logger.debug('Verified data of uid {} in {:.3f}s'.format(block.uid, t2 - t1))
+
+        block, _, metadata = self._read_finish(block,
+                                               key=key,
+                                               data=None,
+                                               data_length=data_length,
+                                               metadata_json=metadata_json,
+                                               metadata_only=True)
+        self._verify_object_checksum(block, key=key, metadata=metadata, object_checksum=object_checksum)
+        return block, None, metadata
+
+    def verify_block_async(self, block: Block) -> None:
+        block_deref = block.deref()
+
+        def job():
+            return self._verify_async(block_deref)
+
+        self._read_executor.submit(job)
+
+    async def _rm_block_async(self, uid: BlockUid) -> BlockUid:
+        await self._in_executor(self._read_cache_invalidate, uid)
+        key = uid.storage_object_to_path()
+        metadata_key = key + self._META_SUFFIX
+        objects_count = 0
+        objects_size = 0
+        try:
+            objects_size += await self._rm_object_async(key)
+            objects_count += 1
+        except FileNotFoundError as exception:
+            raise BlockNotFoundError('Block UID {} not found on storage.'.format(uid), uid) from exception
+        finally:
+            try:
+                objects_size += await self._rm_object_async(metadata_key)
+                objects_count += 1
+            except FileNotFoundError:
+                pass
+            self._account_usage(-objects_count, -objects_size)
+        return uid
+
+    def rm_block_async(self, uid: BlockUid) -> None:
+
+        def job():
+            return self._rm_block_async(uid)
+
+        self._remove_executor.submit(job)
+
+    def close(self) -> None:
+        super().close()
+        self._run(self._close_client())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._transform_executor.shutdown()
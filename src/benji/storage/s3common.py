@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+import base64
+import hashlib
+from typing import Optional
+
+
+# The ETag is only the MD5 checksum of the object's content if it wasn't uploaded in multiple parts and it isn't
+# encrypted with SSE-KMS or SSE-C.
+def etag_to_md5(etag: str, server_side_encryption: Optional[str],
+                sse_customer_algorithm: Optional[str]) -> Optional[str]:
+    etag = etag.strip('"')
+    if '-' in etag or server_side_encryption == 'aws:kms' or sse_customer_algorithm is not None:
+        return None
+    return etag
+
+
+# Returns the value of the Content-MD5 header for data, checksum is its hex encoded MD5 checksum if already known
+def content_md5(data: bytes, checksum: Optional[str] = None) -> str:
+    digest = bytes.fromhex(checksum) if checksum is not None else hashlib.md5(data).digest()
+    return base64.b64encode(digest).decode('ascii')
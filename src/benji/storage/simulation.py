@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+import math
+import random
+import threading
+import time
+from typing import Union, Iterable, Tuple, Optional
+
+from benji.config import Config, ConfigDict
+from benji.exception import ConfigurationError
+from benji.factory import StorageFactory
+from benji.logging import logger
+from benji.storage.base import StorageBase
+
+
+class SimulatedError(IOError):
+    pass
+
+
+class Storage(StorageBase):
+
+    # This module stores its objects in another storage and injects latency and errors into each object request.
+    # It is intended for benchmarking and testing. Transforms, HMAC and bandwidth limits of this module are applied
+    # as usual, the ones configured for the wrapped storage are bypassed.
+    def __init__(self, *, config: Config, name: str, module_configuration: ConfigDict) -> None:
+        super().__init__(config=config, name=name, module_configuration=module_configuration)
+
+        storage_name = Config.get_from_dict(module_configuration, 'storage', types=str)
+        if storage_name == name:
+            raise ConfigurationError('Storage {} cannot wrap itself.'.format(name))
+        self._storage: StorageBase = StorageFactory.get_by_name(storage_name)
+        self._OBJECT_CHECKSUM_ALGORITHM = self._storage._OBJECT_CHECKSUM_ALGORITHM
+
+        self._latency_distribution = Config.get_from_dict(module_configuration,
+                                                          'latency.distribution',
+                                                          'constant',
+                                                          types=str)
+        self._latency_mean = Config.get_from_dict(module_configuration, 'latency.mean', 0, types=(int, float))
+        self._latency_standard_deviation = Config.get_from_dict(module_configuration,
+                                                                'latency.standardDeviation',
+                                                                0,
+                                                                types=(int, float))
+        self._latency_minimum = Config.get_from_dict(module_configuration, 'latency.minimum', 0, types=(int, float))
+        self._latency_maximum = Config.get_from_dict(module_configuration, 'latency.maximum', None, types=(int, float))
+        self._error_rate = Config.get_from_dict(module_configuration, 'errorRate', types=(int, float))
+        seed = Config.get_from_dict(module_configuration, 'seed', None, types=int)
+
+        if self._latency_distribution == 'uniform' and self._latency_maximum is None:
+            raise ConfigurationError('Uniform latency distribution of storage {} requires a maximum.'.format(name))
+
+        # The parameters of the underlying normal distribution are derived from the mean and standard deviation
+        # of the resulting latency.
+        if self._latency_distribution == 'lognormal':
+            if self._latency_mean <= 0:
+                raise ConfigurationError(
+                    'Lognormal latency distribution of storage {} requires a positive mean.'.format(name))
+            self._lognormal_sigma = math.sqrt(math.log(1 + (self._latency_standard_deviation / self._latency_mean)**2))
+            self._lognormal_mu = math.log(self._latency_mean) - self._lognormal_sigma**2 / 2
+
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+        logger.info('Storage {} simulates {} latency (mean {}s) and an error rate of {} on top of storage {}.'.format(
+            name, self._latency_distribution, self._latency_mean, self._error_rate, storage_name))
+
+    def _latency(self) -> float:
+        with self._random_lock:
+            if self._latency_distribution == 'constant':
+                latency = self._latency_mean
+            elif self._latency_distribution == 'uniform':
+                latency = self._random.uniform(self._latency_minimum, self._latency_maximum)
+            elif self._latency_distribution == 'normal':
+                latency = self._random.gauss(self._latency_mean, self._latency_standard_deviation)
+            elif self._latency_distribution == 'lognormal':
+                latency = self._random.lognormvariate(self._lognormal_mu, self._lognormal_sigma)
+            elif self._latency_distribution == 'exponential':
+                latency = self._random.expovariate(1 / self._latency_mean) if self._latency_mean > 0 else 0
+            else:
+                raise ConfigurationError('Unknown latency distribution {}.'.format(self._latency_distribution))
+
+        latency = max(latency, self._latency_minimum)
+        if self._latency_maximum is not None:
+            latency = min(latency, self._latency_maximum)
+        return latency
+
+    def _simulate(self, operation: str, key: str) -> None:
+        latency = self._latency()
+        if latency > 0:
+            time.sleep(latency)
+
+        if self._error_rate > 0:
+            with self._random_lock:
+                fail = self._random.random() < self._error_rate
+            if fail:
+                raise SimulatedError('Simulated error during {} of key {}.'.format(operation, key))
+
+    def _write_object(self, key: str, data: bytes) -> None:
+        self._simulate('write', key)
+        self._storage._write_object(key, data)
+
+    def _write_object_checksummed(self, key: str, data: bytes, checksum: Optional[str] = None) -> bool:
+        self._simulate('write', key)
+        return self._storage._write_object_checksummed(key, data, checksum)
+
+    def _read_object(self, key: str) -> bytes:
+        self._simulate('read', key)
+        return self._storage._read_object(key)
+
+    def _read_object_length(self, key: str) -> int:
+        self._simulate('read', key)
+        return self._storage._read_object_length(key)
+
+    def _read_object_length_and_checksum(self, key: str) -> Tuple[int, Optional[str]]:
+        self._simulate('read', key)
+        return self._storage._read_object_length_and_checksum(key)
+
+    def _rm_object(self, key: str) -> Optional[int]:
+        self._simulate('remove', key)
+        return self._storage._rm_object(key)
+
+    def _list_objects(self, prefix: str = None,
+                      include_size: bool = False) -> Union[Iterable[str], Iterable[Tuple[str, int]]]:
+        # Listings only get the latency of their first request, errors are not injected here.
+        latency = self._latency()
+        if latency > 0:
+            time.sleep(latency)
+        return self._storage._list_objects(prefix, include_size=include_size)
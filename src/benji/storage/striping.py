@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+import hashlib
+import itertools
+from typing import Union, Iterable, Tuple, Optional, List
+
+from benji.config import Config, ConfigDict
+from benji.exception import ConfigurationError
+from benji.factory import StorageFactory
+from benji.logging import logger
+from benji.storage.base import StorageBase
+
+
+class Storage(StorageBase):
+
+    # This module spreads its objects over several other storages. The storage an object is placed in is derived from
+    # a hash of its key, so the data and the metadata object of a block always end up in the same storage. The
+    # mapping depends on the order and the number of the configured storages, they must not be changed once objects
+    # have been written. Transforms, HMAC and bandwidth limits of this module are applied as usual, the ones
+    # configured for the underlying storages are bypassed.
+    def __init__(self, *, config: Config, name: str, module_configuration: ConfigDict) -> None:
+        super().__init__(config=config, name=name, module_configuration=module_configuration)
+
+        storage_names = Config.get_from_dict(module_configuration, 'storages', types=list)
+        if name in storage_names:
+            raise ConfigurationError('Storage {} cannot stripe over itself.'.format(name))
+        if len(set(storage_names)) != len(storage_names):
+            raise ConfigurationError('Storage {} contains duplicate storages in its stripe set.'.format(name))
+        self._storages: List[StorageBase] = [
+            StorageFactory.get_by_name(storage_name) for storage_name in storage_names
+        ]
+
+        # Object checksums can only be verified when all underlying storages compute them in the same way.
+        checksum_algorithms = set(storage._OBJECT_CHECKSUM_ALGORITHM for storage in self._storages)
+        self._OBJECT_CHECKSUM_ALGORITHM = checksum_algorithms.pop() if len(checksum_algorithms) == 1 else None
+
+        logger.info('Storage {} stripes its objects over storages {}.'.format(name, ', '.join(storage_names)))
+
+    def _storage(self, key: str) -> StorageBase:
+        if key.endswith(self._META_SUFFIX):
+            key = key[:-len(self._META_SUFFIX)]
+        digest = hashlib.md5(key.encode('utf-8')).digest()
+        return self._storages[int.from_bytes(digest[:8], byteorder='big') % len(self._storages)]
+
+    def _write_object(self, key: str, data: bytes) -> None:
+        self._storage(key)._write_object(key, data)
+
+    def _write_object_checksummed(self, key: str, data: bytes, checksum: Optional[str] = None) -> bool:
+        return self._storage(key)._write_object_checksummed(key, data, checksum)
+
+    def _read_object(self, key: str) -> bytes:
+        return self._storage(key)._read_object(key)
+
+    def _read_object_length(self, key: str) -> int:
+        return self._storage(key)._read_object_length(key)
+
+    def _read_object_length_and_checksum(self, key: str) -> Tuple[int, Optional[str]]:
+        if self._OBJECT_CHECKSUM_ALGORITHM is None:
+            return self._read_object_length(key), None
+        return self._storage(key)._read_object_length_and_checksum(key)
+
+    def _rm_object(self, key: str) -> Optional[int]:
+        return self._storage(key)._rm_object(key)
+
+    def _list_objects(self, prefix: str = None,
+                      include_size: bool = False) -> Union[Iterable[str], Iterable[Tuple[str, int]]]:
+        return itertools.chain.from_iterable(
+            storage._list_objects(prefix, include_size=include_size) for storage in self._storages)
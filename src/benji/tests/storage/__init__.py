@@ -102,6 +102,48 @@ class StorageTestCase(StorageTestCaseBase):
         self.assertRaises(BlockNotFoundError, lambda: self.storage.rm_block(block.uid))
         self.assertRaises(InvalidBlockException, lambda: self.storage.read_block(block))
 
+    def test_verify(self):
+        NUM_BLOBS = 5
+        BLOB_SIZE = 4096
+
+        blocks = [
+            Block(uid=BlockUid(i + 1, i + 100), size=BLOB_SIZE, checksum='0000000000000000') for i in range(NUM_BLOBS)
+        ]
+        for block in blocks:
+            self.storage.write_block(block, self.random_bytes(BLOB_SIZE))
+
+        for block in blocks:
+            self.storage.verify_block_async(block)
+        results = list(self.storage.read_get_completed(timeout=5))
+        self.assertEqual(NUM_BLOBS, len(results))
+        for result in results:
+            self.assertNotIsInstance(result, Exception)
+            block, data, metadata = result
+            self.assertIsNone(data)
+            self.storage.check_block_metadata(block=block, data_length=None, metadata=metadata)
+            self.assertEqual(self.storage._record_object_checksums and
+                             self.storage._OBJECT_CHECKSUM_ALGORITHM is not None, 'object_checksum' in metadata)
+
+        # Replace the content of an object without changing its length
+        key = blocks[0].uid.storage_object_to_path()
+        data = self.storage._read_object(key)
+        self.storage._write_object(key, bytes([data[0] ^ 0xff]) + data[1:])
+        self.storage.verify_block_async(blocks[0])
+        results = list(self.storage.read_get_completed(timeout=5))
+        self.assertEqual(1, len(results))
+        if self.storage._record_object_checksums and self.storage._OBJECT_CHECKSUM_ALGORITHM is not None:
+            self.assertIsInstance(results[0], InvalidBlockException)
+        else:
+            self.assertNotIsInstance(results[0], Exception)
+
+        self.storage.rm_block(blocks[1].uid)
+        self.storage.verify_block_async(blocks[1])
+        results = list(self.storage.read_get_completed(timeout=5))
+        self.assertIsInstance(results[0], InvalidBlockException)
+
+        for block in blocks[:1] + blocks[2:]:
+            self.storage.rm_block(block.uid)
+
     def test_block_uid_to_key(self):
         for i in range(100):
             block_uid = BlockUid(random.randint(1, pow(2, 32) - 1), random.randint(1, pow(2, 32) - 1))
@@ -154,3 +196,97 @@ class StorageTestCase(StorageTestCaseBase):
 
         for block in blocks:
             self.storage.rm_block(block.uid)
+
+    def test_list_blocks_sorted(self):
+        NUM_BLOBS = 15
+        BLOB_SIZE = 512
+
+        # Force the listing to be spilled to several temporary files
+        self.storage._SORTED_LISTING_CHUNK_SIZE = 4
+
+        blocks = [
+            Block(uid=BlockUid(i % 3 + 1, i + 100), size=BLOB_SIZE, checksum='0000000000000000')
+            for i in range(NUM_BLOBS)
+        ]
+        for block in blocks:
+            self.storage.write_block(block, self.random_bytes(BLOB_SIZE))
+        # Leave only the metadata object of the first block
+        self.storage._rm_object(blocks[0].uid.storage_object_to_path())
+
+        listing = list(self.storage.list_blocks_sorted())
+        self.assertEqual(sorted([block.uid for block in blocks]), [uid for uid, _, _ in listing])
+        for uid, data_present, metadata_present in listing:
+            self.assertEqual(uid != blocks[0].uid, data_present)
+            self.assertTrue(metadata_present)
+
+        for block in blocks:
+            try:
+                self.storage.rm_block(block.uid)
+            except BlockNotFoundError:
+                pass
+        self.assertEqual([], list(self.storage.list_blocks_sorted()))
+
+    def test_read_write_raw(self):
+        BLOB_SIZE = 4096
+
+        block = Block(uid=BlockUid(1, 100), size=BLOB_SIZE, checksum='0000000000000000')
+        data = self.random_bytes(BLOB_SIZE)
+        self.storage.write_block(block, data)
+
+        data_raw, transforms_metadata = self.storage.read_block_raw(block)
+        self.assertTrue(self.storage.transforms_compatible(transforms_metadata))
+        self.storage.rm_block(block.uid)
+        self.assertFalse(self.storage.block_exists(block.uid))
+
+        self.storage.write_block_raw(block, data_raw, transforms_metadata)
+        self.assertTrue(self.storage.block_exists(block.uid))
+        self.assertEqual(data, self.storage.read_block(block))
+        self.storage.rm_block(block.uid)
+
+    def test_usage(self):
+        NUM_BLOBS = 15
+        BLOB_SIZE = 4096
+
+        self.assertEqual((0, 0), self.storage.pop_usage())
+
+        blocks = [
+            Block(uid=BlockUid(i + 1, i + 100), size=BLOB_SIZE, checksum='0000000000000000') for i in range(NUM_BLOBS)
+        ]
+        for block in blocks:
+            self.storage.write_block(block, self.random_bytes(BLOB_SIZE))
+        version_uid = VersionUid('v1')
+        self.storage.write_version(version_uid, 'Hallo')
+        self.storage.write_version(version_uid, 'Hallo Welt', overwrite=True)
+
+        self.assertEqual(self.storage.storage_stats(), self.storage.pop_usage())
+        self.assertEqual((0, 0), self.storage.pop_usage())
+
+        objects_count, objects_size = self.storage.storage_stats()
+        for block in blocks:
+            self.storage.rm_block(block.uid)
+        self.storage.rm_version(version_uid)
+        self.assertEqual((-objects_count, -objects_size), self.storage.pop_usage())
+
+    def test_usage_async(self):
+        NUM_BLOBS = 15
+        BLOB_SIZE = 4096
+
+        self.assertEqual((0, 0), self.storage.pop_usage())
+
+        blocks = [
+            Block(uid=BlockUid(i + 1, i + 100), size=BLOB_SIZE, checksum='0000000000000000') for i in range(NUM_BLOBS)
+        ]
+        for block in blocks:
+            self.storage.write_block_async(block, self.random_bytes(BLOB_SIZE))
+        self.storage.wait_writes_finished()
+        for entry in self.storage.write_get_completed():
+            self.assertNotIsInstance(entry, Exception)
+
+        objects_count, objects_size = self.storage.storage_stats()
+        self.assertEqual((objects_count, objects_size), self.storage.pop_usage())
+
+        for block in blocks:
+            self.storage.rm_block_async(block.uid)
+        for entry in self.storage.rm_get_completed():
+            self.assertNotIsInstance(entry, Exception)
+        self.assertEqual((-objects_count, -objects_size), self.storage.pop_usage())
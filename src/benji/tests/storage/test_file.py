@@ -1,5 +1,7 @@
+import os
 from unittest import TestCase
 
+from benji.database import Block, BlockUid
 from . import StorageTestCase
 
 
@@ -16,6 +18,7 @@ class StorageTestFile(StorageTestCase, TestCase):
             configuration:
               path: {testpath}/data
               consistencyCheckWrites: True
+              recordObjectChecksums: True
               hmac:
                 password: geheim12345
                 kdfIterations: 1000
@@ -25,3 +28,109 @@ class StorageTestFile(StorageTestCase, TestCase):
             - name: file
               module: file              
         """
+
+
+class StorageTestFileGroupCommit(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: file
+            configuration:
+              path: {testpath}/data
+              consistencyCheckWrites: True
+              recordObjectChecksums: True
+              simultaneousWrites: 10
+              groupCommit: True
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    def test_group_commit_block(self):
+        batches = []
+        commit_batch = self.storage._group_committer._commit_batch
+
+        def recording_commit_batch(batch):
+            batches.append([os.path.basename(staged.filename) for staged in batch])
+            commit_batch(batch)
+
+        self.storage._group_committer._commit_batch = recording_commit_batch
+        block = Block(uid=BlockUid(1, 100), size=4096, checksum='0000000000000000')
+        data = self.random_bytes(4096)
+        self.storage.write_block(block, data)
+        # The data and metadata objects of a block are committed in a single batch
+        self.assertEqual(1, len(batches))
+        self.assertEqual(['0000000000000001-0000000000000064', '0000000000000001-0000000000000064.meta'], batches[0])
+        self.assertEqual(data, self.storage.read_block(block))
+
+        self.storage.rm_block(block.uid)
+
+
+class StorageTestFileGroupCommitSyncfs(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: file
+            configuration:
+              path: {testpath}/data
+              simultaneousWrites: 10
+              groupCommit: True
+              groupCommitMethod: syncfs
+
+        ios:
+            - name: file
+              module: file
+        """
+
+
+class StorageTestFileParallelListing(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: file
+            configuration:
+              path: {testpath}/data
+              simultaneousListings: 8
+
+        ios:
+            - name: file
+              module: file
+        """
+
+
+class StorageTestFileChecksum(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: file
+            configuration:
+              path: {testpath}/data
+              consistencyCheckWrites: True
+              recordObjectChecksums: True
+              consistencyCheckWritesMethod: checksum
+
+        ios:
+            - name: file
+              module: file
+        """
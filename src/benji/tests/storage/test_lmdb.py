@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+from . import StorageTestCase
+
+
+class StorageTestLMDB(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: lmdb
+            configuration:
+              path: {testpath}/data
+              mapSize: 1073741824
+              consistencyCheckWrites: True
+              recordObjectChecksums: True
+              hmac:
+                password: geheim12345
+                kdfIterations: 1000
+                kdfSalt: BBiZ+lIVSefMCdE4eOPX211n/04KY1M4c2SM/9XHUcA=
+
+        ios:
+            - name: file
+              module: file
+        """
+
+
+class StorageTestLMDBNoSync(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: lmdb
+            configuration:
+              path: {testpath}/data
+              mapSize: 1073741824
+              sync: False
+              simultaneousListings: 4
+
+        ios:
+            - name: file
+              module: file
+        """
@@ -2,6 +2,9 @@ import os
 import unittest
 from unittest import TestCase
 
+from benji.database import Block, BlockUid
+from benji.factory import StorageFactory
+from benji.storage.readcache import ReadCacheMode
 from . import StorageTestCase
 
 
@@ -24,6 +27,7 @@ class test_s3(StorageTestCase, TestCase):
             addressingStyle: path
             disableEncodingType: true
             consistencyCheckWrites: True
+            recordObjectChecksums: True
             simultaneousWrites: 5
             simultaneousReads: 5
             activeTransforms:
@@ -51,3 +55,231 @@ class test_s3(StorageTestCase, TestCase):
             - name: file
               module: file                  
         """
+
+
+@unittest.skipIf(os.environ.get('UNITTEST_SKIP_S3', False), 'No S3 setup available.')
+class test_s3_read_cache(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: s1
+
+        storages:
+        - name: s1
+          module: s3
+          configuration:
+            awsAccessKeyId: minio
+            awsSecretAccessKey: minio123
+            endpointUrl: http://127.0.0.1:9901/
+            bucketName: benji
+            addressingStyle: path
+            disableEncodingType: true
+            simultaneousWrites: 5
+            simultaneousReads: 5
+            activeTransforms:
+              - zstd
+            readCache:
+              directory: {testpath}/read-cache
+              maximumSize: 16777216
+              shards: 4
+              memoryMaximumSize: 65536
+
+        transforms:
+        - name: zstd
+          module: zstd
+          configuration:
+            level: 1
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    def test_read_cache_tiers(self):
+        NUM_BLOBS = 32
+        BLOB_SIZE = 4096
+
+        blocks = [
+            Block(uid=BlockUid(i + 1, i + 100), size=BLOB_SIZE, checksum='0000000000000000') for i in range(NUM_BLOBS)
+        ]
+        data_by_uid = {}
+        for block in blocks:
+            data = self.random_bytes(BLOB_SIZE)
+            self.storage.write_block(block, data)
+            data_by_uid[block.uid] = data
+
+        # First pass fills both tiers, the memory tier only holds the most recently used blocks
+        for block in blocks:
+            self.assertEqual(data_by_uid[block.uid], self.storage.read_block(block))
+        stats = self.storage.read_cache_stats()
+        self.assertEqual(0, stats['memory']['hits'])
+        self.assertEqual(0, stats['disk']['hits'])
+        self.assertLessEqual(stats['memory']['objects_size'], 65536)
+        self.assertLess(stats['memory']['objects_count'], NUM_BLOBS)
+
+        # Most recently used blocks are served from memory
+        for block in reversed(blocks[-4:]):
+            self.assertEqual(data_by_uid[block.uid], self.storage.read_block(block))
+        stats = self.storage.read_cache_stats()
+        self.assertEqual(4, stats['memory']['hits'])
+        self.assertEqual(0, stats['disk']['hits'])
+
+        # Evicted blocks are served from disk and promoted to memory
+        self.assertEqual(data_by_uid[blocks[0].uid], self.storage.read_block(blocks[0]))
+        self.assertEqual(data_by_uid[blocks[0].uid], self.storage.read_block(blocks[0]))
+        stats = self.storage.read_cache_stats()
+        self.assertEqual(5, stats['memory']['hits'])
+        self.assertEqual(1, stats['disk']['hits'])
+
+        # The counters are kept in the disk cache directory and are available to later processes
+        StorageFactory.close()
+        StorageFactory.initialize(self.config)
+        self.storage = StorageFactory.get_by_name('s1')
+        stats = self.storage.read_cache_stats()
+        self.assertEqual(0, stats['memory']['objects_count'])
+        self.assertEqual(5, stats['memory']['hits'])
+        self.assertEqual(1, stats['disk']['hits'])
+        self.assertEqual(NUM_BLOBS, stats['disk']['misses'])
+
+        for block in blocks:
+            self.storage.rm_block(block.uid)
+
+    def test_read_cache_modes(self):
+        BLOB_SIZE = 4096
+
+        blocks = [Block(uid=BlockUid(i + 1, i + 100), size=BLOB_SIZE, checksum='0000000000000000') for i in range(4)]
+        for block in blocks:
+            self.storage.write_block(block, self.random_bytes(BLOB_SIZE))
+
+        self.storage.read_block(blocks[0], read_cache_mode=ReadCacheMode.bypass)
+        self.storage.read_block(blocks[0], read_cache_mode=ReadCacheMode.read_only)
+        stats = self.storage.read_cache_stats()
+        self.assertEqual(0, stats['memory']['objects_count'])
+        self.assertEqual(0, stats['disk']['objects_count'])
+        self.assertEqual(1, stats['memory']['misses'])
+
+        self.storage.read_block(blocks[1], read_cache_mode=ReadCacheMode.write_only)
+        stats = self.storage.read_cache_stats()
+        self.assertEqual(1, stats['memory']['objects_count'])
+        self.assertEqual(2, stats['disk']['objects_count'])  # Data and metadata
+        self.assertEqual(1, stats['memory']['misses'])
+
+        self.storage.read_block(blocks[1], read_cache_mode=ReadCacheMode.read_only)
+        self.storage.read_block(blocks[1], read_cache_mode=ReadCacheMode.bypass)
+        stats = self.storage.read_cache_stats()
+        self.assertEqual(1, stats['memory']['hits'])
+
+        for block in blocks:
+            self.storage.rm_block(block.uid)
+
+
+@unittest.skipIf(os.environ.get('UNITTEST_SKIP_S3', False), 'No S3 setup available.')
+class test_s3_checksum(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: s1
+
+        storages:
+        - name: s1
+          module: s3
+          configuration:
+            awsAccessKeyId: minio
+            awsSecretAccessKey: minio123
+            endpointUrl: http://127.0.0.1:9901/
+            bucketName: benji
+            addressingStyle: path
+            disableEncodingType: true
+            consistencyCheckWrites: True
+            recordObjectChecksums: True
+            consistencyCheckWritesMethod: checksum
+            consistencyCheckWritesSampleRate: 0
+            simultaneousWrites: 5
+            simultaneousReads: 5
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    def test_checksum_read_back(self):
+        read_backs = []
+        check_written = self.storage._check_written
+
+        def counting_check_written(**kwargs):
+            read_backs.append(kwargs['key'])
+            check_written(**kwargs)
+
+        self.storage._check_written = counting_check_written
+        blocks = [Block(uid=BlockUid(i + 1, i + 100), size=4096, checksum='0000000000000000') for i in range(10)]
+        for block in blocks:
+            self.storage.write_block(block, self.random_bytes(4096))
+        self.assertEqual(0, len(read_backs))
+
+        self.storage._consistency_check_writes_sample_rate = 1
+        for block in blocks:
+            self.storage.write_block(block, self.random_bytes(4096))
+        self.assertEqual(len(blocks), len(read_backs))
+
+        for block in blocks:
+            self.storage.rm_block(block.uid)
+
+
+@unittest.skipIf(os.environ.get('UNITTEST_SKIP_S3', False), 'No S3 setup available.')
+class test_s3_multipart(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: s1
+
+        storages:
+        - name: s1
+          module: s3
+          configuration:
+            awsAccessKeyId: minio
+            awsSecretAccessKey: minio123
+            endpointUrl: http://127.0.0.1:9901/
+            bucketName: benji
+            addressingStyle: path
+            disableEncodingType: true
+            consistencyCheckWrites: True
+            recordObjectChecksums: True
+            consistencyCheckWritesMethod: checksum
+            simultaneousWrites: 2
+            simultaneousReads: 2
+            multipartThreshold: 5242880
+            multipartPartSize: 5242880
+            rangedReadPartSize: 1048576
+            transferParallelism: 3
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    def test_large_objects(self):
+        BLOB_SIZE = 12 * 1024 * 1024
+
+        blocks = [Block(uid=BlockUid(i + 1, i + 100), size=BLOB_SIZE, checksum='0000000000000000') for i in range(2)]
+        data_by_uid = {}
+        for block in blocks:
+            data = os.urandom(BLOB_SIZE)
+            self.storage.write_block_async(block, data)
+            data_by_uid[block.uid] = data
+        for result in self.storage.write_get_completed():
+            if isinstance(result, Exception):
+                raise result
+
+        for block in blocks:
+            key = block.uid.storage_object_to_path()
+            object = self.storage._local.bucket.Object(key)
+            object.load()
+            # Multipart uploads have an ETag with the number of parts as suffix
+            self.assertTrue(object.e_tag.strip('"').endswith('-3'))
+            self.assertEqual(data_by_uid[block.uid], self.storage.read_block(block))
+
+        for block in blocks:
+            self.storage.rm_block(block.uid)
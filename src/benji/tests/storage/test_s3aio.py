@@ -0,0 +1,157 @@
+import os
+import unittest
+from unittest import TestCase
+
+from benji.database import Block, BlockUid
+from . import StorageTestCase
+
+
+@unittest.skipIf(os.environ.get('UNITTEST_SKIP_S3', False), 'No S3 setup available.')
+class test_s3aio(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://        
+        defaultStorage: s1
+        
+        storages:
+        - name: s1
+          module: s3aio
+          configuration:
+            awsAccessKeyId: minio
+            awsSecretAccessKey: minio123
+            endpointUrl: http://127.0.0.1:9901/
+            bucketName: benji
+            addressingStyle: path
+            disableEncodingType: true
+            consistencyCheckWrites: True
+            recordObjectChecksums: True
+            simultaneousWrites: 50
+            simultaneousReads: 50
+            maxPoolConnections: 50
+            activeTransforms:
+              - zstd
+              - k1
+              - k2
+        
+        transforms:
+        - name: zstd
+          module: zstd
+          configuration:
+            level: 1
+        - name: k1
+          module: aes_256_gcm
+          configuration:
+            masterKey: VPSQYIyD+dfLIRBTYJlGziu1hsT2eNFXnEuvl6jM/m8=
+        - name: k2
+          module: aes_256_gcm
+          configuration:
+            kdfSalt: BBiZ+lIVSefMCdE4eOPX211n/04KY1M4c2SM/9XHUcA=
+            kdfIterations: 20000
+            password: "this is a very secret password"
+            
+        ios:
+            - name: file
+              module: file                  
+        """
+
+
+@unittest.skipIf(os.environ.get('UNITTEST_SKIP_S3', False), 'No S3 setup available.')
+class test_s3aio_checksum(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://        
+        defaultStorage: s1
+        
+        storages:
+        - name: s1
+          module: s3aio
+          configuration:
+            awsAccessKeyId: minio
+            awsSecretAccessKey: minio123
+            endpointUrl: http://127.0.0.1:9901/
+            bucketName: benji
+            addressingStyle: path
+            disableEncodingType: true
+            consistencyCheckWrites: True
+            recordObjectChecksums: True
+            consistencyCheckWritesMethod: checksum
+            consistencyCheckWritesSampleRate: 0.5
+            simultaneousWrites: 50
+            simultaneousReads: 50
+            maxPoolConnections: 50
+            activeTransforms:
+              - zstd
+              - k1
+              - k2
+        
+        transforms:
+        - name: zstd
+          module: zstd
+          configuration:
+            level: 1
+        - name: k1
+          module: aes_256_gcm
+          configuration:
+            masterKey: VPSQYIyD+dfLIRBTYJlGziu1hsT2eNFXnEuvl6jM/m8=
+        - name: k2
+          module: aes_256_gcm
+          configuration:
+            kdfSalt: BBiZ+lIVSefMCdE4eOPX211n/04KY1M4c2SM/9XHUcA=
+            kdfIterations: 20000
+            password: "this is a very secret password"
+            
+        ios:
+            - name: file
+              module: file                  
+        """
+
+
+@unittest.skipIf(os.environ.get('UNITTEST_SKIP_S3', False), 'No S3 setup available.')
+class test_s3aio_hedged_reads(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: s1
+
+        storages:
+        - name: s1
+          module: s3aio
+          configuration:
+            awsAccessKeyId: minio
+            awsSecretAccessKey: minio123
+            endpointUrl: http://127.0.0.1:9901/
+            bucketName: benji
+            addressingStyle: path
+            disableEncodingType: true
+            simultaneousWrites: 10
+            simultaneousReads: 10
+            maxPoolConnections: 20
+            hedgedReads:
+              delay: 1
+              maximumRate: 1
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    def test_hedged_reads_async(self):
+        blocks = [Block(uid=BlockUid(1, i + 1), size=4096, checksum='0000000000000000') for i in range(10)]
+        data_by_uid = {}
+        for block in blocks:
+            data_by_uid[block.uid] = self.random_bytes(4096)
+            self.storage.write_block(block, data_by_uid[block.uid])
+
+        for block in blocks:
+            self.storage.read_block_async(block)
+        for entry in self.storage.read_get_completed():
+            self.assertNotIsInstance(entry, Exception)
+            block, data, _ = entry
+            self.assertEqual(data_by_uid[block.uid], data)
+        self.assertEqual(len(blocks), self.storage._read_hedger.stats()['requests'])
+
+        for block in blocks:
+            self.storage.rm_block(block.uid)
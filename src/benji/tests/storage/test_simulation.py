@@ -0,0 +1,86 @@
+import time
+from unittest import TestCase
+
+from benji.database import Block, BlockUid
+from benji.factory import StorageFactory
+from benji.storage.simulation import SimulatedError
+from . import StorageTestCase
+
+
+class StorageTestSimulation(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: simulation
+            configuration:
+              storage: storage-2
+              simultaneousReads: 8
+              simultaneousWrites: 8
+              latency:
+                distribution: lognormal
+                mean: 0.002
+                standardDeviation: 0.001
+                maximum: 0.01
+              seed: 42
+          - name: storage-2
+            module: memory
+          - name: storage-3
+            module: simulation
+            configuration:
+              storage: storage-2
+              latency:
+                distribution: constant
+                mean: 0.05
+              errorRate: 1
+              seed: 42
+          - name: storage-4
+            module: simulation
+            configuration:
+              storage: storage-2
+              simultaneousReads: 4
+              latency:
+                distribution: uniform
+                minimum: 0
+                maximum: 0.1
+              seed: 42
+              hedgedReads:
+                delay: 20
+                maximumRate: 1
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    def test_objects_in_wrapped_storage(self):
+        block = Block(uid=BlockUid(1, 2), size=16, checksum='0000000000000000')
+        self.storage.write_block(block, b'0123456789abcdef')
+        wrapped_storage = StorageFactory.get_by_name('storage-2')
+        self.assertEqual([block.uid], list(wrapped_storage.list_blocks()))
+        self.storage.rm_block(block.uid)
+
+    def test_errors_and_latency(self):
+        storage = StorageFactory.get_by_name('storage-3')
+        block = Block(uid=BlockUid(1, 2), size=16, checksum='0000000000000000')
+        t1 = time.time()
+        self.assertRaises(SimulatedError, lambda: storage.write_block(block, b'0123456789abcdef'))
+        self.assertGreaterEqual(time.time() - t1, 0.05)
+        self.assertEqual([], list(storage.list_blocks()))
+
+    def test_hedged_reads(self):
+        storage = StorageFactory.get_by_name('storage-4')
+        blocks = [Block(uid=BlockUid(1, i + 1), size=16, checksum='0000000000000000') for i in range(10)]
+        for block in blocks:
+            storage.write_block(block, b'0123456789abcdef')
+        for block in blocks:
+            self.assertEqual(b'0123456789abcdef', storage.read_block(block))
+        stats = storage._read_hedger.stats()
+        self.assertEqual(len(blocks), stats['requests'])
+        self.assertGreater(stats['hedged'], 0)
+        for block in blocks:
+            storage.rm_block(block.uid)
@@ -0,0 +1,61 @@
+from unittest import TestCase
+
+from benji.database import Block, BlockUid
+from benji.factory import StorageFactory
+from . import StorageTestCase
+
+
+class StorageTestStriping(StorageTestCase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: striping
+            configuration:
+              storages:
+                - storage-2
+                - storage-3
+                - storage-4
+              consistencyCheckWrites: True
+              recordObjectChecksums: True
+              simultaneousReads: 8
+              simultaneousWrites: 8
+          - name: storage-2
+            module: memory
+          - name: storage-3
+            module: memory
+          - name: storage-4
+            module: memory
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    def test_objects_spread_over_stripes(self):
+        blocks = [Block(uid=BlockUid(1, i + 1), size=16, checksum='0000000000000000') for i in range(64)]
+        for block in blocks:
+            self.storage.write_block(block, b'0123456789abcdef')
+
+        stripe_uids = []
+        for name in ('storage-2', 'storage-3', 'storage-4'):
+            stripe = StorageFactory.get_by_name(name)
+            uids = set(stripe.list_blocks())
+            self.assertGreater(len(uids), 0)
+            # The metadata object of each block is stored next to its data object
+            self.assertEqual(2 * len(uids), len(list(stripe._list_objects(BlockUid.storage_prefix()))))
+            stripe_uids.append(uids)
+        self.assertEqual(set(block.uid for block in blocks), set.union(*stripe_uids))
+        self.assertEqual(len(blocks), sum(len(uids) for uids in stripe_uids))
+
+        objects_count, objects_size = self.storage.storage_stats()
+        self.assertEqual(2 * len(blocks), objects_count)
+
+        for block in blocks:
+            self.assertEqual(b'0123456789abcdef', self.storage.read_block(block))
+            self.storage.rm_block(block.uid)
+        self.assertEqual([], list(self.storage.list_blocks()))
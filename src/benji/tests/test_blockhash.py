@@ -1,5 +1,7 @@
 from unittest import TestCase
 
+from benji.exception import ConfigurationError
+from benji.tests.testcase import BenjiTestCaseBase
 from benji.utils import BlockHash
 
 
@@ -19,3 +21,66 @@ class BlockHashTestCase(TestCase):
         bh = BlockHash('BLAKE2b,digest_bits=256')
         self.assertEqual('90cccd774db0ac8c6ea2deff0e26fc52768a827c91c737a2e050668d8c39c224',
                          bh.data_hexdigest(b'test123'))
+
+    def test_hashlib_equivalent(self):
+        for hash_function_config in ('SHA512', 'SHA256', 'BLAKE2b,digest_bits=256', 'BLAKE2s,digest_bits=128'):
+            bh = BlockHash(hash_function_config)
+            bh_pycryptodome = BlockHash('pycryptodome:' + hash_function_config)
+            self.assertEqual('hashlib', bh.backend)
+            self.assertEqual('pycryptodome', bh_pycryptodome.backend)
+            self.assertEqual(bh_pycryptodome.data_hexdigest(b'test123'), bh.data_hexdigest(b'test123'))
+
+        # Arguments without a hashlib counterpart keep the pycryptodome implementation
+        self.assertEqual('pycryptodome', BlockHash("SHA512,truncate='256'").backend)
+        self.assertEqual('pycryptodome', BlockHash("BLAKE2b,digest_bits=256,key=b'secret'").backend)
+
+    def test_hashlib(self):
+        bh = BlockHash('hashlib:blake2b,digest_size=32')
+        self.assertEqual('90cccd774db0ac8c6ea2deff0e26fc52768a827c91c737a2e050668d8c39c224',
+                         bh.data_hexdigest(b'test123'))
+
+    def test_blake3(self):
+        bh = BlockHash('blake3:blake3')
+        self.assertEqual('e3428f2c4089c278544c4827529dee5c82cdb368dbf6013e576d5ddc179c2bec',
+                         bh.data_hexdigest(b'test123'))
+
+    def test_xxh3(self):
+        bh = BlockHash('xxhash:xxh3_128')
+        self.assertEqual('b942b6501e6239db286d718b953260ce', bh.data_hexdigest(b'test123'))
+
+    def test_invalid(self):
+        for hash_function_config in ('SHA999', 'unknown:sha256', 'hashlib:unknown', 'hashlib:_hashlib',
+                                     'hashlib:shake_128', 'hashlib:sha256,unknown=1', 'BLAKE2b,digest_bits=1024'):
+            self.assertRaises(ConfigurationError, lambda: BlockHash(hash_function_config))
+
+
+class HashBenchmarkTestCase(BenjiTestCaseBase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite:///{testpath}/benji.sqlite
+        blockSize: 65536
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: memory
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    def test_hash_benchmark(self):
+        benji_obj = self.benjiOpen(init_database=True)
+        results = benji_obj.hash_benchmark(None, samples=4, threads=[1, 2])
+        self.assertRaises(ConfigurationError, lambda: benji_obj.hash_benchmark(['unknown:sha256'], samples=4))
+        benji_obj.close()
+
+        self.assertEqual('BLAKE2b,digest_bits=256', list(results.keys())[0])
+        for hash_function, result in results.items():
+            self.assertEqual('blake2b' in hash_function.lower(), result['compatible'])
+            self.assertEqual([1, 2], [thread_result['threads'] for thread_result in result['threads']])
+            for thread_result in result['threads']:
+                self.assertGreater(thread_result['speed'], 0)
+                self.assertGreater(thread_result['cpu_speed'], 0)
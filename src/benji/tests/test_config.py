@@ -167,7 +167,14 @@ class ConfigTestCase(TestCaseBase, TestCase):
                 'bandwidthRead': 0,
                 'bandwidthWrite': 0,
                 'consistencyCheckWrites': False,
+                'consistencyCheckWritesMethod': 'readBack',
+                'consistencyCheckWritesSampleRate': 0.01,
+                'groupCommit': False,
+                'groupCommitMethod': 'fdatasync',
+                'listingShardLevels': 1,
                 'path': '/var/tmp',
+                'recordObjectChecksums': False,
+                'simultaneousListings': 1,
                 'simultaneousReads': 3,
                 'simultaneousWrites': 3,
                 'simultaneousRemovals': 5,
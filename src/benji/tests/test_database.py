@@ -458,6 +458,32 @@ class DatabaseBackendTestCase(DatabaseBackendTestCaseBase):
                                                            block_size=4 * 1024 * 4096)
             self.assertEqual(math.ceil(version.size / version.block_size), version.blocks_count)
 
+    def test_storage_usage(self):
+        self.database_backend.sync_storage('s-1', storage_id=1)
+        storage = self.database_backend.get_storage_by_name('s-1')
+        self.assertIsNone(storage.objects_count)
+        self.assertIsNone(storage.objects_size)
+
+        # Unknown statistics stay unknown
+        self.database_backend.update_storage_usage('s-1', objects_count=2, objects_size=100)
+        self.database_backend.commit()
+        self.database_backend._session.refresh(storage)
+        self.assertIsNone(storage.objects_count)
+        self.assertIsNone(storage.objects_size)
+
+        self.database_backend.set_storage_usage('s-1', objects_count=10, objects_size=1000)
+        self.database_backend._session.refresh(storage)
+        self.assertEqual(10, storage.objects_count)
+        self.assertEqual(1000, storage.objects_size)
+        self.assertIsNotNone(storage.stats_reconciled)
+
+        self.database_backend.update_storage_usage('s-1', objects_count=2, objects_size=100)
+        self.database_backend.update_storage_usage('s-1', objects_count=-4, objects_size=-300)
+        self.database_backend.commit()
+        self.database_backend._session.refresh(storage)
+        self.assertEqual(8, storage.objects_count)
+        self.assertEqual(800, storage.objects_size)
+
 
 class DatabaseBackendTestSQLLite(DatabaseBackendTestCase, TestCase):
 
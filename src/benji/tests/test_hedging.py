@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase
+
+from benji.storage.hedging import LatencyTracker, HedgingBudget, ReadHedger
+
+
+class LatencyTrackerTestCase(TestCase):
+
+    def test_percentile(self):
+        tracker = LatencyTracker(90)
+        for i in range(LatencyTracker._MINIMUM_SAMPLES - 1):
+            tracker.add(i)
+        self.assertIsNone(tracker.value)
+        tracker.add(LatencyTracker._MINIMUM_SAMPLES - 1)
+        self.assertEqual(44, tracker.value)
+
+        for i in range(LatencyTracker._WINDOW):
+            tracker.add(i % 100)
+        self.assertEqual(89, tracker.value)
+
+
+class HedgingBudgetTestCase(TestCase):
+
+    def test_rate(self):
+        budget = HedgingBudget(0.25)
+        for _ in range(HedgingBudget._BURST):
+            self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        for _ in range(4):
+            budget.deposit()
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+
+    def test_disabled(self):
+        budget = HedgingBudget(0)
+        budget.deposit()
+        self.assertFalse(budget.withdraw())
+
+
+class ReadHedgerTestCase(TestCase):
+
+    def setUp(self):
+        self.hedger = ReadHedger(name='Test-Hedger', workers=4, delay=0.01, percentile=95, maximum_rate=0.5)
+
+    def tearDown(self):
+        self.hedger.shutdown()
+
+    def test_fast_request(self):
+        self.assertEqual(42, self.hedger.call(lambda: 42))
+        self.assertEqual({'requests': 1, 'hedged': 0, 'hedge_wins': 0, 'budget_exhausted': 0}, self.hedger.stats())
+
+    def test_hedge_wins(self):
+        calls = []
+        lock = threading.Lock()
+
+        def request():
+            with lock:
+                calls.append(None)
+                first = len(calls) == 1
+            if first:
+                time.sleep(0.5)
+                return 'primary'
+            return 'hedge'
+
+        t1 = time.monotonic()
+        self.assertEqual('hedge', self.hedger.call(request))
+        self.assertLess(time.monotonic() - t1, 0.5)
+        self.assertEqual({'requests': 1, 'hedged': 1, 'hedge_wins': 1, 'budget_exhausted': 0}, self.hedger.stats())
+
+    def test_failed_primary(self):
+        calls = []
+        lock = threading.Lock()
+
+        def request():
+            with lock:
+                calls.append(None)
+                first = len(calls) == 1
+            if first:
+                time.sleep(0.05)
+                raise IOError('Primary failed')
+            time.sleep(0.1)
+            return 'hedge'
+
+        self.assertEqual('hedge', self.hedger.call(request))
+
+    def test_both_failed(self):
+
+        def request():
+            time.sleep(0.02)
+            raise IOError('Failed')
+
+        self.assertRaises(IOError, lambda: self.hedger.call(request))
+
+    def test_budget_exhausted(self):
+        hedger = ReadHedger(name='Test-Hedger', workers=4, delay=0.001, percentile=95, maximum_rate=0)
+        try:
+            self.assertEqual(1, hedger.call(lambda: time.sleep(0.01) or 1))
+            self.assertEqual({'requests': 1, 'hedged': 0, 'hedge_wins': 0, 'budget_exhausted': 1}, hedger.stats())
+        finally:
+            hedger.shutdown()
+
+    def test_async_hedge_wins(self):
+        calls = []
+
+        async def request():
+            calls.append(None)
+            if len(calls) == 1:
+                await asyncio.sleep(0.5)
+                return 'primary'
+            return 'hedge'
+
+        t1 = time.monotonic()
+        self.assertEqual('hedge', asyncio.run(self.hedger.call_async(request)))
+        self.assertLess(time.monotonic() - t1, 0.5)
+        self.assertEqual({'requests': 1, 'hedged': 1, 'hedge_wins': 1, 'budget_exhausted': 0}, self.hedger.stats())
+
+    def test_async_failed_primary(self):
+        calls = []
+
+        async def request():
+            calls.append(None)
+            if len(calls) == 1:
+                await asyncio.sleep(0.05)
+                raise IOError('Primary failed')
+            await asyncio.sleep(0.1)
+            return 'hedge'
+
+        self.assertEqual('hedge', asyncio.run(self.hedger.call_async(request)))
+
+    def test_async_both_failed(self):
+
+        async def request():
+            await asyncio.sleep(0.02)
+            raise IOError('Failed')
+
+        self.assertRaises(IOError, lambda: asyncio.run(self.hedger.call_async(request)))
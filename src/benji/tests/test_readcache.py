@@ -0,0 +1,102 @@
+from unittest import TestCase
+
+from benji.storage.readcache import MemoryReadCache, FrequencySketch, ReadCacheAdmission, ReadCacheMode
+
+
+class MemoryReadCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.entry_size = 1024
+        self.cache = MemoryReadCache(4 * (self.entry_size + MemoryReadCache._ENTRY_OVERHEAD))
+
+    def test_lru_eviction(self):
+        for i in range(4):
+            self.cache.set(f'key-{i}', bytes(self.entry_size), {'i': i})
+        self.assertEqual(4, len(self.cache))
+
+        # Use key-0, so that key-1 becomes the least recently used entry
+        self.assertIsNotNone(self.cache.get('key-0', metadata_only=False))
+        self.cache.set('key-4', bytes(self.entry_size), {'i': 4})
+        self.assertEqual(4, len(self.cache))
+        self.assertIsNone(self.cache.get('key-1', metadata_only=False))
+        for i in (0, 2, 3, 4):
+            data, metadata = self.cache.get(f'key-{i}', metadata_only=False)
+            self.assertEqual(self.entry_size, len(data))
+            self.assertEqual({'i': i}, metadata)
+        self.assertLessEqual(self.cache.size, 4 * (self.entry_size + MemoryReadCache._ENTRY_OVERHEAD))
+        self.assertEqual((5, 1), self.cache.stats())
+
+    def test_metadata_only(self):
+        self.cache.set('key', None, {'a': 1})
+        self.assertIsNone(self.cache.get('key', metadata_only=False))
+        self.assertEqual((None, {'a': 1}), self.cache.get('key', metadata_only=True))
+
+        self.cache.set('key', b'data', {'a': 1})
+        self.assertEqual((b'data', {'a': 1}), self.cache.get('key', metadata_only=False))
+        # A metadata only entry doesn't replace the data
+        self.cache.set('key', None, {'a': 1})
+        self.assertEqual((b'data', {'a': 1}), self.cache.get('key', metadata_only=False))
+
+    def test_oversized(self):
+        self.cache.set('key', bytes(8 * self.entry_size), {})
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(0, self.cache.size)
+
+    def test_admission(self):
+        admission = ReadCacheAdmission('tinyLFU')
+        cache = MemoryReadCache(2 * (self.entry_size + MemoryReadCache._ENTRY_OVERHEAD), admit=admission.admit_memory)
+        for key in ('key-0', 'key-0', 'key-1'):
+            admission.record(key)
+        # Free space is available
+        cache.set('key-0', bytes(self.entry_size), {})
+        cache.set('key-1', bytes(self.entry_size), {})
+        self.assertEqual(2, len(cache))
+
+        # key-2 is less frequent than the victim key-0
+        admission.record('key-2')
+        cache.set('key-2', bytes(self.entry_size), {})
+        self.assertIsNone(cache.get('key-2', metadata_only=False))
+        self.assertEqual(1, cache.rejections)
+
+        for _ in range(3):
+            admission.record('key-2')
+        cache.set('key-2', bytes(self.entry_size), {})
+        self.assertIsNotNone(cache.get('key-2', metadata_only=False))
+        self.assertIsNone(cache.get('key-0', metadata_only=False))
+
+
+class ReadCacheAdmissionTestCase(TestCase):
+
+    def test_frequency_sketch(self):
+        sketch = FrequencySketch(256)
+        for i in range(5):
+            sketch.increment('a')
+        sketch.increment('b')
+        self.assertGreaterEqual(sketch.estimate('a'), 5)
+        self.assertGreaterEqual(sketch.estimate('b'), 1)
+        self.assertLess(sketch.estimate('b'), 5)
+
+        # Aging halves all counters
+        for i in range(10 * 256):
+            sketch.increment(f'key-{i % 64}')
+        self.assertLess(sketch.estimate('a'), 5)
+
+    def test_second_access(self):
+        admission = ReadCacheAdmission('secondAccess')
+        admission.record('a')
+        self.assertFalse(admission.admit_disk('a'))
+        self.assertFalse(admission.admit_memory('a', None))
+        admission.record('a')
+        self.assertTrue(admission.admit_disk('a'))
+        self.assertTrue(admission.admit_memory('a', None))
+
+    def test_always(self):
+        admission = ReadCacheAdmission('always')
+        self.assertTrue(admission.admit_disk('a'))
+        self.assertTrue(admission.admit_memory('a', 'b'))
+
+    def test_modes(self):
+        self.assertTrue(ReadCacheMode.read_through.lookup and ReadCacheMode.read_through.store)
+        self.assertTrue(ReadCacheMode.read_only.lookup and not ReadCacheMode.read_only.store)
+        self.assertTrue(not ReadCacheMode.write_only.lookup and ReadCacheMode.write_only.store)
+        self.assertTrue(not ReadCacheMode.bypass.lookup and not ReadCacheMode.bypass.store)
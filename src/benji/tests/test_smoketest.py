@@ -161,6 +161,11 @@ class SmokeTestCase(BenjiTestCaseBase):
             benji_obj.close()
             logger.debug('Scrub successful')
 
+            benji_obj = self.benjiOpen()
+            benji_obj.scrub(version_uid, storage_verified=True)
+            benji_obj.close()
+            logger.debug('Storage verified scrub successful')
+
             benji_obj = self.benjiOpen()
             benji_obj.deep_scrub(version_uid)
             benji_obj.close()
@@ -216,6 +221,7 @@ class SmokeTestCase(BenjiTestCaseBase):
 
             benji_obj = self.benjiOpen()
             objects_count, objects_size = benji_obj.storage_stats(storage_name)
+            self.assertEqual((objects_count, objects_size), benji_obj.storage_stats(storage_name, reconcile=True))
             benji_obj.close()
             self.assertGreater(objects_count, 0)
             self.assertGreater(objects_size, 0)
@@ -232,9 +238,32 @@ class SmokeTestCase(BenjiTestCaseBase):
                     version_uids.remove(dismissed_version.uid)
                 benji_obj.close()
 
+            if (i % 7) == 0:
+                target_storage_name = 's2' if storage_name == 's1' else 's1'
+                benji_obj = self.benjiOpen()
+                copied_versions = benji_obj.storage_copy('uid == "{}"'.format(version_uid), target_storage_name)
+                self.assertEqual([version_uid], [version.uid for version in copied_versions])
+                benji_obj.close()
+                logger.debug('Storage copy successful')
+
+                restore_filename_copy = os.path.join(testpath, 'restore-copy.{}'.format(i + 1))
+                benji_obj = self.benjiOpen()
+                self.assertEqual(target_storage_name, benji_obj._database_backend.get_version(version_uid).storage.name)
+                benji_obj.deep_scrub(version_uid)
+                benji_obj.restore(version_uid, 'file:' + restore_filename_copy, sparse=False, force=False)
+                benji_obj.close()
+                self.assertTrue(self.same(image_filename, restore_filename_copy))
+                logger.debug('Restore of copied version successful')
+
             if (i % 7) == 0:
                 benji_obj = self.benjiOpen()
                 benji_obj.cleanup(dt=0)
+                for reconcile_storage_name in ('s1', 's2'):
+                    reconcile_result = benji_obj.storage_reconcile(reconcile_storage_name)
+                    self.assertEqual(0, reconcile_result['blocks_missing'])
+                    self.assertEqual(0, reconcile_result['blocks_incomplete'])
+                    self.assertEqual(0, reconcile_result['blocks_orphaned'])
+                    self.assertEqual(0, reconcile_result['blocks_pending_deletion'])
                 benji_obj.close()
             if (i % 13) == 0:
                 scrub_history = BlockUidHistory()
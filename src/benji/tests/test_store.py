@@ -1,5 +1,7 @@
+import errno
 import os
 import random
+import threading
 import unittest
 import uuid
 from unittest import TestCase
@@ -7,6 +9,7 @@ from unittest import TestCase
 from parameterized import parameterized
 
 from benji.benji import BenjiStore
+from benji.factory import StorageFactory
 from benji.tests.testcase import BenjiTestCaseBase
 
 kB = 1024
@@ -65,6 +68,59 @@ class BenjiStoreTestCase(BenjiTestCaseBase):
         store.close(version)
         benji_obj.close()
 
+    def test_read_ahead(self):
+        benji_obj = self.benjiOpen()
+        store = BenjiStore(benji_obj)
+        version = store.get_versions(version_uid=self.version_uid)[0]
+        store.open(version)
+
+        # Random access doesn't trigger any read ahead
+        data = store.read(version, None, 3 * version.block_size, 4096)
+        self.assertEqual(self.image[3 * version.block_size:3 * version.block_size + 4096], data)
+        self.assertEqual((3, 0, 3), store._read_ahead[version.uid])
+
+        image = bytearray()
+        for pos in range(0, self.size, 4096):
+            image = image + store.read(version, None, pos, min(4096, self.size - pos))
+            # The window grows with each sequential block access
+            last_block_idx, window, _ = store._read_ahead[version.uid]
+            if last_block_idx >= 4:
+                self.assertEqual(min(2**(last_block_idx - 1), 8), window)
+        self.assertEqual(self.image, image)
+        self.assertEqual(0, len(store._read_ahead_pending[version.storage.name]))
+
+        store.close(version)
+        benji_obj.close()
+
+    def test_read_ahead_failure(self):
+        benji_obj = self.benjiOpen()
+        store = BenjiStore(benji_obj)
+        version = store.get_versions(version_uid=self.version_uid)[0]
+        storage = StorageFactory.get_by_name(version.storage.name)
+        store.open(version)
+
+        # All read ahead jobs fail with an exception which doesn't reference the block, demand reads succeed
+        read = storage._read
+
+        def failing_read(*args, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                raise OSError(errno.EIO, 'Read ahead failed')
+            return read(*args, **kwargs)
+
+        storage._read = failing_read
+        try:
+            image = bytearray()
+            for pos in range(0, self.size, 4096):
+                image = image + store.read(version, None, pos, min(4096, self.size - pos))
+            self.assertEqual(self.image, image)
+            self.assertEqual(0, len(store._read_ahead_pending[version.storage.name]))
+        finally:
+            del storage._read
+
+        store.close(version)
+        self.assertEqual(0, store._read_ahead_outstanding[version.storage.name])
+        benji_obj.close()
+
     def test_get_cow_version(self):
         benji_obj = self.benjiOpen()
         store = BenjiStore(benji_obj)
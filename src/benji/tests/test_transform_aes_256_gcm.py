@@ -0,0 +1,168 @@
+import base64
+import os
+import uuid
+from unittest import TestCase
+
+from Crypto.Cipher import AES
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import HKDF
+
+from benji.aes_keywrap import aes_wrap_key
+from benji.database import VersionUid, VersionStatus
+from benji.exception import ScrubbingError
+from benji.factory import TransformFactory
+from benji.tests.testcase import TestCaseBase, BenjiTestCaseBase
+
+
+class TransformAES256GCMTestCase(TestCaseBase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: memory
+
+        transforms:
+          - name: k1
+            module: aes_256_gcm
+            configuration:
+              masterKey: K8LHvpiuk37QNuG2JW7DjWa5SQyCxXUGNyK3EOjJqyk=
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    def setUp(self):
+        super().setUp()
+        TransformFactory.initialize(self.config)
+        self.transform = TransformFactory.get_by_name('k1')
+
+    def tearDown(self):
+        TransformFactory.close()
+        super().tearDown()
+
+    def test_roundtrip(self):
+        data = os.urandom(65536)
+        data_encapsulated, materials = self.transform.encapsulate(data=data)
+        self.assertEqual({'salt', 'iv', 'tag'}, set(materials.keys()))
+        self.assertNotEqual(data, data_encapsulated)
+        self.assertEqual(data, self.transform.decapsulate(data=data_encapsulated, materials=materials))
+
+        # Each block gets its own key
+        data_encapsulated_2, materials_2 = self.transform.encapsulate(data=data)
+        self.assertNotEqual(materials['salt'], materials_2['salt'])
+        self.assertNotEqual(data_encapsulated, data_encapsulated_2)
+
+    def test_buffers(self):
+        data = os.urandom(65536)
+        data_encapsulated, materials = self.transform.encapsulate(data=memoryview(data)[:32768])
+        self.assertEqual(data[:32768],
+                         self.transform.decapsulate(data=bytearray(data_encapsulated), materials=materials))
+        self.assertEqual(data[:32768],
+                         self.transform.decapsulate(data=memoryview(data_encapsulated), materials=materials))
+
+    def test_decapsulate_into(self):
+        data = os.urandom(65536)
+        data_encapsulated, materials = self.transform.encapsulate(data=data)
+        output = bytearray(2 * len(data))
+        data_decapsulated = self.transform.decapsulate_into(data=memoryview(data_encapsulated),
+                                                           materials=materials,
+                                                           output=output)
+        self.assertIsInstance(data_decapsulated, memoryview)
+        self.assertEqual(data, data_decapsulated)
+        self.assertEqual(data, output[:len(data)])
+
+        self.assertIsNone(
+            self.transform.decapsulate_into(data=data_encapsulated, materials=materials, output=bytearray(1024)))
+
+    def test_tampered_data(self):
+        data_encapsulated, materials = self.transform.encapsulate(data=b'0123456789abcdef')
+        data_encapsulated = bytes([data_encapsulated[0] ^ 1]) + data_encapsulated[1:]
+        self.assertRaises(ValueError, lambda: self.transform.decapsulate(data=data_encapsulated, materials=materials))
+
+    def test_derive_key(self):
+        master_key = base64.b64decode('K8LHvpiuk37QNuG2JW7DjWa5SQyCxXUGNyK3EOjJqyk=')
+        salt = os.urandom(16)
+        self.assertEqual(HKDF(master_key, 32, salt, SHA256, context=b'benji-aes-256-gcm'),
+                         self.transform._derive_key(salt))
+
+    def test_wrapped_key(self):
+        # Objects written by earlier versions carry a random key wrapped with the master key
+        master_key = base64.b64decode('K8LHvpiuk37QNuG2JW7DjWa5SQyCxXUGNyK3EOjJqyk=')
+        data = os.urandom(65536)
+        envelope_key = os.urandom(32)
+        iv = os.urandom(16)
+        data_encapsulated = AES.new(envelope_key, AES.MODE_GCM, nonce=iv).encrypt(data)
+        materials = {
+            'envelope_key': base64.b64encode(aes_wrap_key(master_key, envelope_key)).decode('ascii'),
+            'iv': base64.b64encode(iv).decode('ascii'),
+        }
+        self.assertEqual(data, self.transform.decapsulate(data=data_encapsulated, materials=materials))
+
+
+class TransformAES256GCMDeepScrubTestCase(BenjiTestCaseBase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite:///{testpath}/benji.sqlite
+        blockSize: 65536
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: file
+            configuration:
+              path: {testpath}/data
+              activeTransforms:
+                - k1
+
+        transforms:
+          - name: k1
+            module: aes_256_gcm
+            configuration:
+              masterKey: K8LHvpiuk37QNuG2JW7DjWa5SQyCxXUGNyK3EOjJqyk=
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    def test_tampered_object(self):
+        image_filename = os.path.join(self.testpath.path, 'image')
+        with open(image_filename, 'wb') as f:
+            f.write(os.urandom(4 * 65536))
+
+        version_uid = VersionUid(str(uuid.uuid4()))
+        benji_obj = self.benjiOpen(init_database=True)
+        benji_obj.backup(version_uid=version_uid,
+                         volume='data-backup',
+                         snapshot='snapshot-name',
+                         source='file:' + image_filename)
+        benji_obj.close()
+
+        object_filenames = [
+            os.path.join(dirpath, filename)
+            for dirpath, _, filenames in os.walk(os.path.join(self.testpath.path, 'data', 'blocks'))
+            for filename in filenames
+            if not filename.endswith('.meta')
+        ]
+        self.assertEqual(4, len(object_filenames))
+        with open(object_filenames[0], 'r+b') as f:
+            data = f.read(1)
+            f.seek(0)
+            f.write(bytes([data[0] ^ 1]))
+
+        # The corrupt block must be marked invalid, the scrub must not be aborted
+        benji_obj = self.benjiOpen()
+        self.assertRaises(ScrubbingError, lambda: benji_obj.deep_scrub(version_uid))
+        self.assertEqual(VersionStatus.invalid, benji_obj._database_backend.get_version(version_uid).status)
+        invalid_blocks = [
+            block for block in benji_obj._database_backend.get_blocks_by_version(
+                benji_obj._database_backend.get_version(version_uid)) if not block.valid
+        ]
+        self.assertEqual(1, len(invalid_blocks))
+        benji_obj.close()
@@ -0,0 +1,108 @@
+import os
+import random
+import uuid
+from unittest import TestCase
+
+from benji.database import VersionUid
+from benji.exception import UsageError
+from benji.factory import StorageFactory, TransformFactory
+from benji.tests.testcase import BenjiTestCaseBase
+
+
+class TransformLZ4TestCase(BenjiTestCaseBase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite:///{testpath}/benji.sqlite
+        blockSize: 65536
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: file
+            configuration:
+              path: {testpath}/data
+              activeTransforms:
+                - lz4
+
+        transforms:
+          - name: lz4
+            module: lz4
+          - name: lz4-hc
+            module: lz4
+            configuration:
+              mode: highCompression
+              level: 12
+          - name: zstd
+            module: zstd
+            configuration:
+              level: 3
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    def test_roundtrip(self):
+        StorageFactory.initialize(self.config)
+        data = b'0123456789abcdef' * 4096
+        for transform_name in ('lz4', 'lz4-hc'):
+            transform = TransformFactory.get_by_name(transform_name)
+            data_encapsulated, materials = transform.encapsulate(data=data)
+            self.assertLess(len(data_encapsulated), len(data))
+            self.assertEqual({'original_size': len(data)}, materials)
+            self.assertEqual(data, transform.decapsulate(data=data_encapsulated, materials=materials))
+
+            self.assertEqual((None, None), transform.encapsulate(data=os.urandom(len(data))))
+
+    def test_benchmark(self):
+        words = [self.random_string(random.randint(3, 10)).encode('ascii') for _ in range(500)]
+        image = b' '.join(random.choice(words) for _ in range(100000)) + os.urandom(65536)
+        image_filename = os.path.join(self.testpath.path, 'image')
+        with open(image_filename, 'wb') as f:
+            f.write(image)
+
+        benji_obj = self.benjiOpen(init_database=True)
+        benji_obj.backup(version_uid=VersionUid(str(uuid.uuid4())),
+                         volume='data-backup',
+                         snapshot='snapshot-name',
+                         source='file:' + image_filename)
+        results = benji_obj.transform_benchmark(['lz4', 'lz4-hc', 'zstd'], None, samples=100)
+        benji_obj.close()
+
+        self.assertEqual(['lz4', 'lz4-hc', 'zstd'], list(results.keys()))
+        for result in results.values():
+            self.assertLess(result['ratio'], 1)
+            self.assertEqual([1], [thread_result['threads'] for thread_result in result['threads']])
+            self.assertGreater(result['threads'][0]['encapsulate_speed'], 0)
+            self.assertGreater(result['threads'][0]['decapsulate_speed'], 0)
+        self.assertLess(results['zstd']['ratio'], results['lz4']['ratio'])
+
+    def test_benchmark_synthetic(self):
+        benji_obj = self.benjiOpen(init_database=True)
+        results = benji_obj.transform_benchmark(None, None, samples=16, threads=[1, 2], synthetic_compressibility=0.5)
+        self.assertRaises(
+            UsageError, lambda: benji_obj.transform_benchmark(
+                None, 'volume == "data-backup"', samples=16, synthetic_compressibility=0.5))
+        benji_obj.close()
+
+        self.assertEqual(['lz4', 'lz4-hc', 'zstd'], list(results.keys()))
+        for result in results.values():
+            # Half of the data is random
+            self.assertGreater(result['ratio'], 0.5)
+            self.assertLess(result['ratio'], 0.95)
+            self.assertEqual([1, 2], [thread_result['threads'] for thread_result in result['threads']])
+            for thread_result in result['threads']:
+                for key in ('encapsulate_speed', 'decapsulate_speed', 'encapsulate_cpu_speed', 'decapsulate_cpu_speed'):
+                    self.assertGreater(thread_result[key], 0)
+
+    def test_benchmark_incompressible(self):
+        benji_obj = self.benjiOpen(init_database=True)
+        results = benji_obj.transform_benchmark(['lz4'], None, samples=4, synthetic_compressibility=0)
+        benji_obj.close()
+
+        # lz4 leaves random data unchanged, so there is nothing to decapsulate
+        thread_result = results['lz4']['threads'][0]
+        self.assertGreater(thread_result['encapsulate_speed'], 0)
+        self.assertIsNone(thread_result['decapsulate_speed'])
+        self.assertIsNone(thread_result['decapsulate_cpu_speed'])
@@ -0,0 +1,199 @@
+import os
+import random
+import uuid
+from unittest import TestCase
+
+import zstandard
+
+from benji.database import VersionUid
+from benji.factory import TransformFactory
+from benji.tests.testcase import TestCaseBase, BenjiTestCaseBase
+from benji.transform.zstd import Transform
+
+
+class TransformZstdTestCase(TestCaseBase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite://
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: memory
+
+        transforms:
+          - name: zstd
+            module: zstd
+            configuration:
+              level: 1
+          - name: zstd-check
+            module: zstd
+            configuration:
+              level: 1
+              incompressibleCheck:
+                sampleSize: 16384
+          - name: zstd-large
+            module: zstd
+            configuration:
+              level: 1
+              largeBlocks:
+                threshold: 1048576
+                threads: 2
+                windowLog: 28
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    BLOCK_SIZE = 256 * 1024
+
+    def setUp(self):
+        super().setUp()
+        TransformFactory.initialize(self.config)
+
+    def tearDown(self):
+        TransformFactory.close()
+        super().tearDown()
+
+    def test_roundtrip(self):
+        transform = TransformFactory.get_by_name('zstd')
+        data = b'0123456789abcdef' * (self.BLOCK_SIZE // 16)
+        data_encapsulated, materials = transform.encapsulate(data=data)
+        self.assertLess(len(data_encapsulated), len(data))
+        self.assertEqual(data, transform.decapsulate(data=data_encapsulated, materials=materials))
+
+        self.assertEqual((None, None), transform.encapsulate(data=os.urandom(self.BLOCK_SIZE)))
+        self.assertEqual({'blocks': 2, 'compressed': 1, 'incompressible': 1, 'sampled': 0, 'skipped': 0},
+                         transform.stats())
+
+    def test_large_blocks(self):
+        transform = TransformFactory.get_by_name('zstd-large')
+        # Repetitions which are further apart than the default window of level 1
+        data = os.urandom(512 * 1024) * 4
+        data_encapsulated, materials = transform.encapsulate(data=data)
+        self.assertLess(len(data_encapsulated), 1024 * 1024)
+        self.assertGreaterEqual(zstandard.get_frame_parameters(data_encapsulated).window_size, len(data))
+        self.assertEqual(data, transform.decapsulate(data=data_encapsulated, materials=materials))
+
+        small_data = b'0123456789abcdef' * 4096
+        data_encapsulated, materials = transform.encapsulate(data=small_data)
+        self.assertLess(zstandard.get_frame_parameters(data_encapsulated).window_size, len(data))
+        self.assertEqual(small_data, transform.decapsulate(data=data_encapsulated, materials=materials))
+
+    def test_incompressible_check(self):
+        transform = TransformFactory.get_by_name('zstd-check')
+        for _ in range(4):
+            self.assertEqual((None, None), transform.encapsulate(data=os.urandom(self.BLOCK_SIZE)))
+        stats = transform.stats()
+        self.assertEqual(4, stats['sampled'])
+        self.assertEqual(4, stats['skipped'])
+
+        data = b'0123456789abcdef' * (self.BLOCK_SIZE // 16)
+        for _ in range(transform._RATIO_HISTORY):
+            data_encapsulated, materials = transform.encapsulate(data=data)
+            self.assertEqual(data, transform.decapsulate(data=data_encapsulated, materials=materials))
+        self.assertEqual(4 + transform._RATIO_HISTORY, transform.stats()['sampled'])
+
+        # All recent blocks were compressible, so the check is skipped until an incompressible block shows up
+        transform.encapsulate(data=data)
+        self.assertEqual((None, None), transform.encapsulate(data=os.urandom(self.BLOCK_SIZE)))
+        self.assertEqual((None, None), transform.encapsulate(data=os.urandom(self.BLOCK_SIZE)))
+        stats = transform.stats()
+        self.assertEqual(5 + transform._RATIO_HISTORY, stats['sampled'])
+        self.assertEqual(5, stats['skipped'])
+        self.assertEqual(1, stats['incompressible'])
+        self.assertEqual(7 + transform._RATIO_HISTORY, stats['blocks'])
+
+
+class TransformTrainDictTestCase(BenjiTestCaseBase, TestCase):
+    CONFIG = """
+        configurationVersion: '1'
+        logFile: /dev/stderr
+        databaseEngine: sqlite:///{testpath}/benji.sqlite
+        blockSize: 65536
+        defaultStorage: storage-1
+
+        storages:
+          - name: storage-1
+            module: file
+            configuration:
+              path: {testpath}/data
+              activeTransforms:
+                - zstd
+
+        transforms:
+          - name: zstd
+            module: zstd
+            configuration:
+              level: 3
+
+        ios:
+            - name: file
+              module: file
+        """
+
+    def _transform(self, **module_configuration):
+        module_configuration = self.config.validate(module='benji.transform.zstd',
+                                                    config=dict(level=3, **module_configuration))
+        return Transform(config=self.config, name='zstd', module_configuration=module_configuration)
+
+    def test_train_dict(self):
+        words = [self.random_string(random.randint(3, 10)).encode('ascii') for _ in range(500)]
+        image = b' '.join(random.choice(words) for _ in range(200000))
+        image_filename = os.path.join(self.testpath.path, 'image')
+        with open(image_filename, 'wb') as f:
+            f.write(image)
+
+        benji_obj = self.benjiOpen(init_database=True)
+        benji_obj.backup(version_uid=VersionUid(str(uuid.uuid4())),
+                         volume='data-backup',
+                         snapshot='snapshot-name',
+                         source='file:' + image_filename)
+        dict_data, report = benji_obj.transform_train_dict(None, 'zstd', dict_size=16384, samples=16)
+        benji_obj.close()
+
+        self.assertEqual(16384, len(dict_data))
+        self.assertEqual(12, report['blocks_training'])
+        self.assertEqual(4, report['blocks_evaluation'])
+        self.assertLess(report['trained']['ratio'], report['current']['ratio'])
+
+        dict_data_file = os.path.join(self.testpath.path, 'zstd.dict')
+        with open(dict_data_file, 'wb') as f:
+            f.write(dict_data)
+
+        data = image[:65536]
+        transform = self._transform(dictDataFile=dict_data_file)
+        data_encapsulated, materials = transform.encapsulate(data=data)
+        self.assertEqual(report['dict_id'], materials['dict_id'])
+        self.assertEqual(data, transform.decapsulate(data=data_encapsulated, materials=materials))
+
+        # After a rotation the old dictionary is still used for existing objects
+        transform = self._transform(previousDictDataFiles=[dict_data_file])
+        self.assertEqual(data, transform.decapsulate(data=data_encapsulated, materials=materials))
+        # Objects written before the dictionary ID was recorded
+        self.assertEqual(data, transform.decapsulate(data=data_encapsulated, materials={'original_size': len(data)}))
+
+        transform = self._transform()
+        self.assertRaises(ValueError, lambda: transform.decapsulate(data=data_encapsulated, materials=materials))
+
+    def test_sample_blocks_distinct(self):
+        image = self.random_bytes(16 * 65536)
+        image_filename = os.path.join(self.testpath.path, 'image')
+        with open(image_filename, 'wb') as f:
+            f.write(image)
+
+        benji_obj = self.benjiOpen(init_database=True)
+        # Both versions reference the same blocks
+        for _ in range(2):
+            benji_obj.backup(version_uid=VersionUid(str(uuid.uuid4())),
+                             volume='data-backup',
+                             snapshot='snapshot-name',
+                             source='file:' + image_filename)
+        for _ in range(20):
+            data_samples = benji_obj._sample_blocks(None, 8)
+            self.assertEqual(8, len(data_samples))
+            self.assertEqual(8, len(set(data_samples)))
+        self.assertEqual(16, len(benji_obj._sample_blocks(None, 32)))
+        benji_obj.close()
@@ -1,17 +1,26 @@
 import base64
-from typing import Dict, Tuple, Optional
+import hashlib
+import hmac
+from typing import Dict, Tuple, Optional, Callable
 
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
 
-from benji.aes_keywrap import aes_wrap_key, aes_unwrap_key
+from benji.aes_keywrap import aes_unwrap_key
 from benji.config import Config, ConfigDict
-from benji.transform.base import TransformBase
+from benji.transform.base import TransformBase, BytesLike
 from benji.utils import derive_key
 
 
 class Transform(TransformBase):
 
+    _HKDF_INFO = b'benji-aes-256-gcm'
+    _SALT_LENGTH = 16
+    _NONCE_LENGTH = 12
+
+    # Newly written objects use a key derived from the master key with HKDF and a random salt for each block. Wrapping a
+    # random envelope key with RFC 3394 (as done by earlier versions) needs many single block AES operations in
+    # Python and is much more expensive. Objects written by earlier versions are still decrypted.
     def __init__(self, *, config: Config, name: str, module_configuration: ConfigDict) -> None:
         super().__init__(config=config, name=name, module_configuration=module_configuration)
 
@@ -30,21 +39,60 @@ class Transform(TransformBase):
 
             self._master_key = derive_key(salt=kdf_salt, iterations=kdf_iterations, key_length=32, password=password)
 
-    def encapsulate(self, *, data: bytes) -> Tuple[Optional[bytes], Optional[Dict]]:
-        envelope_key = get_random_bytes(32)
-        envelope_iv = get_random_bytes(16)
-        encryptor = AES.new(envelope_key, AES.MODE_GCM, nonce=envelope_iv)
+    # HKDF (RFC 5869) with SHA-256. The output fits into a single block, so the expand step consists of only one HMAC.
+    def _derive_key(self, salt: bytes) -> bytes:
+        prk = hmac.new(salt, self._master_key, hashlib.sha256).digest()
+        return hmac.new(prk, self._HKDF_INFO + b'\x01', hashlib.sha256).digest()
 
-        envelope_key = aes_wrap_key(self._master_key, envelope_key)
+    def encapsulate(self, *, data: BytesLike) -> Tuple[Optional[bytes], Optional[Dict]]:
+        salt = get_random_bytes(self._SALT_LENGTH)
+        nonce = get_random_bytes(self._NONCE_LENGTH)
+        encryptor = AES.new(self._derive_key(salt), AES.MODE_GCM, nonce=nonce)
+        data_encapsulated, tag = encryptor.encrypt_and_digest(data)
 
         materials = {
-            'envelope_key': base64.b64encode(envelope_key).decode('ascii'),
-            'iv': base64.b64encode(envelope_iv).decode('ascii'),
+            'salt': base64.b64encode(salt).decode('ascii'),
+            'iv': base64.b64encode(nonce).decode('ascii'),
+            'tag': base64.b64encode(tag).decode('ascii'),
         }
 
-        return encryptor.encrypt(data), materials
+        return data_encapsulated, materials
+
+    def decapsulate(self, *, data: BytesLike, materials: Dict) -> bytes:
+        return self._decryptor(materials=materials)(data, None)
+
+    def decapsulate_into(self, *, data: BytesLike, materials: Dict, output: bytearray) -> Optional[memoryview]:
+        if len(output) < len(data):
+            return None
+        output_view = memoryview(output)[:len(data)]
+        self._decryptor(materials=materials)(data, output_view)
+        return output_view
+
+    # Returns a function which decrypts the data into the given output buffer or into a new bytes object if it is None
+    def _decryptor(self, *, materials: Dict) -> Callable[[BytesLike, Optional[memoryview]], Optional[bytes]]:
+        if 'envelope_key' in materials:
+            return self._wrapped_key_decryptor(materials=materials)
+
+        for key in ['salt', 'iv', 'tag']:
+            if key not in materials:
+                raise KeyError('Encryption materials are missing required key {}.'.format(key))
+
+        salt = base64.b64decode(materials['salt'])
+        nonce = base64.b64decode(materials['iv'])
+        tag = base64.b64decode(materials['tag'])
+
+        if len(salt) != self._SALT_LENGTH:
+            raise ValueError('Encryption materials salt has wrong length of {}. It must be {} bytes long.'.format(
+                len(salt), self._SALT_LENGTH))
+        if len(nonce) != self._NONCE_LENGTH:
+            raise ValueError('Encryption materials IV iv has wrong length of {}. It must be {} bytes long.'.format(
+                len(nonce), self._NONCE_LENGTH))
+
+        decryptor = AES.new(self._derive_key(salt), AES.MODE_GCM, nonce=nonce)
+        return lambda data, output: decryptor.decrypt_and_verify(data, tag, output=output)
 
-    def decapsulate(self, *, data: bytes, materials: Dict) -> bytes:
+    def _wrapped_key_decryptor(self, *,
+                               materials: Dict) -> Callable[[BytesLike, Optional[memoryview]], Optional[bytes]]:
         for key in ['envelope_key', 'iv']:
             if key not in materials:
                 raise KeyError('Encryption materials are missing required key {}.'.format(key))
@@ -66,4 +114,4 @@ class Transform(TransformBase):
                     len(envelope_key)))
 
         decryptor = AES.new(envelope_key, AES.MODE_GCM, nonce=iv)
-        return decryptor.decrypt(data)
+        return lambda data, output: decryptor.decrypt(data, output=output)
@@ -1,11 +1,15 @@
 #!/usr/bin/env python
 # -*- encoding: utf-8 -*-
 from abc import abstractmethod, ABCMeta
-from typing import Dict, Tuple, Optional
+from typing import Dict, Tuple, Optional, Union
 
 from benji.config import Config, ConfigDict
 from benji.repr import ReprMixIn
 
+# Transforms accept any contiguous byte buffer as input, so that memory mapped objects or slices of larger buffers can
+# be passed without copying them first. The input must not be modified.
+BytesLike = Union[bytes, bytearray, memoryview]
+
 
 class TransformBase(ReprMixIn, metaclass=ABCMeta):
 
@@ -21,9 +25,19 @@ class TransformBase(ReprMixIn, metaclass=ABCMeta):
         return self.__class__.__module__.split('.')[-1]
 
     @abstractmethod
-    def encapsulate(self, *, data: bytes) -> Tuple[Optional[bytes], Optional[Dict]]:
+    def encapsulate(self, *, data: BytesLike) -> Tuple[Optional[bytes], Optional[Dict]]:
         pass
 
     @abstractmethod
-    def decapsulate(self, *, data: bytes, materials: Dict) -> bytes:
+    def decapsulate(self, *, data: BytesLike, materials: Dict) -> bytes:
         pass
+
+    # Transforms whose output size is known in advance can decapsulate into a preallocated buffer. The result is
+    # returned as a view into output. None is returned when this isn't supported or when output is too small.
+    def decapsulate_into(self, *, data: BytesLike, materials: Dict, output: bytearray) -> Optional[memoryview]:
+        return None
+
+    # Returns counters describing the work done by this transform, they are cumulative for the lifetime of the
+    # transform instance.
+    def stats(self) -> Dict[str, int]:
+        return {}
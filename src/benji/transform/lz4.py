@@ -0,0 +1,47 @@
+from typing import Dict, Tuple, Optional
+
+import lz4.block
+
+from benji.config import Config, ConfigDict
+from benji.transform.base import TransformBase, BytesLike
+
+
+class Transform(TransformBase):
+
+    # Corresponds to LZ4HC_CLEVEL_MAX
+    _MAX_COMPRESSION_LEVEL = 12
+
+    # The LZ4 block API keeps no state between calls, so unlike the zstd module no per-thread contexts are needed.
+    # The GIL is released during compression and decompression.
+    def __init__(self, *, config: Config, name: str, module_configuration: ConfigDict) -> None:
+        super().__init__(config=config, name=name, module_configuration=module_configuration)
+
+        self._mode: str = Config.get_from_dict(module_configuration, 'mode', types=str)
+        self._acceleration: int = Config.get_from_dict(module_configuration, 'acceleration', types=int)
+        self.level: int = Config.get_from_dict(
+            module_configuration,
+            'level',
+            types=int,
+            check_func=lambda v: v >= 1 and v <= self._MAX_COMPRESSION_LEVEL,
+            check_message='Option level must be between 1 and {} (inclusive)'.format(self._MAX_COMPRESSION_LEVEL))
+
+    def encapsulate(self, *, data: BytesLike) -> Tuple[Optional[bytes], Optional[Dict]]:
+        if self._mode == 'fast':
+            data_encapsulated = lz4.block.compress(data,
+                                                   mode='fast',
+                                                   acceleration=self._acceleration,
+                                                   store_size=False)  # We know the uncompressed size
+        else:
+            data_encapsulated = lz4.block.compress(data,
+                                                   mode='high_compression',
+                                                   compression=self.level,
+                                                   store_size=False)  # We know the uncompressed size
+        if len(data_encapsulated) < len(data):
+            return data_encapsulated, {'original_size': len(data)}
+        else:
+            return None, None
+
+    def decapsulate(self, *, data: BytesLike, materials: Dict) -> bytes:
+        if 'original_size' not in materials:
+            raise KeyError('Compression materials are missing required key original_size.')
+        return lz4.block.decompress(data, uncompressed_size=materials['original_size'])
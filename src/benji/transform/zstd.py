@@ -1,14 +1,26 @@
 import threading
-from typing import Dict, Tuple, Optional
+import time
+from collections import deque
+from typing import Dict, Tuple, Optional, Deque, Sequence
 
 import zstandard
 
 from benji.config import Config, ConfigDict
-from benji.transform.base import TransformBase
+from benji.logging import logger
+from benji.transform.base import TransformBase, BytesLike
 
 
 class Transform(TransformBase):
 
+    # Number of segments the sample used by the incompressibility check is taken from
+    _SAMPLE_SEGMENTS = 4
+    # Number of recent compression ratios which are remembered
+    _RATIO_HISTORY = 16
+    # Blocks are split into segments of this size for dictionary training
+    _DICT_TRAINING_SEGMENT_SIZE = 128 * 1024
+    # Corresponds to ZSTD_WINDOWLOG_LIMIT_DEFAULT
+    _DEFAULT_WINDOW_LOG_LIMIT = 27
+
     def __init__(self, *, config: Config, name: str, module_configuration: ConfigDict) -> None:
         super().__init__(config=config, name=name, module_configuration=module_configuration)
 
@@ -21,24 +33,93 @@ class Transform(TransformBase):
 
         dict_data_file: str = Config.get_from_dict(module_configuration, 'dictDataFile', None, types=str)
         if dict_data_file:
-            with open(dict_data_file, 'rb') as f:
-                dict_data_content = f.read()
-            self._dict_data = zstandard.ZstdCompressionDict(dict_data_content, dict_type=zstandard.DICT_TYPE_FULLDICT)
+            self._dict_data = self._load_dict(dict_data_file)
             self._dict_data.precompute_compress(self.level)
         else:
             self._dict_data = None
 
-        self._compressors: zstandard.ZstdCompressor = {}
-        self._decompressors: zstandard.ZstdDecompressor = {}
+        # Dictionaries are selected by their ID during decompression. Previous dictionaries are kept so that objects
+        # compressed with them stay readable after the dictionary has been replaced.
+        self._dicts: Dict[int, zstandard.ZstdCompressionDict] = {}
+        previous_dict_data_files = Config.get_from_dict(module_configuration, 'previousDictDataFiles', [], types=list)
+        for previous_dict_data_file in previous_dict_data_files:
+            previous_dict_data = self._load_dict(previous_dict_data_file)
+            self._dicts[previous_dict_data.dict_id()] = previous_dict_data
+        if self._dict_data:
+            self._dicts[self._dict_data.dict_id()] = self._dict_data
+
+        # Large blocks can be compressed with zstd's own worker threads and long distance matching
+        self._large_block_threshold: Optional[int] = None
+        self._max_window_size = 0
+        if Config.get_from_dict(module_configuration, 'largeBlocks', None, types=dict) is not None:
+            self._large_block_threshold = Config.get_from_dict(module_configuration,
+                                                               'largeBlocks.threshold',
+                                                               types=int)
+            large_block_threads = Config.get_from_dict(module_configuration, 'largeBlocks.threads', types=int)
+            large_block_ldm = Config.get_from_dict(module_configuration,
+                                                   'largeBlocks.longDistanceMatching',
+                                                   types=bool)
+            large_block_window_log = Config.get_from_dict(
+                module_configuration,
+                'largeBlocks.windowLog',
+                types=int,
+                check_func=lambda v: v == 0 or zstandard.WINDOWLOG_MIN <= v <= zstandard.WINDOWLOG_MAX,
+                check_message='Option largeBlocks.windowLog must be 0 or between {} and {} (inclusive)'.format(
+                    zstandard.WINDOWLOG_MIN, zstandard.WINDOWLOG_MAX))
+            # Long distance matching is only useful with a window larger than the one of the lower levels
+            if large_block_window_log == 0 and large_block_ldm:
+                large_block_window_log = self._DEFAULT_WINDOW_LOG_LIMIT
+            self._large_block_parameters = zstandard.ZstdCompressionParameters.from_level(
+                self.level,
+                threads=large_block_threads,
+                enable_ldm=large_block_ldm,
+                window_log=large_block_window_log,
+                write_checksum=False,
+                write_content_size=False)
+            # Windows larger than the decompressor's default limit need to be allowed explicitly
+            if large_block_window_log > self._DEFAULT_WINDOW_LOG_LIMIT:
+                self._max_window_size = 1 << large_block_window_log
+            logger.debug('Transform {} compresses blocks of at least {} bytes with {} threads{}.'.format(
+                name, self._large_block_threshold, large_block_threads,
+                ' and long distance matching' if large_block_ldm else ''))
+
+        self._compressors: Dict[Tuple[int, bool], zstandard.ZstdCompressor] = {}
+        self._decompressors: Dict[int, Dict[int, zstandard.ZstdDecompressor]] = {}
         self._identifier = name
 
-    def _get_compressor(self) -> zstandard.ZstdCompressor:
+        self._sample_size: Optional[int] = None
+        if Config.get_from_dict(module_configuration, 'incompressibleCheck', None, types=dict) is not None:
+            self._sample_size = Config.get_from_dict(module_configuration,
+                                                     'incompressibleCheck.sampleSize',
+                                                     types=int)
+            self._sample_threshold = Config.get_from_dict(module_configuration,
+                                                          'incompressibleCheck.threshold',
+                                                          types=(int, float))
+            logger.debug('Transform {} skips blocks whose sample compresses to more than {:.1f}% of its size.'.format(
+                name, self._sample_threshold * 100))
+        self._ratios: Deque[float] = deque(maxlen=self._RATIO_HISTORY)
+        self._stats_lock = threading.Lock()
+        self._stats = {'blocks': 0, 'compressed': 0, 'incompressible': 0, 'sampled': 0, 'skipped': 0}
+
+    @property
+    def dict_data(self) -> Optional[zstandard.ZstdCompressionDict]:
+        return self._dict_data
+
+    @staticmethod
+    def _load_dict(dict_data_file: str) -> zstandard.ZstdCompressionDict:
+        with open(dict_data_file, 'rb') as f:
+            dict_data_content = f.read()
+        return zstandard.ZstdCompressionDict(dict_data_content, dict_type=zstandard.DICT_TYPE_FULLDICT)
+
+    def _get_compressor(self, large: bool = False) -> zstandard.ZstdCompressor:
         thread_id = threading.get_ident()
 
-        if thread_id in self._compressors:
-            return self._compressors[thread_id]
+        if (thread_id, large) in self._compressors:
+            return self._compressors[(thread_id, large)]
 
-        if self._dict_data:
+        if large:
+            cctx = zstandard.ZstdCompressor(dict_data=self._dict_data, compression_params=self._large_block_parameters)
+        elif self._dict_data:
             cctx = zstandard.ZstdCompressor(
                 level=self.level,
                 dict_data=self._dict_data,
@@ -50,31 +131,113 @@ class Transform(TransformBase):
                 write_checksum=False,  # We have our own checksum
                 write_content_size=False)  # We know the uncompressed size
 
-        self._compressors[thread_id] = cctx
+        self._compressors[(thread_id, large)] = cctx
         return cctx
 
     def _get_decompressor(self, dict_id: int = 0) -> zstandard.ZstdDecompressor:
         thread_id = threading.get_ident()
 
-        if thread_id in self._decompressors:
-            return self._decompressors[thread_id]
+        decompressors = self._decompressors.setdefault(thread_id, {})
+        if dict_id in decompressors:
+            return decompressors[dict_id]
 
-        if self._dict_data:
-            dctx = zstandard.ZstdDecompressor(dict_data=self._dict_data)
+        if dict_id != 0:
+            if dict_id not in self._dicts:
+                raise ValueError('Dictionary with ID {} is not available in transform {}, it needs to be configured '
+                                 'in dictDataFile or previousDictDataFiles.'.format(dict_id, self._name))
+            dctx = zstandard.ZstdDecompressor(dict_data=self._dicts[dict_id], max_window_size=self._max_window_size)
         else:
-            dctx = zstandard.ZstdDecompressor()
+            dctx = zstandard.ZstdDecompressor(max_window_size=self._max_window_size)
 
-        self._decompressors[thread_id] = dctx
+        decompressors[dict_id] = dctx
         return dctx
 
-    def encapsulate(self, *, data: bytes) -> Tuple[Optional[bytes], Optional[Dict]]:
-        data_encapsulated = self._get_compressor().compress(data)
+    def _sample(self, data: BytesLike) -> bytes:
+        segment_size = self._sample_size // self._SAMPLE_SEGMENTS
+        step = len(data) // self._SAMPLE_SEGMENTS
+        data_view = memoryview(data)
+        return b''.join(data_view[i * step:i * step + segment_size] for i in range(self._SAMPLE_SEGMENTS))
+
+    # The check is skipped as long as all recently compressed blocks were clearly compressible. When a block
+    # turns out to be incompressible its ratio is remembered and the check is resumed with the next block.
+    def _check_needed(self, data: BytesLike) -> bool:
+        if self._sample_size is None or len(data) < 2 * self._sample_size:
+            return False
+        with self._stats_lock:
+            return len(self._ratios) < self._RATIO_HISTORY or max(self._ratios) >= self._sample_threshold
+
+    def _record(self, stat: str, ratio: Optional[float] = None) -> None:
+        with self._stats_lock:
+            self._stats['blocks'] += 1
+            self._stats[stat] += 1
+            if ratio is not None:
+                self._ratios.append(ratio)
+
+    def encapsulate(self, *, data: BytesLike) -> Tuple[Optional[bytes], Optional[Dict]]:
+        if self._check_needed(data):
+            sample = self._sample(data)
+            sample_ratio = len(self._get_compressor().compress(sample)) / len(sample)
+            with self._stats_lock:
+                self._stats['sampled'] += 1
+            if sample_ratio >= self._sample_threshold:
+                self._record('skipped')
+                return None, None
+
+        large = self._large_block_threshold is not None and len(data) >= self._large_block_threshold
+        data_encapsulated = self._get_compressor(large).compress(data)
+        ratio = len(data_encapsulated) / len(data) if len(data) > 0 else 1.0
         if len(data_encapsulated) < len(data):
+            self._record('compressed', ratio)
+            if self._dict_data:
+                return data_encapsulated, {'original_size': len(data), 'dict_id': self._dict_data.dict_id()}
             return data_encapsulated, {'original_size': len(data)}
         else:
+            self._record('incompressible', ratio)
             return None, None
 
-    def decapsulate(self, *, data: bytes, materials: Dict) -> bytes:
+    def decapsulate(self, *, data: BytesLike, materials: Dict) -> bytes:
         if 'original_size' not in materials:
             raise KeyError('Compression materials are missing required key original_size.')
-        return self._get_decompressor().decompress(data, max_output_size=materials['original_size'])
+        # Objects written before the dictionary ID was recorded in the materials carry it in the frame header
+        dict_id = materials['dict_id'] if 'dict_id' in materials else zstandard.get_frame_parameters(data).dict_id
+        return self._get_decompressor(dict_id).decompress(data, max_output_size=materials['original_size'])
+
+    def train_dictionary(self, samples: Sequence[bytes], dict_size: int) -> zstandard.ZstdCompressionDict:
+        segments = []
+        for sample in samples:
+            sample_view = memoryview(sample)
+            for offset in range(0, len(sample), self._DICT_TRAINING_SEGMENT_SIZE):
+                segments.append(sample_view[offset:offset + self._DICT_TRAINING_SEGMENT_SIZE].tobytes())
+        return zstandard.train_dictionary(dict_size, segments, level=self.level)
+
+    # Compresses and decompresses the samples with the level of this transform and the given dictionary and
+    # returns the compression ratio and the speeds in bytes per second.
+    def benchmark(self, samples: Sequence[bytes],
+                  dict_data: Optional[zstandard.ZstdCompressionDict] = None) -> Dict[str, float]:
+        if dict_data:
+            cctx = zstandard.ZstdCompressor(level=self.level,
+                                            dict_data=dict_data,
+                                            write_checksum=False,
+                                            write_content_size=False)
+            dctx = zstandard.ZstdDecompressor(dict_data=dict_data)
+        else:
+            cctx = zstandard.ZstdCompressor(level=self.level, write_checksum=False, write_content_size=False)
+            dctx = zstandard.ZstdDecompressor()
+
+        samples_size = sum(len(sample) for sample in samples)
+        t1 = time.perf_counter()
+        compressed_samples = [cctx.compress(sample) for sample in samples]
+        t2 = time.perf_counter()
+        for sample, compressed_sample in zip(samples, compressed_samples):
+            dctx.decompress(compressed_sample, max_output_size=len(sample))
+        t3 = time.perf_counter()
+
+        return {
+            'ratio': sum(len(compressed_sample) for compressed_sample in compressed_samples) / samples_size,
+            'compression_speed': samples_size / max(t2 - t1, 1e-9),
+            'decompression_speed': samples_size / max(t3 - t2, 1e-9),
+        }
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
@@ -12,7 +12,7 @@ from datetime import datetime
 from importlib import import_module
 from threading import Lock
 from time import time
-from typing import List, Tuple, Union, Any, Optional, Dict, Iterator
+from typing import List, Tuple, Union, Any, Optional, Dict, Iterator, Callable
 
 import setproctitle
 from Crypto.Hash import SHA512
@@ -77,42 +77,123 @@ class BlockHash:
 
     _CRYPTO_PACKAGE = 'Crypto.Hash'
 
-    _hash_module: Any
-    _hash_kwargs: Dict[str, Any]
+    # Backends are selected with a prefix, the hash name is the name of the constructor in the backend's module
+    _BACKENDS = ('pycryptodome', 'hashlib', 'blake3', 'xxhash')
+    # These hashes are not collision resistant, so a malicious source could provoke deduplication of different blocks
+    _NON_CRYPTOGRAPHIC_BACKENDS = ('xxhash',)
+
+    # These pycryptodome hashes compute the same digests as their hashlib counterparts, but hashlib (OpenSSL) is
+    # faster and releases the GIL for larger inputs.
+    _HASHLIB_EQUIVALENTS = {
+        'MD5': 'md5',
+        'SHA1': 'sha1',
+        'SHA224': 'sha224',
+        'SHA256': 'sha256',
+        'SHA384': 'sha384',
+        'SHA512': 'sha512',
+        'SHA3_224': 'sha3_224',
+        'SHA3_256': 'sha3_256',
+        'SHA3_384': 'sha3_384',
+        'SHA3_512': 'sha3_512',
+        'BLAKE2b': 'blake2b',
+        'BLAKE2s': 'blake2s',
+    }
+
+    _CHECK_DATA = b'benji block hash check'
+
+    _backend: str
+    _new: Callable[[bytes], Any]
 
     def __init__(self, hash_function_config: str) -> None:
+        backend = 'pycryptodome'
+        explicit_backend = ':' in hash_function_config
+        if explicit_backend:
+            backend, hash_function_config = hash_function_config.split(':', 1)
+            if backend not in self._BACKENDS:
+                raise ConfigurationError('Unsupported block hash backend {}.'.format(backend))
+
         hash_args: Optional[str] = None
         try:
             hash_name, hash_args = hash_function_config.split(',', 1)
         except ValueError:
             hash_name = hash_function_config
 
-        try:
-            hash_module: Any = import_module('{}.{}'.format(self._CRYPTO_PACKAGE, hash_name))
-        except ImportError as exception:
-            raise ConfigurationError('Unsupported block hash {}.'.format(hash_name)) from exception
-
         hash_kwargs: Dict[str, Any] = {}
         if hash_args is not None:
             hash_kwargs = dict((k, literal_eval(v)) for k, v in (pair.split('=') for pair in hash_args.split(',')))
 
+        new = self._backend_new(backend, hash_name, hash_kwargs)
         try:
-            hash = hash_module.new(**hash_kwargs)
-        except (TypeError, ValueError) as exception:
+            digest = new(b'').hexdigest()
+        except (TypeError, ValueError, AttributeError) as exception:
             raise ConfigurationError('Unsupported or invalid block hash arguments: {}.'.format(hash_kwargs)) from exception
 
         from benji.database import Block
-        if len(hash.digest()) > Block.MAXIMUM_CHECKSUM_LENGTH:
+        if len(digest) // 2 > Block.MAXIMUM_CHECKSUM_LENGTH:
             raise ConfigurationError('Specified block hash {} exceeds maximum digest length of {} bytes.'.format(
                 hash_name, Block.MAXIMUM_CHECKSUM_LENGTH))
 
-        logger.debug('Using block hash {} with kwargs {}.'.format(hash_name, hash_kwargs))
+        if not explicit_backend:
+            new_hashlib = self._hashlib_equivalent(hash_name, hash_kwargs)
+            if new_hashlib is not None:
+                backend, new = 'hashlib', new_hashlib
+
+        if backend in self._NON_CRYPTOGRAPHIC_BACKENDS:
+            logger.warning('Block hash {} is not collision resistant, only use it with trusted data.'.format(hash_name))
+
+        logger.debug('Using block hash {} with kwargs {} (backend {}).'.format(hash_name, hash_kwargs, backend))
+
+        self._backend = backend
+        self._new = new
+
+    @classmethod
+    def _backend_new(cls, backend: str, hash_name: str, hash_kwargs: Dict[str, Any]) -> Callable[[bytes], Any]:
+        if backend == 'pycryptodome':
+            try:
+                hash_module: Any = import_module('{}.{}'.format(cls._CRYPTO_PACKAGE, hash_name))
+            except ImportError as exception:
+                raise ConfigurationError('Unsupported block hash {}.'.format(hash_name)) from exception
+            return lambda data: hash_module.new(data=data, **hash_kwargs)
+
+        try:
+            backend_module = import_module(backend)
+        except ImportError as exception:
+            raise ConfigurationError('Block hash backend {} is not available, is the Python module installed?'.format(
+                backend)) from exception
+        constructor = getattr(backend_module, hash_name, None)
+        if not callable(constructor) or hash_name.startswith('_'):
+            raise ConfigurationError('Unsupported block hash {} for backend {}.'.format(hash_name, backend))
+        return lambda data: constructor(data, **hash_kwargs)
+
+    # Returns the hashlib implementation of a pycryptodome hash if there is one which produces the same digests
+    @classmethod
+    def _hashlib_equivalent(cls, hash_name: str, hash_kwargs: Dict[str, Any]) -> Optional[Callable[[bytes], Any]]:
+        if hash_name not in cls._HASHLIB_EQUIVALENTS:
+            return None
+        hashlib_kwargs = {}
+        for key, value in hash_kwargs.items():
+            if key == 'digest_bits' and hash_name.startswith('BLAKE2') and value % 8 == 0:
+                hashlib_kwargs['digest_size'] = value // 8
+            else:
+                return None
+
+        new = cls._backend_new('pycryptodome', hash_name, hash_kwargs)
+        new_hashlib = cls._backend_new('hashlib', cls._HASHLIB_EQUIVALENTS[hash_name], hashlib_kwargs)
+        # A mismatch would break deduplication against existing blocks, so this is checked and not just assumed.
+        # hashlib might also refuse some hashes (e.g. MD5 in FIPS mode).
+        try:
+            if new_hashlib(cls._CHECK_DATA).hexdigest() != new(cls._CHECK_DATA).hexdigest():
+                return None
+        except ValueError:
+            return None
+        return new_hashlib
 
-        self._hash_module = hash_module
-        self._hash_kwargs = hash_kwargs
+    @property
+    def backend(self) -> str:
+        return self._backend
 
     def data_hexdigest(self, data: bytes) -> str:
-        return self._hash_module.new(data=data, **self._hash_kwargs).hexdigest()
+        return self._new(data).hexdigest()
 
 
 class PrettyPrint: